@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Benchmark the matching of ``cgignore`` files of :py:mod:`psef.ignore`.
+
+:meth:`psef.ignore.IgnoreFilterManager.is_ignored` is compared against the
+matching as it was before, which used
+:meth:`psef.ignore.IgnoreFilterManager.find_matching` to try every pattern on
+every prefix of a path, on the paths of archives with 10000 entries. Both the
+time needed and the equality of the results are reported.
+
+Run it from the root of the repository:
+
+.. code:: bash
+
+    python3 benchmarks/bench_ignore.py
+
+:license: AGPLv3, see LICENSE for details.
+"""
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from psef.ignore import IgnoreFilterManager  # isort:skip
+
+CGIGNORE = '''
+# Build output
+/build/
+/dist/
+*.o
+*.a
+*.so
+*.class
+*.pyc
+__pycache__/
+target/
+bin/
+obj/
+!bin/run.sh
+
+# Editors and tools
+.idea/
+.vscode/
+*.swp
+*~
+.DS_Store
+Thumbs.db
+.git/
+**/node_modules
+.env
+*.log
+!important.log
+
+# Course specific
+docs/**/*.pdf
+data/*.csv
+!data/small.csv
+test_*.py
+[Tt]emp*/
+'''
+
+DIRS = [
+    'src', 'lib', 'test', 'docs', 'data', 'build', 'bin', 'util', 'models',
+    'views', 'node_modules', '__pycache__', 'Temp', 'api', 'core'
+]
+EXTENSIONS = ['py', 'java', 'c', 'h', 'o', 'pyc', 'md', 'csv', 'log', 'txt']
+
+
+def reference_is_ignored(manager, path):
+    """The implementation of ``is_ignored`` as it was before, used as baseline.
+    """
+    matches = list(manager.find_matching(path))
+    if matches:
+        return matches[-1].is_exclude, matches[-1].original_line
+    return None, None
+
+
+def make_archive_paths(amount, max_depth, seed=0):
+    """Create the paths of an archive with the given amount of files.
+    """
+    rand = random.Random(seed)
+    paths = set()
+    while len(paths) < amount:
+        dirs = [rand.choice(DIRS) for _ in range(rand.randint(0, max_depth))]
+        name = f'file_{rand.randint(0, 200)}.{rand.choice(EXTENSIONS)}'
+        for i in range(1, len(dirs) + 1):
+            paths.add('/'.join(dirs[:i]) + '/')
+        paths.add('/'.join(dirs + [name]))
+    return sorted(paths)[:amount]
+
+
+def bench(name, paths, number=3):
+    """Time checking all given paths with both implementations.
+    """
+    old = [
+        reference_is_ignored(IgnoreFilterManager(CGIGNORE), path)
+        for path in paths
+    ]
+    manager = IgnoreFilterManager(CGIGNORE)
+    new = [manager.is_ignored(path) for path in paths]
+
+    def run_old():
+        manager = IgnoreFilterManager(CGIGNORE)
+        for path in paths:
+            reference_is_ignored(manager, path)
+
+    def run_new():
+        # A new manager is used for every archive, so its cache of
+        # directories is empty.
+        manager = IgnoreFilterManager(CGIGNORE)
+        for path in paths:
+            manager.is_ignored(path)
+
+    old_time = min(timeit.repeat(run_old, number=number, repeat=5)) / number
+    new_time = min(timeit.repeat(run_new, number=number, repeat=5)) / number
+
+    print(
+        f'{name:<24} reference: {old_time * 1000:8.2f} ms   '
+        f'psef.ignore: {new_time * 1000:8.2f} ms   '
+        f'speedup: {old_time / new_time:5.2f}x   '
+        f'identical: {old == new}'
+    )
+    return old == new
+
+
+def main():
+    results = [
+        bench('flat (10000)', make_archive_paths(10000, 1)),
+        bench('depth 4 (10000)', make_archive_paths(10000, 4)),
+        bench('depth 10 (10000)', make_archive_paths(10000, 10)),
+    ]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Benchmark the JSON encoders of :py:mod:`psef.json`.
+
+The encoders are compared against the encoder that was used before, a plain
+:class:`json.JSONEncoder` with a ``default`` hook, on large lists of works and
+large file trees. Both the time needed and the equality of the output are
+reported.
+
+Run it from the root of the repository:
+
+.. code:: bash
+
+    python3 benchmarks/bench_json.py
+
+:license: AGPLv3, see LICENSE for details.
+"""
+import os
+import sys
+import json
+import timeit
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psef  # isort:skip
+import psef.json  # isort:skip
+import psef.models as m  # isort:skip
+
+
+class ReferenceJSONEncoder(json.JSONEncoder):
+    """The encoder as it was before, used as baseline.
+    """
+
+    def default(self, obj):  # pylint: disable=E0202,arguments-differ
+        try:
+            return obj.__to_json__()
+        except AttributeError:
+            return super().default(obj)
+
+
+def make_works(amount):
+    """Create serialized works in the format of
+    :py:meth:`psef.models.Assignment.get_works_json`, with real users.
+    """
+    users = [
+        m.User(
+            id=i,
+            name=f'User {i}',
+            email=f'user{i}@example.com',
+            username=f'user{i}'
+        ) for i in range(100)
+    ]
+    now = datetime.datetime.utcnow()
+    return [
+        {
+            'id': i,
+            'user': users[i % len(users)],
+            'created_at': (now - datetime.timedelta(minutes=i)).isoformat(),
+            'assignee': users[(i * 7) % len(users)] if i % 3 else None,
+            'grade': (i % 100) / 10 if i % 4 else None,
+        } for i in range(amount)
+    ]
+
+
+def make_file_tree(depth, width, counter=None):
+    """Create a tree of transient :class:`psef.models.File` objects in the
+    format of :py:meth:`psef.models.File.list_contents`.
+    """
+    counter = counter if counter is not None else [0]
+    counter[0] += 1
+    if depth == 0:
+        return m.File(id=counter[0], name=f'file_{counter[0]}.py')
+    return {
+        'name': f'dir_{counter[0]}',
+        'id': counter[0],
+        'entries': [
+            make_file_tree(depth - 1, width, counter) for _ in range(width)
+        ],
+    }
+
+
+def bench(name, payload, number=10):
+    """Time the encoding of the given payload with both encoders.
+    """
+    kwargs = {'sort_keys': True, 'separators': (',', ':')}
+    old = json.dumps(payload, cls=ReferenceJSONEncoder, **kwargs)
+    new = json.dumps(payload, cls=psef.json.CustomJSONEncoder, **kwargs)
+
+    old_time = min(
+        timeit.repeat(
+            lambda: json.dumps(payload, cls=ReferenceJSONEncoder, **kwargs),
+            number=number,
+            repeat=5,
+        )
+    ) / number
+    new_time = min(
+        timeit.repeat(
+            lambda: json.dumps(
+                payload, cls=psef.json.CustomJSONEncoder, **kwargs
+            ),
+            number=number,
+            repeat=5,
+        )
+    ) / number
+
+    print(
+        f'{name:<20} reference: {old_time * 1000:8.2f} ms   '
+        f'psef.json: {new_time * 1000:8.2f} ms   '
+        f'speedup: {old_time / new_time:5.2f}x   '
+        f'identical: {old == new}'
+    )
+    return old == new
+
+
+def main():
+    app = psef.create_app(skip_celery=True)
+    with app.app_context():
+        results = [
+            bench('works (10000)', make_works(10000)),
+            bench('works (100000)', make_works(100000), number=2),
+            bench('file tree (5^6)', make_file_tree(6, 5)),
+        ]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -115,16 +115,135 @@ if not os.path.isdir(CONFIG['MIRROR_UPLOAD_DIR']):
         file=sys.stderr
     )
 
+# Directory where generated zip archives of submissions are cached, the
+# archives are not cached if this is empty. Every ``ZIP_CACHE_PRUNE_INTERVAL``
+# seconds archives not used for ``ZIP_CACHE_MAX_AGE`` seconds are removed,
+# after which the least recently used archives are removed until the cache is
+# at most ``ZIP_CACHE_MAX_SIZE`` bytes.
+set_str(CONFIG, backend_ops, 'ZIP_CACHE_DIR', '')
+if CONFIG['ZIP_CACHE_DIR'] and not os.path.isdir(CONFIG['ZIP_CACHE_DIR']):
+    print(
+        f'The given zip cache directory "{CONFIG["ZIP_CACHE_DIR"]}"'
+        ' does not exist',
+        file=sys.stderr
+    )
+set_int(CONFIG, backend_ops, 'ZIP_CACHE_PRUNE_INTERVAL', 15 * 60)
+set_int(CONFIG, backend_ops, 'ZIP_CACHE_MAX_AGE', 24 * 60 * 60)
+set_int(CONFIG, backend_ops, 'ZIP_CACHE_MAX_SIZE', 2 * 2 ** 30)
+
+# Blobs in the ``UPLOAD_DIR`` that are no longer used by any file are removed
+# every ``UNREFERENCED_BLOB_PRUNE_INTERVAL`` seconds, or directly when the
+# file using them is deleted. Blobs stored in the last
+# ``UNREFERENCED_BLOB_MIN_AGE`` seconds are never removed, as the transaction
+# storing them might not be committed yet.
+set_int(CONFIG, backend_ops, 'UNREFERENCED_BLOB_PRUNE_INTERVAL', 24 * 60 * 60)
+set_int(CONFIG, backend_ops, 'UNREFERENCED_BLOB_MIN_AGE', 60 * 60)
+
 # Maximum size in bytes for single upload request
 set_float(
     CONFIG, backend_ops, 'MAX_UPLOAD_SIZE', 64 * 2 ** 20
 )  # default: 64MB
 
+# Archives are rejected before they are extracted if they contain more than
+# ``MAX_ARCHIVE_ENTRIES`` members, if they are larger than ``MAX_ARCHIVE_SIZE``
+# bytes when extracted or if the archive or one of its members has a
+# compression ratio larger than ``MAX_ARCHIVE_COMPRESSION_RATIO``.
+set_int(CONFIG, backend_ops, 'MAX_ARCHIVE_ENTRIES', 10000)
+set_int(CONFIG, backend_ops, 'MAX_ARCHIVE_SIZE', 512 * 2 ** 20)
+set_int(CONFIG, backend_ops, 'MAX_ARCHIVE_COMPRESSION_RATIO', 100)
+
+# Every ``MIRROR_UPLOAD_PRUNE_INTERVAL`` seconds the files in the
+# ``MIRROR_UPLOAD_DIR`` that are older than ``MIRROR_UPLOAD_MAX_AGE`` seconds
+# are removed. After this the oldest files are removed until the directory is
+# at most ``MIRROR_UPLOAD_MAX_SIZE`` bytes.
+set_int(CONFIG, backend_ops, 'MIRROR_UPLOAD_PRUNE_INTERVAL', 15 * 60)
+set_int(CONFIG, backend_ops, 'MIRROR_UPLOAD_MAX_AGE', 24 * 60 * 60)
+set_int(CONFIG, backend_ops, 'MIRROR_UPLOAD_MAX_SIZE', 4 * 2 ** 30)
+
+# Files in the ``UPLOAD_DIR`` are served by nginx if this is set to the
+# internal location that serves this directory, using the ``X-Accel-Redirect``
+# header.
+set_str(CONFIG, backend_ops, 'X_ACCEL_REDIRECT_LOCATION', '')
+
+# Amount of seconds the name returned to download a file without logging in is
+# valid.
+set_int(CONFIG, backend_ops, 'FILE_URL_TOKEN_MAX_AGE', 5 * 60)
+
+# Amount of processes used to extract the submissions of a blackboard zip. If
+# this is 0 the amount of cpus is used and if it is 1 the submissions are
+# extracted in the process handling the request. A new pool of processes is
+# started for every uploaded zip, so the default is to use no extra processes.
+set_int(CONFIG, backend_ops, 'BLACKBOARD_IMPORT_WORKERS', 1)
+
+# Amount of linters that are run concurrently by a single linter task. If this
+# is 0 the amount of cpus is used.
+set_int(CONFIG, backend_ops, 'LINTER_WORKERS', 0)
+
+# Directory where the comments generated by linters are cached, the comments
+# are not cached if this is empty. Entries are removed if they have not been
+# used for ``LINTER_CACHE_MAX_AGE`` seconds or if the total size of the cache
+# exceeds ``LINTER_CACHE_MAX_SIZE`` bytes.
+set_str(CONFIG, backend_ops, 'LINTER_CACHE_DIR', '')
+if CONFIG['LINTER_CACHE_DIR'] and not os.path.isdir(
+    CONFIG['LINTER_CACHE_DIR']
+):
+    print(
+        f'The given linter cache directory "{CONFIG["LINTER_CACHE_DIR"]}"'
+        ' does not exist',
+        file=sys.stderr
+    )
+set_int(CONFIG, backend_ops, 'LINTER_CACHE_MAX_AGE', 7 * 24 * 60 * 60)
+set_int(CONFIG, backend_ops, 'LINTER_CACHE_MAX_SIZE', 256 * 2 ** 20)
+
+# Maximum amount of grade passback requests that are done concurrently to a
+# single LTI consumer. Every concurrent request keeps its own connection to the
+# consumer open for the duration of the passback task.
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_CONNECTIONS', 4)
+
+# Amount of seconds after which a grade passback request to a LTI consumer
+# times out.
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_TIMEOUT', 10)
+
+# Grade passbacks are stored in a queue and processed every
+# ``LTI_PASSBACK_QUEUE_INTERVAL`` seconds, in batches of at most
+# ``LTI_PASSBACK_BATCH_SIZE`` passbacks. A failed passback is retried after
+# ``LTI_PASSBACK_BACKOFF`` seconds, and this delay is doubled after every
+# failed attempt. After ``LTI_PASSBACK_MAX_ATTEMPTS`` attempts the passback is
+# stored as failed, and it can be retried by an admin.
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_QUEUE_INTERVAL', 60)
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_BATCH_SIZE', 100)
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_BACKOFF', 60)
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_MAX_ATTEMPTS', 10)
+
+# If ``LTI_PASSBACK_FAILURE_THRESHOLD`` passbacks to the same LTI consumer
+# failed in a row no passbacks are done to this consumer for
+# ``LTI_PASSBACK_BLOCK_TIME`` seconds.
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_FAILURE_THRESHOLD', 10)
+set_int(CONFIG, backend_ops, 'LTI_PASSBACK_BLOCK_TIME', 300)
+
+# Large lists are encoded to JSON while they are sent, the rows needed for
+# these lists are retrieved from the database in batches of
+# ``STREAM_BATCH_SIZE`` rows.
+set_int(CONFIG, backend_ops, 'STREAM_BATCH_SIZE', 100)
+
+# The maximum amount of items in a single page of a paginated list, see
+# `psef.helpers.KeysetPagination`.
+set_int(CONFIG, backend_ops, 'MAX_PAGE_SIZE', 500)
+
 with open(
     os.path.join(CONFIG['BASE_DIR'], 'seed_data', 'course_roles.json'), 'r'
 ) as f:
     CONFIG['_DEFAULT_COURSE_ROLES'] = json.load(f)
 
+# The names of all permissions in the order of `seed_data/permissions.json`.
+# The position of a permission in this list is its bit in the permission bitset
+# stored for every role, so new permissions should always be added at the end
+# of this file.
+with open(
+    os.path.join(CONFIG['BASE_DIR'], 'seed_data', 'permissions.json'), 'r'
+) as f:
+    CONFIG['_PERMISSION_ORDER'] = list(json.load(f))
+
 # The default site role a user should get. The name of this role should be
 # present as a key in `seed_data/roles.json`.
 set_str(CONFIG, backend_ops, 'DEFAULT_ROLE', 'Student')
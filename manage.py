@@ -63,6 +63,9 @@ def seed_force(db=None):
                         course_permission=perm['course_permission']
                     )
                 )
+    # Make sure the new permissions get an id, so they can be found when the
+    # permission bitsets of the roles are updated.
+    db.session.flush()
 
     with open(
         f'{os.path.dirname(os.path.abspath(__file__))}/seed_data/roles.json',
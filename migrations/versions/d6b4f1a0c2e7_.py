@@ -0,0 +1,54 @@
+"""Add `File.path` column with the full path of every file
+
+Revision ID: d6b4f1a0c2e7
+Revises: 129f43439f98
+Create Date: 2018-04-19 11:02:37.180245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+# revision identifiers, used by Alembic.
+revision = 'd6b4f1a0c2e7'
+down_revision = '129f43439f98'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('File', sa.Column('path', sa.Unicode(), nullable=True))
+
+    # The paths are filled one level of the file trees at a time, as
+    # ``UPDATE ... FROM`` is not supported by every database.
+    conn = op.get_bind()
+    conn.execute(
+        text('UPDATE "File" SET path = name WHERE parent_id IS NULL')
+    )
+    while conn.execute(
+        text(
+            """
+        UPDATE "File" SET path = (
+            SELECT parent.path || '/' || "File".name
+            FROM "File" AS parent WHERE parent.id = "File".parent_id
+        )
+        WHERE path IS NULL AND parent_id IN (
+            SELECT id FROM "File" WHERE path IS NOT NULL
+        )
+    """
+        )
+    ).rowcount:
+        pass
+
+    with op.batch_alter_table('File') as batch_op:
+        batch_op.alter_column(
+            'path', existing_type=sa.Unicode(), nullable=False
+        )
+    op.create_index(
+        'ix_File_Work_id_path', 'File', ['Work_id', 'path'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_File_Work_id_path', table_name='File')
+    op.drop_column('File', 'path')
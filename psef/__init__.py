@@ -81,6 +81,12 @@ def create_app(config: t.Mapping = None, skip_celery: bool = False) -> t.Any:
     def __set_request_start_time() -> None:  # pylint: disable=unused-variable
         g.request_start_time = datetime.datetime.utcnow()
 
+    @resulting_app.before_request
+    def __reset_permission_cache() -> None:  # pylint: disable=unused-variable
+        # The app context, and so `g`, can be shared by multiple requests, so
+        # we make sure permissions are never cached between requests.
+        g.permission_bits = {}
+
     @resulting_app.before_request
     @flask_jwt.jwt_optional
     def __set_current_user() -> None:  # pylint: disable=unused-variable
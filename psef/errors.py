@@ -50,6 +50,9 @@ class APICodes(IntEnum):
     RATE_LIMIT_EXCEEDED = 19
     OBJECT_ALREADY_EXISTS = 20
     INVALID_ARCHIVE = 21
+    ARCHIVE_TOO_LARGE = 22
+    TOO_MANY_FILES_IN_ARCHIVE = 23
+    ARCHIVE_COMPRESSION_TOO_HIGH = 24
 
 
 class APIException(Exception):
@@ -12,20 +12,35 @@ import enum
 import uuid
 import shutil
 import typing as t
+import hashlib
 import tarfile
 import zipfile
+import datetime
 import tempfile
-from functools import reduce
+import itertools
+import contextlib
+import multiprocessing
+from operator import itemgetter
+from functools import partial
 
+import flask
 import archive
+import werkzeug
 import mypy_extensions
+from sqlalchemy import orm, event
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.urls import url_quote
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from werkzeug.datastructures import FileStorage
+from sqlalchemy.sql.expression import func
 
 import psef.models as models
+import psef.helpers as helpers
 from psef import app, blackboard
 from psef.errors import APICodes, APIException
 from psef.ignore import InvalidFile, IgnoreFilterManager
+from psef.model_types import DbColumn
 
 _KNOWN_ARCHIVE_EXTENSIONS = tuple(archive.extension_map.keys())
 
@@ -34,6 +49,25 @@ _BB_TXT_FORMAT = re.compile(
     r"(?P<assignment_name>.+)_(?P<student_id>.+?)_attempt_"
     r"(?P<datetime>\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}).txt"
 )
+
+# The size of the chunks used when copying a stream into the blob store.
+_BLOB_CHUNK_SIZE = 64 * 1024
+
+# The names of blobs are the sha256 hex digest of their contents.
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+# The key in the ``info`` of a session where the blobs are stored that should
+# be deleted when the transaction of the session is committed.
+_PENDING_BLOB_DELETIONS = 'psef_pending_blob_deletions'
+
+# The amount of blob names for which the references are queried at once.
+_BLOB_QUERY_BATCH_SIZE = 500
+
+# The compression ratio of archives and their members is only checked if they
+# are larger than this amount of bytes, as small files of for example only
+# whitespace can have a high compression ratio.
+_MIN_SIZE_FOR_RATIO_CHECK = 2 ** 20
+
 FileTreeBase = mypy_extensions.TypedDict(  # pylint: disable=invalid-name
     'FileTreeBase',
     {
@@ -148,11 +182,14 @@ def get_stat_information(file: models.File) -> t.Mapping[str, t.Any]:
     }
 
 
-def get_file_contents(code: models.File) -> bytes:
-    """Get the contents of the given :class:`.models.File`.
+def ensure_can_send_file(code: models.File) -> None:
+    """Ensure the contents of the given :class:`.models.File` can be sent.
+
+    :param code: The file object to check.
+    :returns: Nothing.
 
-    :param code: The file object to read.
-    :returns: The contents of the file with newlines.
+    :raises APIException: If the file is a directory. (OBJECT_WRONG_TYPE)
+    :raises APIException: If the file is a symlink. (INVALID_STATE)
     """
     if code.is_directory:
         raise APIException(
@@ -168,8 +205,117 @@ def get_file_contents(code: models.File) -> bytes:
             'The file {} is a symlink'.format(code.id), APICodes.INVALID_STATE,
             410
         )
-    with open(filename, 'rb') as codefile:
-        return codefile.read()
+
+
+def send_blob(
+    filename: str,
+    mimetype: t.Optional[str] = None,
+    as_attachment: bool = False,
+    attachment_filename: t.Optional[str] = None,
+) -> werkzeug.wrappers.Response:
+    """Create a response that serves the blob with the given name.
+
+    The blob is never read into memory: if ``X_ACCEL_REDIRECT_LOCATION`` is
+    set nginx is asked to serve the blob, otherwise it is sent using
+    :py:func:`flask.send_file`. The name of the blob is used as strong etag, as
+    blobs are never changed, and range requests are supported.
+
+    :param filename: The name of the blob in the ``UPLOAD_DIR``.
+    :param mimetype: The mimetype of the response, defaults to
+        ``application/octet-stream``.
+    :param as_attachment: Should the blob be sent as attachment.
+    :param attachment_filename: The name of the attachment.
+    :returns: A response serving the blob.
+
+    :raises APIException: If the blob does not exist. (OBJECT_NOT_FOUND)
+    """
+    path = flask.safe_join(app.config['UPLOAD_DIR'], filename)
+    if path is None or os.path.islink(path) or not os.path.isfile(path):
+        raise APIException(
+            'The specified file was not found',
+            f'The file with name "{filename}" was not found or is deleted.',
+            APICodes.OBJECT_NOT_FOUND,
+            404,
+        )
+    mimetype = mimetype or 'application/octet-stream'
+    location = app.config['X_ACCEL_REDIRECT_LOCATION']
+    complete_length = None
+
+    if helpers.etag_matches(filename):
+        res = app.response_class(mimetype=mimetype)
+    elif location:
+        res = app.response_class(mimetype=mimetype)
+        res.headers['X-Accel-Redirect'] = '{}/{}'.format(
+            location.rstrip('/'), url_quote(filename)
+        )
+        if as_attachment:
+            res.headers.add(
+                'Content-Disposition',
+                'attachment',
+                filename=attachment_filename or filename,
+            )
+    else:
+        res = flask.send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            attachment_filename=attachment_filename,
+            add_etags=False,
+            cache_timeout=0,
+        )
+        res.cache_control.public = False
+        complete_length = os.path.getsize(path)
+
+    try:
+        helpers.make_conditional(res, filename, complete_length)
+    except RequestedRangeNotSatisfiable:
+        res.close()
+        raise
+
+    # Make sure nginx does not send the blob for a 304 response.
+    if res.status_code == 304:
+        res.headers.pop('X-Accel-Redirect', None)
+    return res
+
+
+def _get_file_url_serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='file-url')
+
+
+def get_file_url_token(code: models.File) -> str:
+    """Get a signed token that can be used to download the given file.
+
+    The token contains the name of the blob of the file, so the contents do
+    not have to be copied to be downloaded. It is valid for
+    ``FILE_URL_TOKEN_MAX_AGE`` seconds, see :py:func:`load_file_url_token`.
+
+    :param code: The file to get a token for.
+    :returns: The signed token.
+
+    :raises APIException: If the file is a directory or a symlink, see
+        :py:func:`ensure_can_send_file`.
+    """
+    ensure_can_send_file(code)
+    return t.cast(str, _get_file_url_serializer().dumps(code.filename))
+
+
+def load_file_url_token(token: str) -> t.Optional[str]:
+    """Get the name of the blob from a token created by
+    :py:func:`get_file_url_token`.
+
+    :param token: The token to load.
+    :returns: The name of the blob, or ``None`` if the token is not valid or
+        expired.
+    """
+    try:
+        return t.cast(
+            str,
+            _get_file_url_serializer().loads(
+                token, max_age=app.config['FILE_URL_TOKEN_MAX_AGE']
+            )
+        )
+    except BadSignature:
+        return None
 
 
 def restore_directory_structure(
@@ -209,98 +355,377 @@ def restore_directory_structure(
            ],
        }
 
+    The tree of files is loaded using a single query, see
+    :py:meth:`.models.File.get_children_of_work`.
+
     :param code: A file
     :param parent: Path to parent directory
     :param exclude: The file owner to exclude.
     :returns: A tree as described
     """
-    out = os.path.join(parent, code.name)
-    if code.is_directory:
-        os.mkdir(out)
-        children = code.children.filter(models.File.fileowner != exclude).all()
-        subtree: t.List[FileTree] = [
-            restore_directory_structure(child, out, exclude)
-            for child in children
-        ]
-        return {
-            "name": code.name,
-            "id": code.id,
-            "entries": subtree,
-        }
-    else:  # this is a file
+    if not code.is_directory:
+        out = os.path.join(parent, code.name)
         shutil.copyfile(code.get_diskname(), out, follow_symlinks=False)
         return {"name": code.name, "id": code.id}
 
+    children = models.File.get_children_of_work(code.work_id, exclude)
+
+    def __restore(row: models.FileRow, parent: str) -> FileTree:
+        out = os.path.join(parent, row.name)
+        if row.is_directory:
+            os.mkdir(out)
+            subtree: t.List[FileTree] = [
+                __restore(child, out) for child in children[row.id]
+            ]
+            return {
+                "name": row.name,
+                "id": row.id,
+                "entries": subtree,
+            }
+        else:  # this is a file
+            shutil.copyfile(
+                os.path.join(app.config['UPLOAD_DIR'], row.filename),
+                out,
+                follow_symlinks=False
+            )
+            return {"name": row.name, "id": row.id}
 
-def rename_directory_structure(rootdir: str) -> ExtractFileTree:
-    """Creates a nested dictionary that represents the folder structure of
-    rootdir.
+    return __restore(code, parent)
 
-    A tree like:
 
-    - dir1
-        - dir 2
-            - file 1
-            - file 2
-        - file 3
+# A member of a zip archive, this is a tuple of the name of the member in the
+# archive, the path of the blob on disk (or ``None`` for directories) and the
+# modification date of the member.
+ZipMember = t.Tuple[str, t.Optional[str], datetime.datetime]
 
-    will be moved to files given by :py:func:`random_file_path` and the object
-    returned will represent the file structure, which will be something like
-    this:
 
-    .. code:: python
+class _ZipStreamBuffer:
+    """A write only file like object that buffers everything written to it by
+    a :class:`zipfile.ZipFile`, so it can be yielded as chunks.
 
-      {
-          'dir1': {
-              [
-                  'dir 2':{
-                      [
-                          ('file 1', 'new_name'),
-                          ('file 2', 'new_name2')
-                      ]
-                  },
-                  ('file 3', 'new_name3')
-              ]
-          }
-      }
-
-    :param str rootdir: The root directory to rename, files will not be removed
-    :returns: The tree as described above
-    :rtype: dict[str, dict[str, list[dict or tuple[str, str,]]]]
-    """
-    directory = {}  # type: t.MutableMapping[str, t.Any]
-    rootdir = rootdir.rstrip(os.sep)
-    start = rootdir.rfind(os.sep) + 1
-    for path, _, files in os.walk(rootdir):
-        folders = path[start:].split(os.sep)
-        subdir = dict.fromkeys(files)
-
-        # `reduce` returns a reference within `directory` so `directory` will
-        # change on the next two lines.
-        parent = reduce(dict.get, folders[:-1], directory)
-        parent[folders[-1]] = subdir
-
-    def __to_lists(name: str,
-                   dirs: t.Mapping[str, t.Any]) -> t.Sequence[t.Any]:
-        res = [
-        ]  # type: t.List[t.Union[t.Tuple[str, str], t.Mapping[str, t.Any]]]
-        for key, value in dirs.items():
-            if value is None:
-                new_name, filename = random_file_path()
-                # type filename: str
-                shutil.move(os.path.join(name, key), new_name)
-                res.append((key, filename))
+    As this object is not seekable :class:`zipfile.ZipFile` will use data
+    descriptors for all members.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: t.List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        """Get and clear all data written since the last call to this method.
+
+        :returns: The buffered data.
+        """
+        res = b''.join(self._chunks)
+        self._chunks = []
+        return res
+
+
+def get_zip_members(code: models.File,
+                    exclude: models.FileOwner) -> t.List[ZipMember]:
+    """Get the members of a zip archive of the given file tree.
+
+    The members are in database tree order, directories are only included if
+    they are the given ``code`` or if they are empty as all other directories
+    are implied by the files in them.
+
+    :param code: The root of the tree to get the members for.
+    :param exclude: The file owner to exclude.
+    :returns: The members of the archive.
+    """
+    if not code.is_directory:
+        return [(code.name, code.get_diskname(), code.modification_date)]
+
+    children = models.File.get_children_of_work(code.work_id, exclude)
+    return _get_zip_members_from_children(children, [code], '')
+
+
+def _get_zip_members_from_children(
+    children: t.Mapping[t.Optional[int], t.List[models.FileRow]],
+    roots: t.Iterable[models.FileRow],
+    prefix: str,
+) -> t.List[ZipMember]:
+    """Get the members of a zip archive from the given grouped file rows.
+
+    :param children: The rows of the files grouped by their parent, see
+        :py:meth:`.models.File.group_rows_by_parent`.
+    :param roots: The rows of the roots of the trees to add to the archive.
+    :param prefix: The prefix for the names of all the members.
+    :returns: The members of the archive, in the same order as
+        :py:func:`get_zip_members`.
+    """
+    res: t.List[ZipMember] = []
+
+    def __add(row: models.FileRow, name: str, is_root: bool) -> None:
+        if not row.is_directory:
+            res.append(
+                (
+                    name,
+                    os.path.join(app.config['UPLOAD_DIR'], row.filename),
+                    row.modification_date,
+                )
+            )
+            return
+
+        subs = children.get(row.id, [])
+        if is_root or not subs:
+            res.append((name, None, row.modification_date))
+        for child in subs:
+            __add(child, f'{name}/{child.name}', False)
+
+    for root in roots:
+        __add(root, f'{prefix}{root.name}', True)
+    return res
+
+
+def iter_zip(members: t.Iterable[ZipMember]) -> t.Iterator[bytes]:
+    """Create a zip archive of the given members and yield it in chunks.
+
+    The contents of every member are read directly from the blob store, so the
+    archive is never completely in memory or on disk. Members that are
+    symlinks are skipped as their target should never be read.
+
+    :param members: The members of the archive, see
+        :py:func:`get_zip_members`.
+    :returns: An iterator of the chunks of the archive.
+    """
+    buf = _ZipStreamBuffer()
+
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+        for name, diskname, mod_date in members:
+            date_time = mod_date.timetuple()[:6]
+
+            if diskname is None:
+                zinfo = zipfile.ZipInfo(f'{name}/', date_time)
+                # This is the same as ``zipfile.ZipFile.write`` for directories.
+                zinfo.external_attr = 0o40775 << 16 | 0x10
+                zipf.writestr(zinfo, b'')
+            elif os.path.islink(diskname):
+                continue
             else:
-                res.append(
-                    {
-                        key: __to_lists(os.path.join(name, key), value),
-                    }
+                zinfo = zipfile.ZipInfo(name, date_time)
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zinfo.external_attr = 0o644 << 16
+                zinfo.file_size = os.path.getsize(diskname)
+                with open(diskname, 'rb') as src, zipf.open(zinfo, 'w') as dst:
+                    for chunk in iter(lambda: src.read(_BLOB_CHUNK_SIZE), b''):
+                        dst.write(chunk)
+                        data = buf.pop()
+                        if data:
+                            yield data
+
+            data = buf.pop()
+            if data:
+                yield data
+
+    yield buf.pop()
+
+
+def stream_zip(members: t.Sequence[ZipMember]) -> t.Iterator[bytes]:
+    """Stream a zip archive of the given members.
+
+    If ``ZIP_CACHE_DIR`` is configured the archive is stored in this directory
+    while it is streamed, and served from there the next time an archive with
+    exactly the same members is requested. As the blobs in the store are
+    immutable the names of the blobs identify their contents. The cache is
+    pruned periodically by :py:func:`prune_zip_cache`.
+
+    :param members: The members of the archive, see
+        :py:func:`get_zip_members`.
+    :returns: An iterator of the chunks of the archive.
+    """
+    cache_dir = app.config['ZIP_CACHE_DIR']
+    if not cache_dir:
+        yield from iter_zip(members)
+        return
+
+    key = hashlib.sha256()
+    for name, diskname, mod_date in members:
+        blob = '' if diskname is None else os.path.basename(diskname)
+        key.update(f'{name}\0{blob}\0{mod_date.isoformat()}\n'.encode())
+    cache_path = os.path.join(cache_dir, f'{key.hexdigest()}.zip')
+
+    try:
+        cached = open(cache_path, 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        with cached:
+            # Mark the cache entry as recently used.
+            os.utime(cache_path)
+            yield from iter(lambda: cached.read(_BLOB_CHUNK_SIZE), b'')
+        return
+
+    tmp_path = f'{cache_path}.{uuid.uuid4()}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter_zip(members):
+                f.write(chunk)
+                yield chunk
+        try:
+            os.replace(tmp_path, cache_path)
+        except FileNotFoundError:  # pragma: no cover
+            # The cache was pruned while the archive was written.
+            pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune_directory(
+    directory: str,
+    max_age: t.Optional[datetime.timedelta] = None,
+    max_size: t.Optional[int] = None,
+    keep: t.Container[str] = frozenset(),
+) -> int:
+    """Remove old files from the given directory.
+
+    First all files that have not been modified for longer than ``max_age``
+    are removed, after which the least recently modified files are removed
+    until the total size of the files in the directory is at most
+    ``max_size``. Subdirectories are not considered.
+
+    :param directory: The directory to prune.
+    :param max_age: The maximum age of a file, or ``None`` if files should
+        not be removed because of their age.
+    :param max_size: The maximum total size of the files in the directory in
+        bytes, or ``None`` if the total size is not limited.
+    :param keep: The names of the files that should never be removed, these
+        files do not count towards the total size.
+    :returns: The amount of bytes reclaimed.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        try:
+            if entry.name not in keep and entry.is_file(
+                follow_symlinks=False
+            ):
+                stat = entry.stat(follow_symlinks=False)
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:  # pragma: no cover
+            # The file was removed while we were scanning.
+            pass
+    # Newest first, so the oldest files are popped first.
+    entries.sort(reverse=True)
+
+    total_size = sum(size for _, size, _ in entries)
+    min_mtime = None
+    if max_age is not None:
+        min_mtime = (datetime.datetime.now() - max_age).timestamp()
+
+    reclaimed = 0
+    while entries:
+        mtime, size, path = entries[-1]
+        too_old = min_mtime is not None and mtime < min_mtime
+        too_big = max_size is not None and total_size > max_size
+        if not (too_old or too_big):
+            break
+
+        entries.pop()
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # pragma: no cover
+            continue
+        total_size -= size
+        reclaimed += size
+
+    return reclaimed
+
+
+def prune_zip_cache() -> int:
+    """Remove the archives from the ``ZIP_CACHE_DIR`` that have not been used
+    for ``ZIP_CACHE_MAX_AGE`` seconds and the least recently used archives if
+    the cache is larger than ``ZIP_CACHE_MAX_SIZE`` bytes.
+
+    :returns: The amount of bytes reclaimed.
+    """
+    cache_dir = app.config['ZIP_CACHE_DIR']
+    if not cache_dir:
+        return 0
+    return prune_directory(
+        cache_dir,
+        datetime.timedelta(seconds=app.config['ZIP_CACHE_MAX_AGE']),
+        app.config['ZIP_CACHE_MAX_SIZE'],
+    )
+
+
+def export_submissions(
+    assignment: models.Assignment,
+    exclude: models.FileOwner,
+    report_progress: t.Callable[[int, int], None],
+) -> str:
+    """Create a zip archive of the latest submissions of an assignment.
+
+    Every submission is stored in a directory named after the username of its
+    author. The submissions are retrieved in batches of ``STREAM_BATCH_SIZE``,
+    the files of every batch are loaded with a single query and the contents
+    of the files are streamed into the archive.
+
+    :param assignment: The assignment to export.
+    :param exclude: The file owner to exclude.
+    :param report_progress: Function called with the amount of exported
+        submissions and the total amount of submissions every time a batch of
+        submissions has been exported. No query of this function is being
+        iterated when it is called, so it may commit the current session.
+    :returns: The name of the archive in the ``MIRROR_UPLOAD_DIR``.
+    """
+    batch_size = app.config['STREAM_BATCH_SIZE']
+    total = assignment.get_from_latest_submissions(func.count()).scalar()
+    works = assignment.get_from_latest_submissions(
+        t.cast(DbColumn[int], models.Work.id),
+        t.cast(DbColumn[str], models.User.username),
+    ).join(
+        models.User,
+        models.User.id == models.Work.user_id,
+    ).order_by(models.Work.id)
+
+    def __members() -> t.Iterator[ZipMember]:
+        done = 0
+        last_id = None
+        while True:
+            batch = works if last_id is None else works.filter(
+                models.Work.id > last_id
+            )
+            # Usernames like ``..`` are empty after sanitizing, so the id of
+            # the work is used as name of their directory instead.
+            work_dirs = {
+                work_id: (
+                    username.replace('/', '_').lstrip('.') or
+                    f'work-{work_id}'
                 )
-        return res
+                for work_id, username in batch.limit(batch_size).all()
+            }
+            if not work_dirs:
+                break
+            last_id = max(work_dirs)
+
+            rows = models.File.query_rows(
+                t.cast(DbColumn[int],
+                       models.File.work_id).in_(list(work_dirs)),
+                models.File.fileowner != exclude,
+            ).yield_per(batch_size)
+            for work_id, work_rows in itertools.groupby(rows, itemgetter(0)):
+                children = models.File.group_rows_by_parent(work_rows)
+                yield from _get_zip_members_from_children(
+                    children, children[None], f'{work_dirs[work_id]}/'
+                )
+
+            done += len(work_dirs)
+            report_progress(done, total)
 
-    result_lists = __to_lists(rootdir[:start], directory)
-    assert len(result_lists) == 1
-    return result_lists[0]
+    path, name = random_file_path('MIRROR_UPLOAD_DIR')
+    with open(path, 'wb') as f:
+        for chunk in iter_zip(__members()):
+            f.write(chunk)
+
+    report_progress(total, total)
+    return name
 
 
 def is_archive(file: FileStorage) -> bool:
@@ -314,17 +739,153 @@ def is_archive(file: FileStorage) -> bool:
     return file.filename.endswith(_KNOWN_ARCHIVE_EXTENSIONS)
 
 
-def extract_to_temp(
+_ArchiveMember = t.Tuple[t.List[str], int, t.Optional[int]]  # pylint: disable=invalid-name
+
+
+def _get_archive_members(arch: archive.Archive) -> t.Iterator[_ArchiveMember]:
+    """Get information about the members of the given archive.
+
+    Only the headers of the members are read, the members are not extracted.
+
+    :param arch: The archive to get the members of.
+    :returns: An iterator producing for every member the paths it creates, its
+        uncompressed size and its compressed size. The paths of directories
+        end with a slash. The compressed size is ``None`` if it is not known,
+        for example because the archive is compressed as a whole.
+    """
+    arch_impl = arch._archive  # pylint: disable=protected-access
+
+    if isinstance(arch_impl, archive.TarArchive):
+        info: tarfile.TarInfo
+        # We need the protected access as this not publicly exposed. The
+        # version is pinned so this should be fine. Iterating the tarfile
+        # reads the headers one by one, so we can stop at any member.
+        for info in arch_impl._archive:  # pylint: disable=protected-access
+            name = info.name + '/' if info.isdir() else info.name
+            yield [name], info.size, None
+    elif isinstance(arch_impl, archive.ZipArchive):
+        seen_dirs: t.Set[str] = set()
+        zip_info: zipfile.ZipInfo
+        for zip_info in arch_impl._archive.infolist():  # pylint: disable=protected-access
+            # The parent directories of a member do not have to be present in
+            # a zip archive, but they are created when extracting it.
+            paths = []
+            f = zip_info.filename
+            first = True
+            while f and f not in seen_dirs:
+                f, tail = os.path.split(f)
+                cur_path = (f + '/' if f else '') + tail
+                # We add p without trailing slash as this is easier to search
+                # for
+                seen_dirs.add(cur_path)
+                if not first:
+                    cur_path += '/'
+                paths.append(cur_path)
+
+                first = False
+            yield paths, zip_info.file_size, zip_info.compress_size
+    else:  # pragma: no cover
+        # This else is not possible as our archive package only supports
+        # tar.gz and zip files. However it doesn't hurt to have it here.
+        for name in arch.filenames():
+            yield [name], 0, None
+
+
+def _is_compressed_too_much(size: int, compressed_size: int) -> bool:
+    if size <= _MIN_SIZE_FOR_RATIO_CHECK:
+        return False
+    max_ratio = app.config['MAX_ARCHIVE_COMPRESSION_RATIO']
+    return size > compressed_size * max_ratio
+
+
+def check_archive(arch: archive.Archive, archive_size: int) -> t.List[str]:
+    """Check that the given archive is not too large to extract.
+
+    This only reads the headers of the members of the archive, so archives
+    that contain too many files (``MAX_ARCHIVE_ENTRIES``), are too large when
+    extracted (``MAX_ARCHIVE_SIZE``) or have a suspiciously high compression
+    ratio (``MAX_ARCHIVE_COMPRESSION_RATIO``) are rejected before anything is
+    written to disk.
+
+    :param arch: The archive to check.
+    :param archive_size: The size of the archive in bytes.
+    :returns: The paths of all files and directories that are created when
+        extracting the archive, the paths of directories end with a slash.
+
+    :raises APIException: If the archive contains too many members.
+        (TOO_MANY_FILES_IN_ARCHIVE)
+    :raises APIException: If the archive is too large when extracted.
+        (ARCHIVE_TOO_LARGE)
+    :raises APIException: If the archive or one of its members has a too high
+        compression ratio. (ARCHIVE_COMPRESSION_TOO_HIGH)
+    """
+    max_entries = app.config['MAX_ARCHIVE_ENTRIES']
+    max_size = app.config['MAX_ARCHIVE_SIZE']
+
+    paths: t.List[str] = []
+    total_size = 0
+
+    for amount, (member_paths, size, compressed_size) in enumerate(
+        _get_archive_members(arch), 1
+    ):
+        if amount > max_entries:
+            raise APIException(
+                'The given archive contains too many files',
+                f'The archive contains more than {max_entries} members',
+                APICodes.TOO_MANY_FILES_IN_ARCHIVE,
+                400,
+            )
+
+        total_size += size
+        if total_size > max_size:
+            raise APIException(
+                'The given archive is too large when extracted',
+                f'The archive is larger than {max_size} bytes when extracted',
+                APICodes.ARCHIVE_TOO_LARGE,
+                400,
+            )
+
+        if compressed_size is not None and _is_compressed_too_much(
+            size, compressed_size
+        ):
+            raise APIException(
+                'The given archive is compressed too much',
+                f'The member "{member_paths[0]}" has a compression ratio'
+                ' that is too high',
+                APICodes.ARCHIVE_COMPRESSION_TOO_HIGH,
+                400,
+            )
+
+        paths.extend(member_paths)
+
+    if _is_compressed_too_much(total_size, archive_size):
+        raise APIException(
+            'The given archive is compressed too much',
+            'The archive has a compression ratio that is too high',
+            APICodes.ARCHIVE_COMPRESSION_TOO_HIGH,
+            400,
+        )
+
+    return paths
+
+
+@contextlib.contextmanager
+def _open_archive(
     file: FileStorage,
     ignore_filter: IgnoreFilterManager,
-    handle_ignore: IgnoreHandling = IgnoreHandling.keep
-) -> str:
-    """Extracts the contents of file into a temporary directory.
+    handle_ignore: IgnoreHandling,
+) -> t.Iterator[archive.Archive]:
+    """Open the given archive after checking it.
 
-    :param file: The archive to extract.
+    The archive is checked with :py:func:`check_archive`, and if
+    ``handle_ignore`` is ``IgnoreHandling.error`` it is also checked that it
+    does not contain ignored files. Errors raised while the archive is open
+    are converted to :class:`.APIException` objects.
+
+    :param file: The archive to open.
     :param ignore_filter: The files and directories that should be ignored.
     :param handle_ignore: Determines how ignored files should be handled.
-    :returns: The pathname of the new temporary directory.
+    :returns: A context manager producing the opened archive.
     """
     tmpfd, tmparchive = tempfile.mkstemp()
 
@@ -333,19 +894,17 @@ def extract_to_temp(
         tmparchive += os.path.basename(
             secure_filename('archive_' + file.filename)
         )
-        tmpdir = tempfile.mkdtemp()
         file.save(tmparchive)
 
+        arch = archive.Archive(tmparchive)
+        paths = check_archive(arch, os.path.getsize(tmparchive))
+
         if handle_ignore == IgnoreHandling.error:
-            arch = archive.Archive(tmparchive)
-            wrong_files = ignore_filter.get_ignored_files_in_archive(arch)
+            wrong_files = ignore_filter.get_ignored_files(paths)
             if wrong_files:
                 raise IgnoredFilesException(invalid_files=wrong_files)
-            arch.extract(to_path=tmpdir, method='safe')
-        else:
-            archive.extract(tmparchive, to_path=tmpdir, method='safe')
-            if handle_ignore == IgnoreHandling.delete:
-                ignore_filter.delete_from_dir(tmpdir)
+
+        yield arch
     except (tarfile.ReadError, zipfile.BadZipFile):
         raise APIException(
             'The given archive could not be extracted',
@@ -364,49 +923,238 @@ def extract_to_temp(
         os.close(tmpfd)
         os.remove(tmparchive)
 
+
+def extract_to_temp(
+    file: FileStorage,
+    ignore_filter: IgnoreFilterManager,
+    handle_ignore: IgnoreHandling = IgnoreHandling.keep
+) -> str:
+    """Extracts the contents of file into a temporary directory.
+
+    The archive is checked with :py:func:`check_archive` before it is
+    extracted.
+
+    :param file: The archive to extract.
+    :param ignore_filter: The files and directories that should be ignored.
+    :param handle_ignore: Determines how ignored files should be handled.
+    :returns: The pathname of the new temporary directory.
+    """
+    with _open_archive(file, ignore_filter, handle_ignore) as arch:
+        tmpdir = tempfile.mkdtemp()
+        arch.extract(to_path=tmpdir, method='safe')
+        if handle_ignore == IgnoreHandling.delete:
+            ignore_filter.delete_from_dir(tmpdir)
+
     return tmpdir
 
 
+def _split_member_name(name: str) -> t.List[str]:
+    """Split the name of an archive member into the parts of its path.
+
+    :param name: The name of the member.
+    :returns: The parts of the normalized path of the member, this list is
+        empty for the root of the archive.
+    :raises archive.UnsafeArchive: If the member would be extracted outside
+        of the archive.
+    """
+    parts: t.List[str] = []
+    is_unsafe = name.startswith('/')
+
+    for part in name.split('/'):
+        if part == '..':
+            is_unsafe = is_unsafe or not parts
+            parts = parts[:-1]
+        elif part and part != '.':
+            parts.append(part)
+
+    if is_unsafe:
+        raise archive.UnsafeArchive(
+            'Archive member destination is outside the target directory.'
+            f' member: {name}'
+        )
+    return parts
+
+
+def extract_to_blob_store(
+    arch: archive.Archive,
+    ignore_filter: t.Optional[IgnoreFilterManager] = None,
+) -> ExtractFileTreeValue:
+    """Extract the members of the given archive into the blob store.
+
+    The members are streamed directly into the blob store (see
+    :py:func:`store_blob`), in the order in which they appear in the archive.
+    The structure of the archive is built in memory, so nothing is extracted
+    to a temporary directory. An archive like:
+
+    - dir1
+        - dir 2
+            - file 1
+            - file 2
+        - file 3
+
+    will be returned as something like this:
+
+    .. code:: python
+
+      [
+          {
+              'dir1': [
+                  {
+                      'dir 2': [
+                          ('file 1', 'new_name'),
+                          ('file 2', 'new_name2')
+                      ]
+                  },
+                  ('file 3', 'new_name3')
+              ]
+          }
+      ]
+
+    Symlinks are stored as symlinks with a random name and never shared, other
+    special files (like devices) are skipped. If the archive contains a file
+    multiple times only the last member is stored.
+
+    :param arch: The archive to extract, which should be checked by
+        :py:func:`check_archive`.
+    :param ignore_filter: If given all members ignored by this filter are
+        skipped.
+    :returns: The tree of the archive as described above.
+    :raises archive.UnsafeArchive: If a member would be extracted outside of
+        the archive or if a path is both a file and a directory.
+    """
+    arch_impl = arch._archive  # pylint: disable=protected-access
+    is_tar = isinstance(arch_impl, archive.TarArchive)
+    # We need the protected access as this not publicly exposed. The version
+    # is pinned so this should be fine.
+    if is_tar:
+        members = arch_impl._archive.getmembers()  # pylint: disable=protected-access
+    else:
+        members = arch_impl._archive.infolist()  # pylint: disable=protected-access
+
+    # The directories are dictionaries mapping names to their children, files
+    # are the member that should be stored for them. Nothing is stored until
+    # the entire tree is known, so an invalid archive is rejected before any
+    # blob is stored and a file that occurs multiple times is only stored once.
+    root: t.Dict[str, t.Any] = {}
+
+    def __get_files(tree: t.Mapping[str, t.Any]) -> t.Iterator[t.Any]:
+        for value in tree.values():
+            if isinstance(value, dict):
+                yield from __get_files(value)
+            else:
+                yield value
+
+    def __get_dir(parts: t.Sequence[str]) -> t.Dict[str, t.Any]:
+        cur = root
+        for part in parts:
+            cur = cur.setdefault(part, {})
+            if not isinstance(cur, dict):
+                raise archive.UnsafeArchive(
+                    f'Archive member "{"/".join(parts)}" is both a file and'
+                    ' a directory'
+                )
+        return cur
+
+    for member in members:
+        if is_tar:
+            name, is_dir = member.name, member.isdir()
+            if not (
+                is_dir or member.isfile() or member.issym() or member.islnk()
+            ):
+                continue
+        else:
+            name, is_dir = member.filename, member.filename.endswith('/')
+
+        parts = _split_member_name(name)
+        if not parts:
+            continue
+
+        if ignore_filter is not None and ignore_filter.is_ignored(
+            '/'.join(parts) + ('/' if is_dir else '')
+        )[0]:
+            continue
+
+        if is_dir:
+            __get_dir(parts)
+        else:
+            parent = __get_dir(parts[:-1])
+            if isinstance(parent.get(parts[-1]), dict):
+                raise archive.UnsafeArchive(
+                    f'Archive member "{"/".join(parts)}" is both a file and'
+                    ' a directory'
+                )
+            parent[parts[-1]] = member
+
+    to_store = set(id(member) for member in __get_files(root))
+    filenames: t.Dict[int, str] = {}
+    for member in members:
+        if id(member) not in to_store:
+            continue
+        elif is_tar and member.issym():
+            # Symlinks are kept as is and never shared, as hashing them would
+            # follow the link.
+            path, filename = random_file_path()
+            os.symlink(member.linkname, path)
+        elif is_tar:
+            try:
+                stream = arch_impl._archive.extractfile(member)  # pylint: disable=protected-access
+            except KeyError:
+                # A hard link to a file that is not in the archive.
+                continue
+            with stream:
+                filename = store_blob(stream)
+        else:
+            with arch_impl._archive.open(member) as stream:  # pylint: disable=protected-access
+                filename = store_blob(stream)
+        filenames[id(member)] = filename
+
+    def __to_lists(dirs: t.Mapping[str, t.Any]) -> ExtractFileTreeValue:
+        res: ExtractFileTreeValue = []
+        for key, value in dirs.items():
+            if isinstance(value, dict):
+                res.append({key: __to_lists(value)})
+            elif id(value) in filenames:
+                res.append((key, filenames[id(value)]))
+        return res
+
+    return __to_lists(root)
+
+
 def extract(
     file: FileStorage,
     ignore_filter: IgnoreFilterManager = None,
     handle_ignore: IgnoreHandling = IgnoreHandling.keep
 ) -> t.Optional[ExtractFileTree]:
-    """Extracts all files in archive with random name to uploads folder.
+    """Extracts all files in archive into the blob store.
 
     :param werkzeug.datastructures.FileStorage file: The file to extract.
     :param ignore_filter: What files should be ignored in the given archive.
         This can only be None when ``handle_ignore`` is
         ``IgnoreHandling.keep``.
     :param handle_ignore: How should ignored file be handled.
-    :returns: A file tree as generated by
-        :py:func:`rename_directory_structure`.
+    :returns: A file tree with the files of the archive as described by
+        :py:func:`extract_to_blob_store`, with a single root.
     """
     if handle_ignore == IgnoreHandling.keep and ignore_filter is None:
         ignore_filter = IgnoreFilterManager([])
     elif ignore_filter is None:  # pragma: no cover
         raise ValueError
 
-    tmpdir = extract_to_temp(
-        file,
-        ignore_filter,
-        handle_ignore,
-    )
-    rootdir = tmpdir.rstrip(os.sep)
-    start = rootdir.rfind(os.sep) + 1
-    try:
-        res = rename_directory_structure(tmpdir)[tmpdir[start:]]
-        filename: str = file.filename.split('.')[0]
-        if not res:
-            return None
-        elif len(res) > 1:
-            return {filename: res if isinstance(res, list) else [res]}
-        elif isinstance(res[0], t.MutableMapping):
-            return res[0]
-        else:
-            return {filename: res}
-    finally:
-        shutil.rmtree(tmpdir)
+    with _open_archive(file, ignore_filter, handle_ignore) as arch:
+        res = extract_to_blob_store(
+            arch,
+            ignore_filter if handle_ignore == IgnoreHandling.delete else None,
+        )
+
+    filename: str = file.filename.split('.')[0]
+    if not res:
+        return None
+    elif len(res) > 1:
+        return {filename: res}
+    elif isinstance(res[0], t.MutableMapping):
+        return res[0]
+    else:
+        return {filename: res}
 
 
 def random_file_path(config_key: str = 'UPLOAD_DIR') -> t.Tuple[str, str]:
@@ -426,6 +1174,159 @@ def random_file_path(config_key: str = 'UPLOAD_DIR') -> t.Tuple[str, str]:
     return candidate, name
 
 
+def _move_to_blob_store(path: str, digest: str) -> str:
+    """Move the file at the given path to its location in the blob store.
+
+    If a blob with the given digest already exists it is not written again, as
+    its contents are the same. Its modification time is updated instead, so it
+    is not removed as an unreferenced blob before the current transaction is
+    committed, and the file at the given path is removed.
+
+    :param path: The path of the file to move.
+    :param digest: The hex digest of the contents of the file.
+    :returns: The name of the blob in the upload directory.
+    """
+    blob_path = os.path.join(app.config['UPLOAD_DIR'], digest)
+    try:
+        os.utime(blob_path)
+    except FileNotFoundError:
+        shutil.move(path, blob_path)
+    else:
+        os.remove(path)
+    return digest
+
+
+def store_blob(stream: t.BinaryIO) -> str:
+    """Store the contents of the given stream in the blob store.
+
+    Blobs are stored in the ``UPLOAD_DIR`` under the sha256 hex digest of their
+    contents, so files with the same contents share one blob on disk. The
+    returned name should be stored as :attr:`.models.File.filename`, the number
+    of files with this filename is the reference count of the blob.
+
+    :param stream: The stream to read the contents from.
+    :returns: The name of the blob in the upload directory.
+    """
+    tmp_path, _ = random_file_path()
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as dst:
+            for chunk in iter(lambda: stream.read(_BLOB_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+        return _move_to_blob_store(tmp_path, digest.hexdigest())
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _get_referenced_blobs(filenames: t.Collection[str]) -> t.Set[str]:
+    return set(
+        filename for filename, in models.db.session.query(
+            models.File.filename,
+        ).filter(
+            t.cast(DbColumn[str], models.File.filename).in_(filenames),
+        ).distinct()
+    )
+
+
+def _remove_blob(filename: str, min_mtime: float) -> int:
+    """Remove the given blob if it was not modified after ``min_mtime``.
+
+    Storing a blob always updates the modification time of the blob, so a blob
+    that is (re)stored by a transaction that is not yet committed is never
+    removed.
+
+    :returns: The amount of bytes reclaimed.
+    """
+    path = os.path.join(app.config['UPLOAD_DIR'], filename)
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime > min_mtime:
+            return 0
+        os.remove(path)
+    except FileNotFoundError:  # pragma: no cover
+        return 0
+    return stat.st_size
+
+
+def _get_min_blob_mtime() -> float:
+    return (
+        datetime.datetime.now() -
+        datetime.timedelta(seconds=app.config['UNREFERENCED_BLOB_MIN_AGE'])
+    ).timestamp()
+
+
+def delete_unreferenced_blobs(filenames: t.Iterable[str]) -> None:
+    """Delete the given blobs from the blob store if no file references them.
+
+    The pending changes of the current session are flushed first, so files
+    that are deleted in the current transaction do not count as a reference.
+    The blobs are only deleted when the transaction of the current session is
+    committed, and blobs that were stored in the last
+    ``UNREFERENCED_BLOB_MIN_AGE`` seconds are left to
+    :py:func:`prune_unreferenced_blobs`, as another transaction might be
+    about to reference them.
+
+    :param filenames: The names of the blobs that might not be used anymore.
+    :returns: Nothing.
+    """
+    filenames = set(filenames)
+    if not filenames:
+        return
+
+    models.db.session.flush()
+    unused = filenames - _get_referenced_blobs(filenames)
+    if unused:
+        models.db.session.info.setdefault(_PENDING_BLOB_DELETIONS,
+                                          set()).update(unused)
+
+
+@event.listens_for(orm.Session, 'after_commit')
+def _delete_pending_blobs(session: orm.Session) -> None:
+    filenames = session.info.pop(_PENDING_BLOB_DELETIONS, None)
+    if filenames:
+        min_mtime = _get_min_blob_mtime()
+        for filename in filenames:
+            _remove_blob(filename, min_mtime)
+
+
+@event.listens_for(orm.Session, 'after_rollback')
+def _discard_pending_blobs(session: orm.Session) -> None:
+    session.info.pop(_PENDING_BLOB_DELETIONS, None)
+
+
+def prune_unreferenced_blobs() -> int:
+    """Remove all blobs from the blob store that are not referenced by any
+    file.
+
+    Blobs that were stored in the last ``UNREFERENCED_BLOB_MIN_AGE`` seconds
+    are not removed, as the transaction storing them might not be committed
+    yet.
+
+    :returns: The amount of bytes reclaimed.
+    """
+    min_mtime = _get_min_blob_mtime()
+    candidates = []
+    for entry in os.scandir(app.config['UPLOAD_DIR']):
+        try:
+            if (
+                _BLOB_NAME.match(entry.name) and
+                entry.is_file(follow_symlinks=False) and
+                entry.stat(follow_symlinks=False).st_mtime <= min_mtime
+            ):
+                candidates.append(entry.name)
+        except FileNotFoundError:  # pragma: no cover
+            pass
+
+    reclaimed = 0
+    for i in range(0, len(candidates), _BLOB_QUERY_BATCH_SIZE):
+        batch = candidates[i:i + _BLOB_QUERY_BATCH_SIZE]
+        for filename in set(batch) - _get_referenced_blobs(batch):
+            reclaimed += _remove_blob(filename, min_mtime)
+    return reclaimed
+
+
 def dehead_filetree(tree: ExtractFileTree) -> ExtractFileTree:
     """Remove the head of the given filetree while preserving the old head
     name.
@@ -467,7 +1368,7 @@ def process_files(
     :param ignore_filter: The files and directories that should be ignored.
     :param handle_ignore: Determines how ignored files should be handled.
     :returns: The tree of the files as is described by
-              :py:func:`rename_directory_structure`
+              :py:func:`extract_to_blob_store`
     """
 
     def consider_archive(f: FileStorage) -> bool:
@@ -502,9 +1403,7 @@ def process_files(
                             invalid_files=[(file.filename, line)]
                         )
 
-                new_file_name, filename = random_file_path()
-                res.append((file.filename, filename))
-                file.save(new_file_name)
+                res.append((file.filename, store_blob(file.stream)))
         if not res:
             raise_error()
         tree = {'top': res}
@@ -516,70 +1415,144 @@ def process_files(
     return dehead_filetree(tree)
 
 
+def _get_blackboard_files(
+    tmpdir: str,
+    info: blackboard.SubmissionInfo,
+) -> t.List[FileStorage]:
+    """Get the files of a single submission of a blackboard zip.
+
+    :param tmpdir: The directory the blackboard zip was extracted to.
+    :param info: The info of the submission.
+    :returns: The files of the submission.
+    """
+    files = []
+    for blackboard_file in info.files:
+        if isinstance(blackboard_file, blackboard.FileInfo):
+            name = blackboard_file.original_name
+            stream = open(
+                os.path.join(tmpdir, blackboard_file.name), mode='rb'
+            )
+        else:
+            name = blackboard_file[0]
+            stream = io.BytesIO(blackboard_file[1])
+
+        if name == '__WARNING__':
+            name = '__WARNING__ (User)'
+
+        files.append(FileStorage(stream=stream, filename=name))
+    return files
+
+
+def _process_blackboard_submission(
+    tmpdir: str,
+    info_file: str,
+) -> t.Tuple[blackboard.SubmissionInfo, ExtractFileTree]:
+    """Parse the given info file of a blackboard zip and extract the files of
+    the submission it describes.
+
+    :param tmpdir: The directory the blackboard zip was extracted to.
+    :param info_file: The name of the info file in ``tmpdir``.
+    :returns: The parsed info and the tree of the extracted files.
+    """
+    info = blackboard.parse_info_file(os.path.join(tmpdir, info_file))
+
+    try:
+        tree = process_files(_get_blackboard_files(tmpdir, info))
+    # TODO: We catch all exceptions, this should probably be narrowed
+    # down, however finding all exception types is difficult.
+    except Exception:  # pylint: disable=broad-except
+        files = _get_blackboard_files(tmpdir, info)
+        files.append(
+            FileStorage(
+                stream=io.BytesIO(
+                    b'Some files could not be extracted!',
+                ),
+                filename='__WARNING__'
+            )
+        )
+        tree = process_files(files, force_txt=True)
+
+    return info, tree
+
+
+def _init_blackboard_worker(config: t.Mapping[str, t.Any]) -> None:
+    """Initialize a worker process used to process blackboard zips.
+
+    The worker does not have access to the database, but the extraction
+    functions need an application context to access the configuration.
+
+    :param config: The configuration of the application.
+    :returns: Nothing.
+    """
+    worker_app = flask.Flask('psef')
+    worker_app.config.update(config)
+    worker_app.app_context().push()
+
+
 def process_blackboard_zip(
-    blackboard_zip: FileStorage
+    blackboard_zip: FileStorage,
+    report_progress: t.Optional[t.Callable[[int, int, ExtractFileTree], None]
+                                ] = None,
+    workers: t.Optional[int] = None,
 ) -> t.MutableSequence[t.Tuple[blackboard.SubmissionInfo, ExtractFileTree]]:
     """Process the given :py:mod:`.blackboard` zip file.
 
     This is done by extracting, moving and saving the tree structure of each
-    submission.
+    submission. The submissions are processed in parallel by a pool of
+    ``workers`` processes.
 
     :param file: The blackboard gradebook to import
+    :param report_progress: Function called every time a submission has been
+        processed with the amount of processed submissions, the total amount
+        of submissions and the tree of the processed submission.
+    :param workers: The amount of processes to use, if this is 1 no extra
+        processes are started. If not given ``BLACKBOARD_IMPORT_WORKERS`` is
+        used. This should be 1 when called from a daemonic process, like a
+        celery worker, as these cannot start processes.
     :returns: List of tuples (BBInfo, tree)
     """
-
-    def __get_files(info: blackboard.SubmissionInfo) -> t.List[FileStorage]:
-        files = []
-        for blackboard_file in info.files:
-            if isinstance(blackboard_file, blackboard.FileInfo):
-                name = blackboard_file.original_name
-                stream = open(
-                    os.path.join(tmpdir, blackboard_file.name), mode='rb'
-                )
-            else:
-                name = blackboard_file[0]
-                stream = io.BytesIO(blackboard_file[1])
-
-            if name == '__WARNING__':
-                name = '__WARNING__ (User)'
-
-            files.append(FileStorage(stream=stream, filename=name))
-        return files
-
     tmpdir = extract_to_temp(
         blackboard_zip,
         IgnoreFilterManager([]),
         IgnoreHandling.keep,
     )
     try:
-        info_files = filter(
-            None, (_BB_TXT_FORMAT.match(f) for f in os.listdir(tmpdir))
-        )
-        submissions = []
-        for info_file in info_files:
-            info = blackboard.parse_info_file(
-                os.path.join(tmpdir, info_file.string)
+        info_files = [
+            info_file.string for info_file in filter(
+                None, (_BB_TXT_FORMAT.match(f) for f in os.listdir(tmpdir))
             )
+        ]
+        if not info_files:
+            raise ValueError
 
-            try:
-                tree = process_files(__get_files(info))
-            # TODO: We catch all exceptions, this should probably be narrowed
-            # down, however finding all exception types is difficult.
-            except Exception:  # pylint: disable=broad-except
-                files = __get_files(info)
-                files.append(
-                    FileStorage(
-                        stream=io.BytesIO(
-                            b'Some files could not be extracted!',
-                        ),
-                        filename='__WARNING__'
-                    )
-                )
-                tree = process_files(files, force_txt=True)
+        process = partial(_process_blackboard_submission, tmpdir)
+        if workers is None:
+            workers = (
+                app.config['BLACKBOARD_IMPORT_WORKERS'] or os.cpu_count() or 1
+            )
+        workers = min(workers, len(info_files))
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(
+                workers,
+                initializer=_init_blackboard_worker,
+                initargs=(dict(app.config), ),
+            )
 
-            submissions.append((info, tree))
-        if not submissions:
-            raise ValueError
+        try:
+            submissions = []
+            for submission in (
+                map(process, info_files)
+                if pool is None else pool.imap(process, info_files)
+            ):
+                submissions.append(submission)
+                if report_progress is not None:
+                    report_progress(
+                        len(submissions), len(info_files), submission[1]
+                    )
+        finally:
+            if pool is not None:
+                pool.terminate()
     finally:
         shutil.rmtree(tmpdir)
     return submissions
@@ -5,18 +5,23 @@ This module implements generic helpers and convenience functions.
 """
 import re
 import abc
+import base64
 import typing as t
 import datetime
+import itertools
 from functools import wraps
 
 import flask
+import sqlalchemy
 import mypy_extensions
 from typing_extensions import Protocol
+from sqlalchemy.sql.expression import or_, and_
 
 import psef
 import psef.json as json
 import psef.errors
 import psef.models
+import psef.parsers
 
 if t.TYPE_CHECKING:  # pragma: no cover
     from psef import model_types  # pylint: disable=unused-import
@@ -385,11 +390,10 @@ def extended_jsonify(
     :returns: The response with the jsonified object as payload
     """
 
-    try:
-        psef.app.json_encoder = json.get_extended_encoder_class(use_extended)
-        response = flask.make_response(flask.jsonify(obj))
-    finally:
-        psef.app.json_encoder = json.CustomJSONEncoder
+    response = flask.current_app.response_class(
+        json.dumps(obj, json.get_extended_encoder_class(use_extended)),
+        mimetype=flask.current_app.config['JSONIFY_MIMETYPE'],
+    )
     response.status_code = status_code
 
     _maybe_add_warning(response, warning)
@@ -418,6 +422,279 @@ def jsonify(
     return response
 
 
+def stream_jsonify(
+    items: t.Iterable[T],
+    status_code: int = 200,
+    warning: t.Optional[psef.errors.HttpWarning] = None,
+) -> JSONResponse[t.Sequence[T]]:
+    """Create a response with the given items as a JSON list.
+
+    This function differs from :py:func:`jsonify` in that the list is encoded
+    while the response is sent, one item at a time. This means ``items`` can be
+    a query that is retrieved in batches (using ``yield_per``), so the memory
+    needed does not grow with the length of the list.
+
+    .. warning::
+
+        The status of the response is already sent when the items are
+        retrieved, so all checks that can fail should be done before calling
+        this function.
+
+    :param items: The items that will be jsonified using
+        :py:class:`~.psef.json.CustomJSONEncoder`
+    :param statuscode: The status code of the response
+    :param warning: The warning that should be added to the response
+    :returns: The response with the streamed list as payload
+    """
+    return _make_stream_response(
+        json.iterencode_list(items), status_code, warning
+    )
+
+
+def stream_jsonify_mapping(
+    items: t.Iterable[t.Tuple[str, T]],
+    status_code: int = 200,
+    warning: t.Optional[psef.errors.HttpWarning] = None,
+) -> JSONResponse[t.Mapping[str, T]]:
+    """Create a response with the given key value pairs as a JSON object.
+
+    This works the same as :py:func:`stream_jsonify`, however the keys of the
+    object are not sorted.
+
+    :param items: The key value pairs of the object.
+    :param statuscode: The status code of the response
+    :param warning: The warning that should be added to the response
+    :returns: The response with the streamed object as payload
+    """
+    return _make_stream_response(
+        json.iterencode_mapping(items), status_code, warning
+    )
+
+
+def _make_stream_response(
+    chunks: t.Iterator[str],
+    status_code: int,
+    warning: t.Optional[psef.errors.HttpWarning],
+) -> t.Any:
+    response = flask.current_app.response_class(
+        flask.stream_with_context(chunks),
+        mimetype=flask.current_app.config['JSONIFY_MIMETYPE'],
+    )
+    response.status_code = status_code
+
+    _maybe_add_warning(response, warning)
+
+    return response
+
+
+class KeysetPagination:
+    """Opt-in keyset (cursor based) pagination of a list.
+
+    Pagination is enabled by passing a ``limit`` or ``cursor`` query
+    parameter. A page contains at most ``limit`` items, if more items exist
+    the ``X-Next-Cursor`` header of the response contains a cursor that can be
+    passed as ``cursor`` parameter to retrieve the next page.
+
+    The items are ordered by a set of keys that together uniquely identify an
+    item, and a cursor contains the values of these keys for the last item of
+    a page. So the next page starts right after this item, even if items were
+    added or removed in the meantime.
+
+    :ivar limit: The maximum amount of items in a page.
+    :ivar next_cursor: The cursor of the next page, or ``None`` if the last
+        page has been retrieved.
+    """
+
+    HEADER = 'X-Next-Cursor'
+
+    def __init__(
+        self, limit: int, after: t.Optional[t.Sequence[t.Any]] = None
+    ) -> None:
+        self.limit = limit
+        self.next_cursor: t.Optional[str] = None
+        self._after = after
+
+    @classmethod
+    def from_request(cls: t.Type['KeysetPagination']
+                     ) -> t.Optional['KeysetPagination']:
+        """Get the pagination requested in the current request.
+
+        :returns: The requested pagination, or ``None`` if the request does not
+            ask for pagination.
+
+        :raises APIException: If the given limit or cursor is not valid.
+            (INVALID_PARAM)
+        """
+        args = flask.request.args
+        if 'limit' not in args and 'cursor' not in args:
+            return None
+
+        max_limit = psef.app.config['MAX_PAGE_SIZE']
+        try:
+            limit = int(args.get('limit', max_limit))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= max_limit:
+            raise psef.errors.APIException(
+                'The given limit is not valid',
+                f'The limit "{args.get("limit")}" is not between 1 and'
+                f' {max_limit}', psef.errors.APICodes.INVALID_PARAM, 400
+            )
+
+        cursor = args.get('cursor', '')
+        return cls(limit, cls._decode_cursor(cursor) if cursor else None)
+
+    @staticmethod
+    def _invalid_cursor(cursor: str) -> psef.errors.APIException:
+        return psef.errors.APIException(
+            'The given cursor is not valid',
+            f'The cursor "{cursor}" was not created for this list',
+            psef.errors.APICodes.INVALID_PARAM, 400
+        )
+
+    @classmethod
+    def _decode_cursor(cls, cursor: str) -> t.List[t.Any]:
+        try:
+            after = flask.json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii'))
+                .decode('utf8')
+            )
+        except ValueError:
+            after = None
+
+        if not isinstance(after, list) or not all(
+            isinstance(val,
+                       (str, int, float)) for val in after
+        ):
+            raise cls._invalid_cursor(cursor)
+        return after
+
+    def paginate(self, query: T, keys: t.Sequence[t.Tuple[t.Any, bool]]) -> T:
+        """Order the given query by the given keys and only select the items
+        of the requested page.
+
+        :param query: The query to paginate.
+        :param keys: The keys to order by, as tuples of a column and a boolean
+            indicating if the order should be descending. These keys should
+            uniquely identify a row.
+        :returns: The query, which produces at most one row more than the
+            limit. This extra row is used by :py:meth:`get_page` to determine
+            if there is a next page.
+        """
+        res = t.cast(t.Any, query)
+
+        if self._after is not None:
+            if len(self._after) != len(keys):
+                raise self._invalid_cursor(str(self._after))
+
+            values = []
+            for (col, _), val in zip(keys, self._after):
+                if isinstance(getattr(col, 'type', None), sqlalchemy.DateTime):
+                    val = psef.parsers.parse_datetime(val)
+                values.append(val)
+
+            after = []
+            for i, ((col, desc), val) in enumerate(zip(keys, values)):
+                after.append(
+                    and_(
+                        *(key == v for (key, _), v in zip(keys, values[:i])),
+                        col < val if desc else col > val,
+                    )
+                )
+            res = res.filter(or_(*after))
+
+        return res.order_by(
+            *(col.desc() if desc else col.asc() for col, desc in keys)
+        ).limit(self.limit + 1)
+
+    def get_page(
+        self,
+        rows: t.Iterable[T],
+        get_key: t.Callable[[T], t.Sequence[t.Any]],
+    ) -> t.List[T]:
+        """Get the items of the page from the rows of a paginated query.
+
+        :param rows: The rows produced by a query returned by
+            :py:meth:`paginate`, or items created from these rows.
+        :param get_key: A function that returns the values of the keys passed
+            to :py:meth:`paginate` for a given row.
+        :returns: The items of the page. If there is a next page its cursor is
+            stored in :py:attr:`next_cursor`.
+        """
+        page = list(itertools.islice(rows, self.limit + 1))
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            values = [
+                val.isoformat() if isinstance(val, datetime.datetime) else val
+                for val in get_key(page[-1])
+            ]
+            self.next_cursor = base64.urlsafe_b64encode(
+                flask.json.dumps(values).encode('utf8')
+            ).decode('ascii')
+        return page
+
+    def jsonify(
+        self,
+        obj: T,
+        status_code: int = 200,
+        warning: t.Optional[psef.errors.HttpWarning] = None,
+    ) -> JSONResponse[T]:
+        """Create a response with the given page as JSON payload.
+
+        This works the same as :py:func:`jsonify`, but also adds the cursor of
+        the next page to the response if there is one.
+        """
+        response = jsonify(obj, status_code, warning)
+        if self.next_cursor is not None:
+            response.headers[self.HEADER] = self.next_cursor
+        return response
+
+
+def etag_matches(etag: str) -> bool:
+    """Check if the client already has the version of the requested resource
+    with the given etag.
+
+    This can be used to skip building a response that would be replaced by a
+    ``304 Not Modified`` response by :py:func:`make_conditional` anyway.
+
+    :param etag: The strong etag of the current version of the resource.
+    :returns: ``True`` if the ``If-None-Match`` header of the current request
+        contains the given etag.
+    """
+    return flask.request.if_none_match.contains(etag)
+
+
+def make_conditional(
+    response: T,
+    etag: str,
+    complete_length: t.Optional[int] = None,
+) -> T:
+    """Add the given etag to the response and make it conditional.
+
+    If the ``If-None-Match`` header of the current ``GET`` request contains the
+    given etag the response is changed into a ``304 Not Modified`` response
+    without a body. The response is marked as private and clients should
+    always revalidate it, as the permissions of the user can change.
+
+    :param response: The response to make conditional, it should have a
+        status code of 200.
+    :param etag: The strong etag of the current version of the resource.
+    :param complete_length: If given range requests are supported, the body
+        of the response should be a file of this length.
+    :returns: The given response, which is modified in place.
+    """
+    res = t.cast('werkzeug.wrappers.Response', response)
+    res.set_etag(etag)
+    res.cache_control.private = True
+    res.cache_control.no_cache = True
+    res.make_conditional(
+        flask.request,
+        accept_ranges=complete_length is not None,
+        complete_length=complete_length,
+    )
+    return response
+
+
 def make_empty_response(
     warning: t.Optional[psef.errors.HttpWarning] = None,
 ) -> EmptyResponse:
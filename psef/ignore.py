@@ -10,9 +10,7 @@ import re
 import shutil
 import typing as t
 import os.path
-import tarfile
-
-import archive
+import functools
 
 
 class InvalidFile(ValueError):
@@ -59,32 +57,37 @@ def _translate_segment(segment: str) -> str:
     return ''.join(res)
 
 
+#: The flags of all translated patterns.
+_PATTERN_FLAGS = '(?ms)'
+
+
 def translate(pat: str) -> str:
     """Translate a shell PATTERN to a regular expression.
 
     There is no way to quote meta-characters.
 
     Originally copied from fnmatch in Python 2.7, but modified for Dulwich
-    to cope with features in Git ignore patterns.
+    to cope with features in Git ignore patterns. The returned regex does not
+    contain capturing groups, so it can be used as part of a larger regex.
     """
 
-    res = '(?ms)'
+    res = _PATTERN_FLAGS
 
     if '/' not in pat[:-1]:
         # If there's no slash, this is a filename-based match
-        res += '(.*/)?'
+        res += '(?:.*/)?'
 
     if pat.startswith('**/'):
         # Leading **/
         pat = pat[2:]
-        res += '(.*/)?'
+        res += '(?:.*/)?'
 
     if pat.startswith('/'):
         pat = pat[1:]
 
     for i, segment in enumerate(pat.split('/')):
         if segment == '**':
-            res += '(/.*)?'
+            res += '(?:/.*)?'
         else:
             res += (
                 (re.escape('/')
@@ -138,7 +141,8 @@ class Pattern:
                 pattern = pattern[1:]
             self.is_exclude = True
         flags = 0
-        self._re = re.compile(translate(pattern), flags)
+        self.regex = translate(pattern)
+        self._re = re.compile(self.regex, flags)
 
     def match(self, path: str) -> bool:
         """Try to match a path against this ignore pattern.
@@ -155,12 +159,48 @@ class IgnoreFilter:
 
     def __init__(self, patterns: t.Iterable[str]) -> None:
         self._patterns: t.List[Pattern] = []
+        self._combined: t.Optional[t.Pattern] = None
         for pattern, orig_line in read_ignore_patterns(patterns):
             self.append_pattern(pattern, orig_line)
 
     def append_pattern(self, pattern: str, orig_line: str) -> None:
         """Add a pattern to the set."""
         self._patterns.append(Pattern(pattern, orig_line))
+        self._combined = None
+
+    def _get_combined(self) -> t.Pattern:
+        """Get a single regex that matches if any of the patterns matches.
+
+        Every pattern is a named group ``p<index>`` in the regex. The
+        alternatives of a regex are tried from left to right, so the patterns
+        are added in reverse order to make the matching group the last pattern
+        that matches.
+        """
+        if self._combined is None:
+            self._combined = re.compile(
+                _PATTERN_FLAGS + '|'.join(
+                    f'(?P<p{i}>{pattern.regex[len(_PATTERN_FLAGS):]})' for i,
+                    pattern in reversed(list(enumerate(self._patterns)))
+                )
+            )
+        return self._combined
+
+    def find_last_matching(self, path: str) -> t.Optional[Pattern]:
+        """Find the last pattern that matches the given path.
+
+        This is the same as the last pattern produced by
+        :meth:`find_matching`, but the path is only matched once against a
+        regex combining all patterns.
+
+        :param path: Path to match
+        :returns: The last matching pattern or ``None`` if no pattern matches.
+        """
+        if not self._patterns:
+            return None
+        match = self._get_combined().match(path)
+        if match is None:
+            return None
+        return self._patterns[int(match.lastgroup[1:])]
 
     def find_matching(self, path: str) -> t.Iterable[Pattern]:
         """Yield all matching patterns for path.
@@ -173,6 +213,19 @@ class IgnoreFilter:
                 yield pattern
 
 
+@functools.lru_cache(maxsize=128)
+def _get_ignore_filter(lines: t.Tuple[str, ...]) -> IgnoreFilter:
+    """Get the filter for the given lines of an ignore file.
+
+    The filters are cached, so the combined regex of the ``cgignore`` of an
+    assignment is only compiled once per process.
+
+    :param lines: The lines of the ignore file.
+    :returns: A filter that should not be changed.
+    """
+    return IgnoreFilter(lines)
+
+
 class IgnoreFilterManager:
     """Ignore file manager."""
 
@@ -184,7 +237,11 @@ class IgnoreFilterManager:
             global_filters = []
         elif isinstance(global_filters, str):
             global_filters = global_filters.split('\n')
-        self._filter = IgnoreFilter(global_filters)
+        self._filter = _get_ignore_filter(tuple(global_filters))
+        # The last matching pattern of every directory that was checked. A
+        # directory is the parent of many files, so this prevents matching the
+        # same directory again for every file in it.
+        self._dir_matches: t.Dict[str, t.Optional[Pattern]] = {}
 
     def find_matching(self, path: str) -> t.Iterable[Pattern]:
         """Find matching patterns for path.
@@ -211,6 +268,33 @@ class IgnoreFilterManager:
                 return iter(matches)
         return iter([])
 
+    def find_last_matching(self, path: str) -> t.Optional[Pattern]:
+        """Find the last matching pattern for path.
+
+        This is the same as the last pattern produced by
+        :meth:`find_matching`, but the path and each of its directories are
+        only matched once.
+
+        :param path: Path to check
+        :return: The last matching pattern or ``None`` if no pattern matches.
+        """
+        if os.path.isabs(path):
+            raise InvalidFile(f'File "{path}" is an absolute path')
+
+        parts = path.split('/')
+
+        for i in range(len(parts)):
+            relpath = '/'.join(parts[:i]) + '/'
+            try:
+                match = self._dir_matches[relpath]
+            except KeyError:
+                match = self._filter.find_last_matching(relpath)
+                self._dir_matches[relpath] = match
+            if match is not None:
+                return match
+
+        return self._filter.find_last_matching(path)
+
     def is_ignored(self,
                    path: str) -> t.Tuple[t.Optional[bool], t.Optional[str]]:
         """Check whether a path is explicitly included or excluded in ignores.
@@ -219,9 +303,9 @@ class IgnoreFilterManager:
         :return: None if the file is not mentioned, True if it is included,
             False if it is explicitly excluded.
         """
-        matches = list(self.find_matching(path))
-        if matches:
-            return matches[-1].is_exclude, matches[-1].original_line
+        match = self.find_last_matching(path)
+        if match is not None:
+            return match.is_exclude, match.original_line
 
         return None, None
 
@@ -253,51 +337,21 @@ class IgnoreFilterManager:
                     assert to_remove.startswith(top)
                     os.unlink(to_remove)
 
-    def get_ignored_files_in_archive(
+    def get_ignored_files(
         self,
-        arch_wrapper: archive.Archive,
+        paths: t.Iterable[str],
     ) -> t.List[t.Tuple[str, str]]:
-        """Get all ignored files in the given archive.
+        """Get all ignored files in the given paths.
 
-        :param arch: The archive to check for ignored files.
-        :returns: All files that should be ignored.
+        :param paths: The paths to check, the paths of directories should end
+            with a slash. These paths can be retrieved from an archive using
+            :py:func:`psef.files.check_archive`.
+        :returns: All files that should be ignored with the line of the pattern
+            that ignored them.
         """
-        arch = arch_wrapper._archive  # pylint: disable=protected-access
-
-        def __get_names() -> t.Iterable[str]:
-            if isinstance(arch, archive.TarArchive):
-                info: tarfile.TarInfo
-                # We need the protected access as this not publicly
-                # exposed. The version is pinned so this should be fine
-                for info in arch._archive.getmembers():  # pylint: disable=protected-access
-                    if info.isdir():
-                        yield info.name + '/'
-                    else:
-                        yield info.name
-            elif isinstance(arch, archive.ZipArchive):
-                seen_dirs = set()
-                for f in arch.filenames():
-                    first = True
-                    while f and f not in seen_dirs:
-                        f, tail = os.path.split(f)
-                        cur_path = (f + '/' if f else '') + tail
-                        # We add p without trailing slash as this is easier to
-                        # search for
-                        seen_dirs.add(cur_path)
-                        if not first:
-                            cur_path += '/'
-                        yield cur_path
-
-                        first = False
-            else:  # pragma: no cover
-                # This else is not possible as our archive package only
-                # supports tar.gz and zip files. However it doesn't hurt to
-                # have it here.
-                yield from arch.filenames()
-
         wrong_files = []
-        for name in __get_names():
-            is_ignored, line = self.is_ignored(name)
+        for path in paths:
+            is_ignored, line = self.is_ignored(path)
             if is_ignored:
-                wrong_files.append((name, line))
+                wrong_files.append((path, line))
         return wrong_files
@@ -1,12 +1,35 @@
 """This module manages all json encoding for the backend.
 
+All encoders in this module are driven by the C accelerated encoder of the
+standard library (this one is used if it is available and the output is not
+indented), the ``__to_json__`` methods of objects are called from its
+``default`` hook. This is faster than first converting the entire object to
+plain python objects, as the encoder only calls back into python for objects it
+cannot encode itself.
+
 :license: AGPLv3, see LICENSE for details.
 """
 import typing as t
 from json import JSONEncoder
 
+import flask
+
+
+class _FastJSONEncoder(JSONEncoder):
+    """The base class of all JSON encoders of this module.
+
+    The representations returned by ``__to_json__`` methods never contain
+    cycles, so the encoder does not check for circular references. This saves
+    the bookkeeping of every encoded list and dict, and does not change the
+    output.
+    """
 
-class CustomJSONEncoder(JSONEncoder):
+    def __init__(self, **kwargs: t.Any) -> None:
+        kwargs['check_circular'] = False
+        super().__init__(**kwargs)
+
+
+class CustomJSONEncoder(_FastJSONEncoder):
     """This JSON encoder is used to enable the JSON serialization of custom
     classes.
 
@@ -42,7 +65,7 @@ def get_extended_encoder_class(
         class.
     """
 
-    class CustomExtendedJSONEncoder(JSONEncoder):
+    class CustomExtendedJSONEncoder(_FastJSONEncoder):
         """This JSON encoder is used to enable the JSON serialization of custom
         classes.
 
@@ -61,9 +84,10 @@ def get_extended_encoder_class(
 
             :param object obj: The object that should be converted to JSON.
             """
-            if hasattr(obj, '__extended_to_json__') and use_extended(obj):
+            to_json = getattr(obj, '__extended_to_json__', None)
+            if to_json is not None and use_extended(obj):
                 try:
-                    return obj.__extended_to_json__()
+                    return to_json()
                 except AttributeError:  # pragma: no cover
                     pass
 
@@ -75,5 +99,108 @@ def get_extended_encoder_class(
     return CustomExtendedJSONEncoder
 
 
+def _get_dumps_kwargs(cls: t.Optional[t.Type]) -> t.Dict[str, t.Any]:
+    app = flask.current_app
+    kwargs: t.Dict[str, t.Any] = {'indent': None, 'separators': (',', ':')}
+
+    if app.config['JSONIFY_PRETTYPRINT_REGULAR'] or app.debug:
+        kwargs['indent'] = 2
+        kwargs['separators'] = (', ', ': ')
+    if cls is not None:
+        kwargs['cls'] = cls
+
+    return kwargs
+
+
+def dumps(obj: t.Any, cls: t.Optional[t.Type] = None) -> str:
+    """Encode the given object in the same way as :py:func:`flask.jsonify`.
+
+    :param obj: The object to encode.
+    :param cls: The encoder class to use, if not given the json encoder of the
+        app is used. Passing the class here, instead of changing the encoder
+        of the app, is safe when multiple requests are handled concurrently.
+    :returns: The encoded object, including a trailing newline.
+    """
+    return flask.json.dumps(obj, **_get_dumps_kwargs(cls)) + '\n'
+
+
+def _iterencode_container(
+    items: t.Iterable[str],
+    start: str,
+    end: str,
+    kwargs: t.Mapping[str, t.Any],
+) -> t.Iterator[str]:
+    indent = kwargs['indent']
+    separator = kwargs['separators'][0]
+    if indent is not None:
+        pad = '\n' + ' ' * indent
+        separator += pad
+
+    first = True
+    for item in items:
+        if indent is not None:
+            # Encoded JSON never contains a literal newline in a string, so
+            # this only indents the lines of nested containers.
+            item = item.replace('\n', pad)
+        if first:
+            yield start + (pad if indent is not None else '')
+            first = False
+        else:
+            yield separator
+        yield item
+
+    if first:
+        yield start + end
+    else:
+        yield ('\n' if indent is not None else '') + end
+    yield '\n'
+
+
+def iterencode_list(items: t.Iterable[t.Any],
+                    cls: t.Optional[t.Type] = None) -> t.Iterator[str]:
+    """Encode the given items as a JSON list, one item at a time.
+
+    The result is the same as :py:func:`dumps` of a list of these items, but
+    the items are only retrieved from the given iterable when they are
+    encoded.
+
+    :param items: The items to encode.
+    :param cls: The encoder class to use, see :py:func:`dumps`.
+    :returns: An iterator producing the encoded list in chunks.
+    """
+    kwargs = _get_dumps_kwargs(cls)
+    return _iterencode_container(
+        (flask.json.dumps(item, **kwargs) for item in items),
+        '[',
+        ']',
+        kwargs,
+    )
+
+
+def iterencode_mapping(
+    items: t.Iterable[t.Tuple[str, t.Any]], cls: t.Optional[t.Type] = None
+) -> t.Iterator[str]:
+    """Encode the given key value pairs as a JSON object, one pair at a time.
+
+    The keys are encoded in the order in which they are produced, so they are
+    not sorted even if ``JSON_SORT_KEYS`` is set.
+
+    :param items: The key value pairs to encode, the keys should be strings.
+    :param cls: The encoder class to use, see :py:func:`dumps`.
+    :returns: An iterator producing the encoded object in chunks.
+    """
+    kwargs = _get_dumps_kwargs(cls)
+    key_separator = kwargs['separators'][1]
+    return _iterencode_container(
+        (
+            flask.json.dumps(key, **kwargs) + key_separator +
+            flask.json.dumps(value, **kwargs) for key, value in items
+        ),
+        '{',
+        '}',
+        kwargs,
+    )
+
+
 def init_app(app: t.Any) -> None:
     app.json_encoder = CustomJSONEncoder
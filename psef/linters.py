@@ -6,15 +6,22 @@ method.
 """
 
 import os
+import json
 import uuid
 import typing as t
+import fnmatch
+import hashlib
+import datetime
+import configparser
 import tempfile
 import traceback
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import psef
 import psef.files
 import psef.models as models
+from psef import app
 from psef.models import db
 from psef.helpers import get_all_subclasses
 
@@ -31,7 +38,9 @@ class Linter:
     method, and they may override the ``DEFAULT_OPTIONS`` variable. If
     ``RUN_LINTER`` is set to ``False`` we never actually run the linter, but
     only create a :py:class:`.models.AssignmentLinter` for this assignment and
-    a :py:class:`.models.LinterInstance` for each submission.
+    a :py:class:`.models.LinterInstance` for each submission. If
+    ``FILE_LOCAL`` is set to ``True`` the comments for a file only depend on
+    the contents of that file, so they can be cached per file.
 
     .. note::
 
@@ -41,12 +50,17 @@ class Linter:
     """
     DEFAULT_OPTIONS: t.ClassVar[t.Mapping[str, str]] = {}
     RUN_LINTER: t.ClassVar[bool] = True
+    FILE_LOCAL: t.ClassVar[bool] = False
 
     def __init__(self, cfg: str) -> None:
         self.config = cfg
 
-    def run(self, tempdir: str, emit: t.Callable[[str, int, str, str], None]
-            ) -> None:  # pragma: no cover
+    def run(
+        self,
+        tempdir: str,
+        emit: t.Callable[[str, int, str, str], None],
+        files: t.Optional[t.Sequence[str]] = None,
+    ) -> None:  # pragma: no cover
         """Run the linter on the code in `tempdir`.
 
         :param tempdir: The temp directory that should contain the code to
@@ -55,9 +69,22 @@ class Linter:
                      argument is the filename, the second is the line number,
                      the third is the code of the linter error, and the fourth
                      and last is the message of the linter.
+        :param files: The paths of the files in `tempdir` that should be
+                      linted, if ``None`` all files should be linted. Linters
+                      that are not file local may lint all files anyway.
         """
         raise NotImplementedError('A subclass should implement this function!')
 
+    def lints_file(self, path: str) -> bool:
+        """Check if the file at the given path is linted when this linter lints
+        all files.
+
+        :param path: The path of the file relative to the directory of the
+            code.
+        :returns: ``True`` if the file is linted.
+        """
+        return True
+
 
 class Pylint(Linter):
     """The pylint checker.
@@ -70,8 +97,12 @@ class Pylint(Linter):
         'Empty config file': ''
     }
 
-    def run(self, tempdir: str,
-            emit: t.Callable[[str, int, str, str], None]) -> None:
+    def run(
+        self,
+        tempdir: str,
+        emit: t.Callable[[str, int, str, str], None],
+        files: t.Optional[t.Sequence[str]] = None,
+    ) -> None:
         """Run the pylinter.
 
         Arguments are the same as for :py:meth:`Linter.run`.
@@ -95,8 +126,8 @@ class Pylint(Linter):
         if out.returncode == 32:
             raise ValueError(res)
         if out.returncode == 1:
-            for dir_name, _, files in os.walk(tempdir):
-                for test_file in files:
+            for dir_name, _, dir_files in os.walk(tempdir):
+                for test_file in dir_files:
                     if test_file.endswith('.py'):
                         emit(
                             os.path.join(dir_name, test_file), 1, 'ERR',
@@ -120,9 +151,41 @@ class Flake8(Linter):
     DEFAULT_OPTIONS: t.ClassVar[t.Mapping[str, str]] = {
         'Empty config file': ''
     }
+    FILE_LOCAL: t.ClassVar[bool] = True
+
+    def __init__(self, cfg: str) -> None:
+        super().__init__(cfg)
+        parser = configparser.RawConfigParser()
+        try:
+            parser.read_string(cfg)
+            patterns = parser.get('flake8', 'filename', fallback='*.py')
+        except configparser.Error:
+            patterns = '*.py'
+        self.filename_patterns = [
+            pattern.strip() for pattern in patterns.split(',')
+            if pattern.strip()
+        ]
+
+    def lints_file(self, path: str) -> bool:
+        """Check if flake8 lints the file at the given path.
+
+        Flake8 only lints the files matching the ``filename`` option of its
+        config, which is ``*.py`` by default.
+
+        Arguments are the same as for :py:meth:`Linter.lints_file`.
+        """
+        name = os.path.basename(path)
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern)
+            for pattern in self.filename_patterns
+        )
 
-    def run(self, tempdir: str,
-            emit: t.Callable[[str, int, str, str], None]) -> None:
+    def run(
+        self,
+        tempdir: str,
+        emit: t.Callable[[str, int, str, str], None],
+        files: t.Optional[t.Sequence[str]] = None,
+    ) -> None:
         cfg = os.path.join(tempdir, '.flake8')
         with open(cfg, 'w') as f:
             f.write(self.config)
@@ -133,7 +196,8 @@ class Flake8(Linter):
         out = subprocess.run(
             [
                 'flake8', '--disable-noqa', '--config={}'.format(cfg),
-                '--format', fmt, tempdir, '--exit-zero'
+                '--format', fmt, '--exit-zero', '--',
+                *([tempdir] if files is None else files)
             ],
             stdout=subprocess.PIPE
         )
@@ -160,19 +224,148 @@ class MixedWhitespace(Linter):
     """
     RUN_LINTER: t.ClassVar[bool] = False
 
-    def run(self, tempdir: str, emit: t.Callable[[str, int, str, str], None]
-            ) -> None:  # pragma: no cover
+    def run(
+        self,
+        tempdir: str,
+        emit: t.Callable[[str, int, str, str], None],
+        files: t.Optional[t.Sequence[str]] = None,
+    ) -> None:  # pragma: no cover
         # This method should never be called as ``RUN_LINTER`` is set to
         # ``false..
         assert False
 
 
+# The comments of a linter for a single file, a mapping from the line number
+# to the code and message of every comment on that line.
+_LinterComments = t.Dict[int, t.List[t.Tuple[str, str]]]  # pylint: disable=invalid-name
+
+
+class LinterCache:
+    """A cache on disk of the comments generated by linters.
+
+    Every entry is stored as a JSON file in ``LINTER_CACHE_DIR`` named after
+    its key. The keys are hashes of the linter, its configuration and the
+    paths and names of the blobs linted, so entries never have to be
+    invalidated. Old
+    entries are removed by :py:meth:`LinterCache.prune`.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @classmethod
+    def from_config(cls) -> t.Optional['LinterCache']:
+        """Get the cache configured for the current app.
+
+        :returns: The cache, or ``None`` if ``LINTER_CACHE_DIR`` is not set.
+        """
+        directory = app.config['LINTER_CACHE_DIR']
+        return cls(directory) if directory else None
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _load(self, key: str) -> t.Any:
+        path = self._get_path(key)
+        try:
+            with open(path, 'r') as f:
+                res = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Mark the entry as recently used.
+        os.utime(path)
+        return res
+
+    def _store(self, key: str, value: t.Any) -> None:
+        path = self._get_path(key)
+        tmp_path = f'{path}.{uuid.uuid4()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _dump(comments: _LinterComments) -> t.List[t.Any]:
+        return [
+            [line, code, msg] for line, msgs in comments.items()
+            for code, msg in msgs
+        ]
+
+    @staticmethod
+    def _parse(lines: t.List[t.Any]) -> _LinterComments:
+        res: _LinterComments = {}
+        for line, code, msg in lines:
+            res.setdefault(line, []).append((code, msg))
+        return res
+
+    def get(self, key: str) -> t.Optional[_LinterComments]:
+        """Get the cached comments of a single file.
+
+        :param key: The key of the entry.
+        :returns: The cached comments or ``None`` if the key was not found.
+        """
+        res = self._load(key)
+        return None if res is None else self._parse(res)
+
+    def set(self, key: str, comments: _LinterComments) -> None:
+        """Store the comments of a single file.
+
+        :param key: The key of the entry.
+        :param comments: The comments to store.
+        :returns: Nothing.
+        """
+        self._store(key, self._dump(comments))
+
+    def get_tree(self, key: str) -> t.Optional[t.Dict[str, _LinterComments]]:
+        """Get the cached comments of a tree of files.
+
+        :param key: The key of the entry.
+        :returns: A mapping from the path of every file to its cached comments
+            or ``None`` if the key was not found.
+        """
+        res = self._load(key)
+        if res is None:
+            return None
+        return {path: self._parse(lines) for path, lines in res.items()}
+
+    def set_tree(self, key: str,
+                 comments: t.Mapping[str, _LinterComments]) -> None:
+        """Store the comments of a tree of files.
+
+        :param key: The key of the entry.
+        :param comments: A mapping from the path of every file to its
+            comments.
+        :returns: Nothing.
+        """
+        self._store(
+            key,
+            {path: self._dump(value)
+             for path, value in comments.items()},
+        )
+
+    def prune(self) -> int:
+        """Remove the entries that are older than ``LINTER_CACHE_MAX_AGE``
+        seconds and the least recently used entries if the cache is larger
+        than ``LINTER_CACHE_MAX_SIZE`` bytes.
+
+        :returns: The amount of bytes reclaimed.
+        """
+        return psef.files.prune_directory(
+            self.directory,
+            datetime.timedelta(seconds=app.config['LINTER_CACHE_MAX_AGE']),
+            app.config['LINTER_CACHE_MAX_SIZE'],
+        )
+
+
 class LinterRunner():
     """This class is used to run a :class:`Linter` with a specific config on
     sets of :class:`models.Work`.
 
     .. py:attribute:: linter
         The attached :class:`Linter` that will be ran by this class.
+
+    .. py:attribute:: cache
+        The :class:`LinterCache` used by this runner, or ``None`` if caching
+        is disabled.
     """
 
     def __init__(self, cls: t.Type[Linter], cfg: str) -> None:
@@ -182,96 +375,283 @@ class LinterRunner():
         :param str cfg: The config as as `str` to pass to the linter.
         """
         self.linter = cls(cfg)  # type: Linter
+        self.cache = LinterCache.from_config()
 
-    def run(self, linter_instance_ids: t.Sequence[int]) -> None:
+    def run(
+        self,
+        linter_instance_ids: t.Sequence[str],
+        file_ids: t.Optional[t.Collection[int]] = None,
+    ) -> None:
         """Run this linter runner on the given works.
 
+        The code of all the given instances is restored into a single
+        temporary directory, after which the linter is run for every instance
+        concurrently by at most ``LINTER_WORKERS`` threads. The comments of
+        all instances are inserted in bulk after all linters have finished.
+        If ``LINTER_CACHE_DIR`` is set, linters are not run again for code
+        they have already linted, see :class:`LinterCache`.
+
         .. note:: This method takes a long time to execute, please run it in a
                   thread.
 
         :param linter_instance_ids: A sequence of all the ids of the linter
             instances which should be run. If this linter instance has already
             run once its old comments will be removed.
+        :param file_ids: If given only the files with these ids are linted and
+            only their comments are replaced, the comments of all other files
+            are kept. This is only possible for file local linters (see
+            :class:`Linter`), other linters always lint all files.
 
         :returns: Nothing
         """
-        for linter_instance_id in linter_instance_ids:
-            linter_instance = db.session.query(models.LinterInstance
-                                               ).get(linter_instance_id)
-
-            # This should never happen however it is better to check here.
-            if linter_instance is None:  # pragma: no cover
-                continue
+        if not self.linter.FILE_LOCAL:
+            file_ids = None
+
+        linter_instances = models.LinterInstance.query.filter(
+            t.cast(models.DbColumn[str],
+                   models.LinterInstance.id).in_(linter_instance_ids)
+        ).all()
+        if not linter_instances:  # pragma: no cover
+            return
 
+        with tempfile.TemporaryDirectory() as tmpdir:
+            jobs = {}
+            for linter_instance in linter_instances:
+                try:
+                    jobs[linter_instance] = self._restore(
+                        linter_instance, tmpdir
+                    )
+                # We want to catch all exceptions here as need to set our
+                # linter to the crashed state.
+                except Exception:  # pylint: disable=broad-except
+                    traceback.print_exc()
+                    linter_instance.state = models.LinterState.crashed
+
+            workers = app.config['LINTER_WORKERS'] or os.cpu_count() or 1
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    linter_instance:
+                    executor.submit(self._lint, *job, file_ids=file_ids)
+                    for linter_instance, job in jobs.items()
+                }
+
+        comments: t.List[models.LinterComment] = []
+        for linter_instance, future in futures.items():
             try:
-                self.test(linter_instance)
+                comments.extend(linter_instance.add_comments(future.result()))
             # We want to catch all exceptions here as need to set our linter to
             # the crashed state.
             except Exception:  # pylint: disable=broad-except
                 traceback.print_exc()
                 linter_instance.state = models.LinterState.crashed
-                db.session.commit()
+            else:
+                linter_instance.state = models.LinterState.done
+
+        done_ids = [
+            linter_instance.id for linter_instance in futures
+            if linter_instance.state == models.LinterState.done
+        ]
+        if done_ids:
+            old_comments = models.LinterComment.query.filter(
+                t.cast(models.DbColumn[str],
+                       models.LinterComment.linter_id).in_(done_ids)
+            )
+            if file_ids is not None:
+                old_comments = old_comments.filter(
+                    t.cast(models.DbColumn[int],
+                           models.LinterComment.file_id).in_(list(file_ids))
+                )
+            old_comments.delete(synchronize_session=False)
+            db.session.bulk_save_objects(comments)
 
-    def test(self, linter_instance: models.LinterInstance) -> None:
-        """Test the given code (:class:`models.Work`) and add generated
-        comments.
+        db.session.commit()
 
-        :param linter_instance: The linter instance that will be run. This
-            linter instance is linked to a work from which all files will be
-            restored and the linter will be run on those files.
-        :returns: Nothing
+        if self.cache is not None:
+            self.cache.prune()
+
+    @staticmethod
+    def _restore(linter_instance: models.LinterInstance, tmpdir: str
+                 ) -> t.Tuple[str, psef.files.FileTree, t.Mapping[int, str]]:
+        """Restore the code of the given linter instance.
+
+        :param linter_instance: The linter instance to restore the code for.
+        :param tmpdir: The directory in which the code should be restored, the
+            code is placed in a new subdirectory named after the id of the
+            linter instance.
+        :returns: The directory in which the code was restored, the tree of
+            the restored files and a mapping from the id of every restored
+            file to the name of its blob.
         """
-        temp_res: t.Dict[str, t.Dict[int, t.List[t.Tuple[str, str]]]]
-        temp_res = {}
-        res: t.Dict[int, t.Mapping[int, t.Sequence[t.Tuple[str, str]]]]
-        res = {}
-
         code = db.session.query(models.File).filter_by(
             work_id=linter_instance.work_id,
             parent=None,
         ).one()
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-
-            def __emit(f: str, line: int, code: str, msg: str) -> None:
-                if f.startswith(tmpdir):
-                    f = f[len(tmpdir) + 1:]
-                if f not in temp_res:
-                    temp_res[f] = {}
-                line = line - 1
-                if line not in temp_res[f]:
-                    temp_res[f][line] = []
-                temp_res[f][line].append((code, msg))
-
-            files = psef.files.restore_directory_structure(
-                code,
-                tmpdir,
+        instance_dir = os.path.join(tmpdir, str(linter_instance.id))
+        os.mkdir(instance_dir)
+        files = psef.files.restore_directory_structure(code, instance_dir)
+        blobs = dict(
+            db.session.query(models.File.id, models.File.filename).filter(
+                models.File.work_id == linter_instance.work_id,
+                ~t.cast(models.DbColumn[bool], models.File.is_directory),
             )
-
-            self.linter.run(os.path.join(tmpdir, code.name), __emit)
-
-        tmpdir = None
+        )
+        return instance_dir, files, blobs
+
+    def _lint(
+        self,
+        instance_dir: str,
+        files: psef.files.FileTree,
+        blobs: t.Mapping[int, str],
+        file_ids: t.Optional[t.Collection[int]] = None,
+    ) -> t.Dict[int, t.Mapping[int, t.Sequence[t.Tuple[str, str]]]]:
+        """Get the comments of the linter for the code restored in the given
+        directory.
+
+        .. note::
+
+            This method does not use the database, so it can safely be run in
+            a different thread.
+
+        :param instance_dir: The directory the code was restored in.
+        :param files: The tree of the restored files.
+        :param blobs: A mapping from file id to the name of its blob.
+        :param file_ids: If given only the files with these ids are linted,
+            if the linter would lint them when linting all files.
+        :returns: The generated comments as accepted by
+            :py:meth:`.models.LinterInstance.add_comments`.
+        """
+        paths: t.Dict[str, int] = {}
 
         def __do(tree: psef.files.FileTree, parent: str) -> None:
             parent = os.path.join(parent, tree['name'])
             if 'entries' in tree:  # this is dir:
                 for entry in tree['entries']:
                     __do(entry, parent)
-            elif parent in temp_res:
-                res[tree['id']] = temp_res[parent]
-                del temp_res[parent]
+            elif file_ids is None or (
+                tree['id'] in file_ids and self.linter.lints_file(parent)
+            ):
+                # Linters also lint files they would normally skip if these
+                # are given explicitly, so only give the files they would
+                # lint when linting all files.
+                paths[parent] = tree['id']
 
         __do(files, '')
+        if not paths:
+            return {}
+
+        temp_res = self._get_comments(
+            instance_dir,
+            files['name'],
+            {path: blobs[file_id]
+             for path, file_id in paths.items()},
+            file_ids is not None,
+        )
 
-        models.LinterComment.query.filter_by(linter_id=linter_instance.id
-                                             ).delete()
-
-        for comment in linter_instance.add_comments(res):
-            db.session.add(comment)
-
-        linter_instance.state = models.LinterState.done
+        return {
+            file_id: temp_res[path]
+            for path, file_id in paths.items() if path in temp_res
+        }
 
-        db.session.commit()
+    def _get_comments(
+        self,
+        instance_dir: str,
+        root: str,
+        blobs: t.Mapping[str, str],
+        only_given: bool,
+    ) -> t.Mapping[str, _LinterComments]:
+        """Get the comments of the linter for the given files, either from the
+        :class:`LinterCache` or by running the linter.
+
+        If the linter is file local (see :py:class:`Linter`) the comments of
+        every file the linter lints are cached separately, otherwise the
+        comments are cached for the entire tree of files. The paths of the
+        files are part of the keys, as the linter configuration can depend on
+        them.
+
+        :param instance_dir: The directory the code was restored in.
+        :param root: The name of the top directory of the restored code.
+        :param blobs: A mapping from the path of every file to the name of its
+            blob.
+        :param only_given: Only lint the files in ``blobs`` instead of all
+            files in ``instance_dir``.
+        :returns: A mapping from the path of every file to its comments.
+        """
+        files = list(blobs) if only_given else None
+        cache = self.cache
+        if cache is None:
+            return self._run_linter(instance_dir, root, files)
+
+        if self.linter.FILE_LOCAL:
+            keys = {
+                path: self._get_cache_key(path, blob)
+                for path, blob in blobs.items()
+                if self.linter.lints_file(path)
+            }
+            cached = {path: cache.get(key) for path, key in keys.items()}
+            if all(comments is not None for comments in cached.values()):
+                return t.cast(t.Mapping[str, _LinterComments], cached)
+
+            res = self._run_linter(instance_dir, root, files)
+            for path, key in keys.items():
+                cache.set(key, res.get(path, {}))
+            return res
+        else:
+            tree_key = self._get_cache_key(*sorted(blobs.items()))
+            tree_res = cache.get_tree(tree_key)
+            if tree_res is None:
+                tree_res = self._run_linter(instance_dir, root, files)
+                cache.set_tree(tree_key, tree_res)
+            return tree_res
+
+    def _get_cache_key(self, *parts: t.Any) -> str:
+        """Get the key in the :class:`LinterCache` for the given parts run
+        with the linter and configuration of this runner.
+
+        :param parts: The parts identifying the input of the linter, these
+            should be serializable as JSON.
+        :returns: The key.
+        """
+        return hashlib.sha256(
+            json.dumps(
+                [type(self.linter).__name__, self.linter.config, parts]
+            ).encode('utf8')
+        ).hexdigest()
+
+    def _run_linter(
+        self,
+        instance_dir: str,
+        root: str,
+        files: t.Optional[t.Sequence[str]] = None,
+    ) -> t.Dict[str, _LinterComments]:
+        """Run the linter on the code restored in the given directory.
+
+        :param instance_dir: The directory the code was restored in.
+        :param root: The name of the top directory of the restored code.
+        :param files: The paths of the files to lint relative to
+            ``instance_dir``, if ``None`` all files are linted.
+        :returns: A mapping from the path of every file that has comments to
+            its comments.
+        """
+        temp_res: t.Dict[str, _LinterComments] = {}
+
+        def __emit(f: str, line: int, code: str, msg: str) -> None:
+            if f.startswith(instance_dir):
+                f = f[len(instance_dir) + 1:]
+            if f not in temp_res:
+                temp_res[f] = {}
+            line = line - 1
+            if line not in temp_res[f]:
+                temp_res[f][line] = []
+            temp_res[f][line].append((code, msg))
+
+        self.linter.run(
+            os.path.join(instance_dir, root),
+            __emit,
+            None if files is None else
+            [os.path.join(instance_dir, f) for f in files],
+        )
+        return temp_res
 
 
 def get_all_linters(
@@ -6,8 +6,11 @@
 # This file contains large pieces of code from this github repository:
 # https://github.com/ucfopen/lti-template-flask-oauth-tokens
 
+import queue
 import typing as t
 import datetime
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import flask
 import oauth2
@@ -29,6 +32,64 @@ def init_app(_: t.Any) -> None:
     pass
 
 
+class GradePassback(
+    t.NamedTuple(
+        'GradePassback', [
+            ('id', int),
+            ('key', str),
+            ('secret', str),
+            ('grade', t.Union[float, None, bool, str, int]),
+            ('service_url', str),
+            ('sourcedid', str),
+            ('url', t.Optional[str]),
+        ]
+    )
+):
+    """A NamedTuple holding a single grade passback to do.
+
+    :param id: The id used to identify this passback in the result of
+        :py:meth:`LTI.passback_grades`.
+    :param key: The oauth key to use.
+    :param secret: The oauth secret to use.
+    :param grade: The grade to pass back, see :py:meth:`LTI.passback_grade`.
+    :param service_url: The url used for grade passback.
+    :param sourcedid: The ``sourcedid`` used in the grade passback.
+    :param url: The url used as general feedback to the student.
+    """
+
+
+class PassbackError(Exception):
+    """The exception raised when a LTI consumer did not accept a grade
+    passback.
+
+    :ivar response: The response of the LTI consumer.
+    """
+
+    def __init__(self, response: 'OutcomeResponse') -> None:
+        super().__init__(
+            'The LTI consumer responded with "{}": {}'.format(
+                response.code_major, response.description
+            )
+        )
+        self.response = response
+
+
+class _OutcomeClient(oauth2.Client):
+    """An OAuth client that does not lower case the ``Authorization`` header,
+    as some LTI consumers do not accept a lower cased header.
+
+    The client keeps its connections open, so it should be reused for requests
+    to the same consumer. It is not thread safe.
+    """
+
+    def _normalize_headers(self,
+                           headers: t.Mapping[str, str]) -> t.Dict[str, str]:
+        ret = super()._normalize_headers(headers)
+        if 'authorization' in ret:
+            ret['Authorization'] = ret.pop('authorization')
+        return ret
+
+
 # TODO: This class has so many public methods as they are properties. A lot of
 # them can be converted to private properties which should be done.
 class LTI:  # pylint: disable=too-many-public-methods
@@ -414,6 +475,7 @@ class LTI:  # pylint: disable=too-many-public-methods
         service_url: str,
         sourcedid: str,
         url: str = None,
+        client: oauth2.Client = None,
     ) -> 'OutcomeResponse':
         """Do a LTI grade passback.
 
@@ -426,7 +488,11 @@ class LTI:  # pylint: disable=too-many-public-methods
         :param sourcedid: The ``sourcedid`` used in the grade passback.
         :param url: The url used as general feedback to the student which will
             probably be clickable.
+        :param client: The client used to do the request, a new client is
+            created if this is not given.
         :returns: The response of the LTI consumer.
+        :raises PassbackError: If the LTI consumer did not accept the
+            passback.
         """
         req = OutcomeRequest(
             consumer_key=key,
@@ -439,13 +505,92 @@ class LTI:  # pylint: disable=too-many-public-methods
             opts = {'url': url}
 
         if grade is None:
-            return req.post_delete_result()
+            res = req.post_delete_result(client=client)
         else:
             if isinstance(grade, bool):
                 grade = None
             elif not isinstance(grade, str):
                 grade = str(grade / 10)
-            return req.post_replace_result(grade, result_data=opts)
+            res = req.post_replace_result(
+                grade, result_data=opts, client=client
+            )
+
+        if not (res.is_success() or res.is_processing()):
+            raise PassbackError(res)
+        return res
+
+    @classmethod
+    def passback_grades(
+        cls,
+        passbacks: t.Sequence[GradePassback],
+    ) -> t.Dict[int, Exception]:
+        """Do many LTI grade passbacks concurrently.
+
+        The passbacks are grouped by consumer, and for every consumer at most
+        ``LTI_PASSBACK_CONNECTIONS`` requests are done at the same time. Every
+        concurrent request reuses its own client, so connections to the
+        consumer are kept alive between requests. Requests time out after
+        ``LTI_PASSBACK_TIMEOUT`` seconds.
+
+        :param passbacks: The passbacks to do.
+        :returns: A mapping between the id of every passback that failed and
+            the exception it raised.
+        """
+        by_consumer: t.Dict[t.Tuple[str, str], t.List[GradePassback]]
+        by_consumer = defaultdict(list)
+        for passback in passbacks:
+            by_consumer[(passback.key, passback.secret)].append(passback)
+
+        flask_app = app._get_current_object()  # pylint: disable=protected-access
+        max_connections = max(app.config['LTI_PASSBACK_CONNECTIONS'], 1)
+        timeout = app.config['LTI_PASSBACK_TIMEOUT']
+
+        def __passback(passback: GradePassback, clients: queue.Queue) -> None:
+            client = clients.get()
+            try:
+                with flask_app.app_context():
+                    cls.passback_grade(
+                        passback.key,
+                        passback.secret,
+                        passback.grade,
+                        passback.service_url,
+                        passback.sourcedid,
+                        url=passback.url,
+                        client=client,
+                    )
+            finally:
+                clients.put(client)
+
+        futures: t.Dict[int, Future] = {}
+        executors = []
+        try:
+            for (key, secret), todo in by_consumer.items():
+                amount = min(max_connections, len(todo))
+                clients: queue.Queue = queue.Queue()
+                for _ in range(amount):
+                    clients.put(
+                        _OutcomeClient(
+                            oauth2.Consumer(key=key, secret=secret),
+                            timeout=timeout,
+                        )
+                    )
+
+                executor = ThreadPoolExecutor(max_workers=amount)
+                executors.append(executor)
+                for passback in todo:
+                    futures[passback.id] = executor.submit(
+                        __passback, passback, clients
+                    )
+        finally:
+            for executor in executors:
+                executor.shutdown()
+
+        errors = {}
+        for passback_id, future in futures.items():
+            exc = future.exception()
+            if exc is not None:
+                errors[passback_id] = exc
+        return errors
 
 
 class CanvasLTI(LTI):
@@ -575,7 +720,10 @@ class OutcomeRequest:  # pragma: no cover, pylint: disable=protected-access,inva
         return request
 
     def post_replace_result(
-        self, score: str, result_data: t.Mapping[str, str] = None
+        self,
+        score: str,
+        result_data: t.Mapping[str, str] = None,
+        client: oauth2.Client = None,
     ) -> 'OutcomeResponse':
         '''
         POSTs the given score to the Tool Consumer with a replaceResult.
@@ -600,7 +748,7 @@ class OutcomeRequest:  # pragma: no cover, pylint: disable=protected-access,inva
                 )
                 raise ValueError(error_msg)
             elif any(a in result_data for a in ['url', 'text', 'launchUrl']):
-                return self.post_outcome_request()
+                return self.post_outcome_request(client)
             else:
                 error_msg = (
                     'Dictionary result_data can only have the key '
@@ -608,14 +756,16 @@ class OutcomeRequest:  # pragma: no cover, pylint: disable=protected-access,inva
                 )
                 raise ValueError(error_msg)
         else:
-            return self.post_outcome_request()
+            return self.post_outcome_request(client)
 
-    def post_delete_result(self) -> 'OutcomeResponse':
+    def post_delete_result(
+        self, client: oauth2.Client = None
+    ) -> 'OutcomeResponse':
         '''
         POSTs a deleteRequest to the Tool Consumer.
         '''
         self.operation = DELETE_REQUEST
-        return self.post_outcome_request()
+        return self.post_outcome_request(client)
 
     def post_read_result(self) -> 'OutcomeResponse':
         '''
@@ -648,38 +798,27 @@ class OutcomeRequest:  # pragma: no cover, pylint: disable=protected-access,inva
             self.outcome_response.is_success()
         )
 
-    def post_outcome_request(self) -> 'OutcomeResponse':
+    def post_outcome_request(
+        self, client: oauth2.Client = None
+    ) -> 'OutcomeResponse':
         '''
         POST an OAuth signed request to the Tool Consumer.
+
+        The given client is used to do the request, if it is ``None`` a new
+        client is created for the consumer of this request.
         '''
         if not self.has_required_attributes():
             raise ValueError(
                 'OutcomeRequest does not have all required attributes'
             )
 
-        consumer = oauth2.Consumer(
-            key=self.consumer_key, secret=self.consumer_secret
-        )
-
-        client = oauth2.Client(consumer)
-        # monkey_patch_headers ensures that Authorization
-        # header is NOT lower cased
-        monkey_patch_headers = True
-        monkey_patch_function = None
-        if monkey_patch_headers:
-            import httplib2
-            http = httplib2.Http
-
-            normalize = http._normalize_headers
-
-            def __my_normalize(self: t.Any, headers: t.Sequence) -> t.Sequence:
-                ret = normalize(self, headers)
-                if 'authorization' in ret:
-                    ret['Authorization'] = ret.pop('authorization')
-                return ret
-
-            http._normalize_headers = __my_normalize
-            monkey_patch_function = normalize
+        if client is None:
+            client = _OutcomeClient(
+                oauth2.Consumer(
+                    key=self.consumer_key, secret=self.consumer_secret
+                ),
+                timeout=app.config['LTI_PASSBACK_TIMEOUT'],
+            )
 
         response, content = client.request(
             self.lis_outcome_service_url,
@@ -688,10 +827,6 @@ class OutcomeRequest:  # pragma: no cover, pylint: disable=protected-access,inva
             headers={'Content-Type': 'application/xml'}
         )
 
-        if monkey_patch_headers and monkey_patch_function:
-            http = httplib2.Http
-            http._normalize_headers = monkey_patch_function
-
         self.outcome_response = OutcomeResponse.from_post_response(
             response, content
         )
@@ -17,12 +17,13 @@ from operator import itemgetter
 from itertools import cycle
 from collections import defaultdict
 
+import flask
 from sqlalchemy import orm, event
 from itsdangerous import BadSignature, URLSafeTimedSerializer
 from werkzeug.utils import cached_property
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy_utils import PasswordType, force_auto_coercion
-from sqlalchemy.sql.expression import and_, func, false
+from sqlalchemy_utils import JSONType, PasswordType, force_auto_coercion
+from sqlalchemy.sql.expression import or_, and_, func, false
 from sqlalchemy.orm.collections import attribute_mapped_collection
 
 import psef  # pylint: disable=cyclic-import
@@ -121,12 +122,49 @@ class LTIProvider(Base):
     """This class defines the handshake with an LTI
 
     :ivar key: The OAuth consumer key for this LTI provider.
+    :ivar passback_failures: The amount of grade passbacks that failed in a
+        row for this LTI provider.
+    :ivar passback_blocked_until: If not ``None`` no grade passbacks are done
+        to this LTI provider until this moment.
     """
     if t.TYPE_CHECKING:  # pragma: no cover
         query = Base.query  # type: t.ClassVar[_MyQuery['LTIProvider']]
     __tablename__ = 'LTIProvider'
     id: str = db.Column('id', db.String(UUID_LENGTH), primary_key=True)
     key: str = db.Column('key', db.Unicode, unique=True)
+    passback_failures: int = db.Column(
+        'passback_failures', db.Integer, default=0, nullable=False
+    )
+    passback_blocked_until: t.Optional[datetime.datetime] = db.Column(
+        'passback_blocked_until', db.DateTime, nullable=True
+    )
+
+    def register_passbacks(self, succeeded: int, failed: int) -> None:
+        """Update the circuit breaker of this provider with the results of a
+        batch of grade passbacks.
+
+        If no passback succeeded the failures are added to
+        :py:attr:`passback_failures`, and when this exceeds
+        ``LTI_PASSBACK_FAILURE_THRESHOLD`` no passbacks are done to this
+        provider for ``LTI_PASSBACK_BLOCK_TIME`` seconds. A single successful
+        passback resets the failures.
+
+        :param succeeded: The amount of passbacks that succeeded.
+        :param failed: The amount of passbacks that failed.
+        :returns: Nothing
+        """
+        if succeeded:
+            self.passback_failures = 0
+            self.passback_blocked_until = None
+        elif failed:
+            self.passback_failures = (self.passback_failures or 0) + failed
+            if self.passback_failures >= current_app.config[
+                'LTI_PASSBACK_FAILURE_THRESHOLD'
+            ]:
+                self.passback_blocked_until = datetime.datetime.utcnow(
+                ) + datetime.timedelta(
+                    seconds=current_app.config['LTI_PASSBACK_BLOCK_TIME'],
+                )
 
     def __init__(self, key: str) -> None:
         super().__init__(key=key)
@@ -256,6 +294,126 @@ class Permission(Base):
         'course_permission', db.Boolean, index=True
     )
 
+    _table: t.ClassVar[t.Optional['_PermissionTable']] = None
+
+    @classmethod
+    def get_table(cls) -> '_PermissionTable':
+        """Get the process wide table of all permissions.
+
+        :returns: The permission table, it is loaded if this has not been done
+            yet.
+        """
+        table = cls._table
+        if table is None:
+            table = cls._load_table()
+        return table
+
+    @classmethod
+    def _load_table(cls) -> '_PermissionTable':
+        table = _PermissionTable(
+            cls.query.order_by(cls.id).all(),  # type: ignore
+            current_app.config['_PERMISSION_ORDER'],
+        )
+        cls._table = table
+        return table
+
+    @classmethod
+    def get_entry(cls, name: str) -> '_PermissionEntry':
+        """Get the entry in the permission table for the permission with the
+        given name.
+
+        Permissions are only added by seeding the database, so the table is
+        only reloaded when a permission is not found in it.
+
+        :param name: The name of the permission.
+        :returns: The found entry.
+
+        :raises KeyError: If no permission with the given name exists.
+        """
+        entry = cls.get_table().entries.get(name)
+        if entry is None:
+            entry = cls._load_table().entries.get(name)
+            if entry is None:
+                raise KeyError(f'The permission "{name}" does not exist')
+        return entry
+
+
+class _PermissionEntry(
+    t.NamedTuple(
+        '_PermissionEntry', [
+            ('id', int),
+            ('name', str),
+            ('mask', int),
+            ('default_value', bool),
+            ('course_permission', bool),
+        ]
+    )
+):
+    """A NamedTuple describing a single permission in a
+    :class:`_PermissionTable`.
+
+    :param id: The id of the permission.
+    :param name: The name of the permission.
+    :param mask: The bit of this permission in a permission bitmap, see
+        :py:meth:`AbstractRole.get_permission_bits`. This bit is stable across
+        processes, as it is also used in the bitmaps stored in the database.
+    :param default_value: The default value of the permission.
+    :param course_permission: Is this permission a course permission.
+    """
+
+
+class _PermissionTable:
+    """A lookup table of all permissions, with a unique bit for every
+    permission.
+
+    The bit of a permission is its position in ``seed_data/permissions.json``,
+    permissions that are not present in this file get a bit after all those
+    permissions in the order of their id.
+
+    :ivar entries: A mapping between the name of a permission and its entry.
+    :ivar default_masks: A mapping between ``course_permission`` and the bitmap
+        of all permissions of that kind that have ``True`` as default value.
+    """
+
+    def __init__(self, perms: t.Iterable[Permission],
+                 order: t.Sequence[str]) -> None:
+        self.entries: t.Dict[str, _PermissionEntry] = {}
+        self.default_masks = {True: 0, False: 0}
+
+        ordinals = {name: idx for idx, name in enumerate(order)}
+        next_idx = len(ordinals)
+
+        for perm in perms:
+            idx = ordinals.get(perm.name)
+            if idx is None:
+                idx = next_idx
+                next_idx += 1
+            entry = _PermissionEntry(
+                id=perm.id,
+                name=perm.name,
+                mask=1 << idx,
+                default_value=bool(perm.default_value),
+                course_permission=bool(perm.course_permission),
+            )
+            self.entries[perm.name] = entry
+            if entry.default_value:
+                self.default_masks[entry.course_permission] |= entry.mask
+
+
+def _get_request_permission_cache(
+) -> t.Optional[t.Dict[t.Tuple[int, t.Optional[int]], t.Tuple[int, int]]]:
+    """Get the cache of permission bitmaps of the current request.
+
+    :returns: A mapping between ``(user_id, course_id)`` and a tuple of the id
+        of the role of the user and the permission bitmap of this role, or
+        ``None`` if there is no request.
+    """
+    if not flask.has_request_context():
+        return None
+    if 'permission_bits' not in flask.g:
+        flask.g.permission_bits = {}
+    return flask.g.permission_bits
+
 
 class AbstractRole:
     """An abstract class that implements all functionality a role should have.
@@ -266,7 +424,7 @@ class AbstractRole:
         name: str,
         _permissions: t.MutableMapping[str, Permission] = None
     ) -> None:
-        self._has_permission_cache: t.MutableMapping[str, bool] = {}
+        self._permission_links = 0
         self.name = name
         if _permissions is not None:
             self._permissions = _permissions
@@ -297,16 +455,20 @@ class AbstractRole:
 
     @property
     @abc.abstractmethod
-    def uses_course_permissions(self) -> bool:
-        """Does this role use course permissions or global permissions.
+    def _permission_links(self) -> int:
+        """The bitmap of the permissions in :py:attr:`_permissions`.
+
+        This bitmap is kept in sync with the permissions this role has a
+        connection to, see :py:func:`_add_permission_link`.
         """
         raise NotImplementedError
 
-    @orm.reconstructor
-    def setup_has_permission_cache(self) -> None:
-        """Reset permission cache to an empty object.
+    @property
+    @abc.abstractmethod
+    def uses_course_permissions(self) -> bool:
+        """Does this role use course permissions or global permissions.
         """
-        self._has_permission_cache = {}
+        raise NotImplementedError
 
     def set_permission(self, perm: Permission, should_have: bool) -> None:
         """Set the given :class:`Permission` to the given value.
@@ -324,47 +486,60 @@ class AbstractRole:
             except KeyError:
                 pass
 
-        self._has_permission_cache[perm.name] = should_have
+        cache = _get_request_permission_cache()
+        if cache:
+            cache.clear()
 
-    def has_permission(self, permission: t.Union[str, Permission]) -> bool:
-        """Check whether this course role has the specified
-        :class:`Permission`.
+    def get_permission_bits(self) -> int:
+        """Get the permissions of this role as a bitmap.
 
-        :param permission: The permission or permission name
-        :returns: True if the course role has the permission
+        The bit of a permission, see :py:meth:`Permission.get_entry`, is set if
+        this role has the permission.
+
+        :returns: The bitmap of the permissions of this role.
+        """
+        table = Permission.get_table()
+        return (
+            table.default_masks[self.uses_course_permissions] ^
+            self._permission_links
+        )
+
+    def _get_permission_entry(self, permission: t.Union[str, Permission]
+                              ) -> t.Optional[_PermissionEntry]:
+        """Get the entry of the given permission.
+
+        :param permission: The permission or permission name.
+        :returns: The entry of the permission, or ``None`` if the permission is
+            not of the kind used by this role.
 
         :raises KeyError: If the permission parameter is a string and no
-            permission with this name exists.
+            permission with this name exists for this kind of role.
         """
         if isinstance(permission, Permission):
-            permission_name = permission.name
+            entry = Permission.get_entry(permission.name)
         else:
-            permission_name = permission
+            entry = Permission.get_entry(permission)
 
-        if permission_name in self._has_permission_cache:
-            return self._has_permission_cache[permission_name]
+        if entry.course_permission != self.uses_course_permissions:
+            if isinstance(permission, Permission):
+                return None
+            raise KeyError(f'The permission "{permission}" does not exist')
+        return entry
 
-        if permission_name in self._permissions:
-            perm = self._permissions[permission_name]
-            res = not perm.default_value
-        else:
-            if isinstance(permission, str):
-                permission = Permission.query.filter_by(
-                    course_permission=self.uses_course_permissions,
-                    name=permission,
-                ).first()
-
-            if permission is None:
-                raise KeyError(
-                    f'The permission "{permission_name}" does not exist'
-                )
+    def has_permission(self, permission: t.Union[str, Permission]) -> bool:
+        """Check whether this course role has the specified
+        :class:`Permission`.
 
-            res = permission.default_value and (
-                permission.course_permission == self.uses_course_permissions
-            )
+        :param permission: The permission or permission name
+        :returns: True if the course role has the permission
 
-        self._has_permission_cache[permission_name] = res
-        return res
+        :raises KeyError: If the permission parameter is a string and no
+            permission with this name exists.
+        """
+        entry = self._get_permission_entry(permission)
+        return entry is not None and bool(
+            self.get_permission_bits() & entry.mask
+        )
 
     def get_all_permissions(self) -> t.Mapping[str, bool]:
         """Get all course :class:`permissions` for this course role.
@@ -373,12 +548,11 @@ class AbstractRole:
                   permission and the value indicates if this user has this
                   permission.
         """
-        perms = Permission.query.filter_by(
-            course_permission=self.uses_course_permissions,
-        )
+        bits = self.get_permission_bits()
         return {
-            p.name: (p.name in self._permissions) ^ p.default_value
-            for p in perms
+            name: bool(bits & entry.mask)
+            for name, entry in Permission.get_table().entries.items()
+            if entry.course_permission == self.uses_course_permissions
         }
 
     def __to_json__(self) -> t.MutableMapping[str, t.Any]:
@@ -422,6 +596,13 @@ class CourseRole(AbstractRole, Base):
         collection_class=attribute_mapped_collection('name'),
         secondary=course_permissions
     )
+    _permission_links: int = db.Column(
+        'permission_links',
+        db.BigInteger,
+        default=0,
+        server_default='0',
+        nullable=False
+    )
 
     # Old syntax used to please sphinx
     course = db.relationship(
@@ -520,12 +701,55 @@ class Role(AbstractRole, Base):
         secondary=permissions,
         backref=db.backref('roles', lazy='dynamic')
     )
+    _permission_links: int = db.Column(
+        'permission_links',
+        db.BigInteger,
+        default=0,
+        server_default='0',
+        nullable=False
+    )
 
     @property
     def uses_course_permissions(self) -> bool:
         return False
 
 
+@event.listens_for(CourseRole._permissions, 'append')
+@event.listens_for(Role._permissions, 'append')
+def _add_permission_link(
+    role: AbstractRole, perm: Permission, _: t.Any
+) -> None:
+    """Set the bit of a permission in the bitmap of a role when a connection
+    between them is added.
+
+    :param role: The role the permission was connected to.
+    :param perm: The connected permission.
+    :returns: Nothing
+    """
+    # pylint: disable=protected-access
+    role._permission_links = (
+        (role._permission_links or 0) | Permission.get_entry(perm.name).mask
+    )
+
+
+@event.listens_for(CourseRole._permissions, 'remove')
+@event.listens_for(Role._permissions, 'remove')
+def _remove_permission_link(
+    role: AbstractRole, perm: Permission, _: t.Any
+) -> None:
+    """Clear the bit of a permission in the bitmap of a role when the
+    connection between them is removed.
+
+    :param role: The role the permission was disconnected from.
+    :param perm: The disconnected permission.
+    :returns: Nothing
+    """
+    # pylint: disable=protected-access
+    role._permission_links = (
+        (role._permission_links or 0) & ~Permission.get_entry(perm.name).mask
+    )
+
+
 class User(Base):
     """This class describes a user of the system.
 
@@ -632,20 +856,50 @@ class User(Base):
         """
         if not self.active:
             return False
+
+        role: AbstractRole
         if course_id is None:
-            return self.role.has_permission(permission)
+            role = self.role
         else:
             if isinstance(course_id, Course):
                 course_id = course_id.id
 
-            if course_id in self.courses:
-                return self.courses[course_id].has_permission(permission)
-            elif isinstance(permission, str):
-                if Permission.query.filter_by(name=permission).first() is None:
-                    raise KeyError(
-                        f'The permission "{permission}" does not exist'
-                    )
+            if course_id not in self.courses:
+                if isinstance(permission, str):
+                    Permission.get_entry(permission)
+                return False
+            role = self.courses[course_id]
+
+        entry = role._get_permission_entry(permission)  # pylint: disable=protected-access
+        if entry is None:
             return False
+        return bool(self._get_permission_bits(role, course_id) & entry.mask)
+
+    def _get_permission_bits(
+        self, role: AbstractRole, course_id: t.Optional[int]
+    ) -> int:
+        """Get the permission bitmap of this user for the given role.
+
+        The bitmap is cached for the duration of the current request. An entry
+        in this cache is only used if the user still has the same role.
+
+        :param role: The global role of this user or the role of this user in
+            the given course.
+        :param course_id: The id of the course of the role, or ``None`` if the
+            role is the global role of this user.
+        :returns: The permission bitmap, see
+            :py:meth:`AbstractRole.get_permission_bits`.
+        """
+        cache = _get_request_permission_cache()
+        if cache is None:
+            return role.get_permission_bits()
+
+        key = (self.id, course_id)
+        cached = cache.get(key)
+        if cached is None or cached[0] != role.id:
+            cached = (role.id, role.get_permission_bits())
+            cache[key] = cached
+        return cached[1]
 
     def get_permissions_in_courses(
         self,
@@ -669,41 +923,29 @@ class User(Base):
         if not wanted_perms:
             return {}
 
-        perms = psef.helpers.filter_all_or_404(
-            Permission,
-            t.cast(DbColumn[str], Permission.name).in_(wanted_perms)
-        )
-
-        course_roles = db.session.query(user_course.c.course_id).join(
-            User, User.id == user_course.c.user_id
-        ).filter(User.id == self.id).subquery('course_roles')
-
-        crp = db.session.query(
-            course_permissions.c.course_role_id,
-            t.cast(DbColumn[int], Permission.id),
-        ).join(
-            Permission,
-            course_permissions.c.permission_id == Permission.id,
-        ).filter(
-            t.cast(DbColumn[int], Permission.id).in_(p.id for p in perms)
-        ).subquery('crp')
-
-        res: t.Sequence[t.Tuple[int, int]]
-        res = db.session.query(course_roles.c.course_id, crp.c.id).join(
-            crp,
-            course_roles.c.course_id == crp.c.course_role_id,
-            isouter=False,
-        ).all()
+        entries = []
+        for name in wanted_perms:
+            try:
+                entries.append(Permission.get_entry(name))
+            except KeyError:
+                pass
 
-        lookup: t.Mapping[int, t.Set[int]] = defaultdict(set)
-        for course_role_id, permission_id in res:
-            lookup[permission_id].add(course_role_id)
+        if not entries:
+            raise psef.errors.APIException(
+                'The requested permission was not found',
+                f'There is no "Permission" with a name in {wanted_perms}',
+                psef.errors.APICodes.OBJECT_ID_NOT_FOUND, 404
+            )
 
         out: t.MutableMapping[int, t.Mapping[str, bool]] = {}
         for course_id, course_role in self.courses.items():
+            bits = course_role.get_permission_bits()
             out[course_id] = {
-                p.name: (course_role.id in lookup[p.id]) != p.default_value
-                for p in perms
+                entry.name: (
+                    bool(bits & entry.mask)
+                    if entry.course_permission else entry.default_value
+                )
+                for entry in entries
             }
 
         return out
@@ -766,26 +1008,15 @@ class User(Base):
         :returns: True if the user has the permission once
         """
 
-        permission: Permission
-        if isinstance(perm, Permission):
-            permission = perm
-        else:
-            permission = Permission.query.filter_by(  # type: ignore
-                name=perm).first()
+        permission = Permission.get_entry(
+            perm.name if isinstance(perm, Permission) else perm
+        )
         assert permission.course_permission
 
-        course_roles = db.session.query(user_course.c.course_id).join(
-            User, User.id == user_course.c.user_id
-        ).filter(User.id == self.id).subquery('course_roles')
-        crp = db.session.query(course_permissions.c.course_role_id).join(
-            Permission, course_permissions.c.permission_id == Permission.id
-        ).filter(Permission.id == permission.id).subquery('crp')
-        res = db.session.query(course_roles.c.course_id).join(
-            crp, course_roles.c.course_id == crp.c.course_role_id
+        return any(
+            role.get_permission_bits() & permission.mask
+            for role in self.courses.values()
         )
-        link: bool = db.session.query(res.exists()).scalar()
-
-        return (not link) if permission.default_value else link
 
     def get_all_permissions(
         self, course_id: t.Union['Course', int, None] = None
@@ -1119,6 +1350,61 @@ class Work(Base):
                 [instance.id],
             )
 
+    def relint_files(self, file_ids: t.Sequence[int]) -> None:
+        """Run the linters that have already run on this work again for the
+        given files.
+
+        Only the comments of the given files are replaced. Linters that are
+        not file local (see :class:`psef.linters.Linter`) run on the entire
+        work again, as changing a file can change their comments on other
+        files. File local linters are only run if they lint one of the given
+        files.
+
+        If the linters feature is disabled this function will simply return and
+        not do anything.
+
+        .. note::
+
+            The changes to the given files should already be commited.
+
+        :param file_ids: The ids of the files that have changed.
+        :returns: Nothing
+        """
+        if not file_ids or not psef.helpers.has_feature('LINTERS'):
+            return
+
+        paths = dict(
+            db.session.query(File.id, File.path).filter(
+                t.cast(DbColumn[int], File.id).in_(list(file_ids))
+            )
+        )
+
+        for instance in LinterInstance.query.filter_by(work_id=self.id):
+            linter = instance.tester
+            linter_cls = psef.linters.get_linter_by_name(linter.name)
+            if not linter_cls.RUN_LINTER:
+                continue
+
+            if linter_cls.FILE_LOCAL:
+                linter_obj = linter_cls(linter.config)
+                linted_ids = [
+                    file_id for file_id, path in paths.items()
+                    if linter_obj.lints_file(path)
+                ]
+                if linted_ids:
+                    psef.tasks.lint_instance_files(
+                        linter.name,
+                        linter.config,
+                        instance.id,
+                        linted_ids,
+                    )
+            else:
+                psef.tasks.lint_instances(
+                    linter.name,
+                    linter.config,
+                    [instance.id],
+                )
+
     @property
     def grade(self) -> float:
         """Get the actual current grade for this work.
@@ -1146,7 +1432,7 @@ class Work(Base):
         """Set the grade to the new grade.
 
         .. note:: This also passes back the grade to LTI if this is necessary
-            (see :py:func:`passback_grade`).
+            (see :py:meth:`PassbackQueueItem.enqueue`).
 
         :param new_grade: The new grade to set
         :param user: The user setting the new grade.
@@ -1181,51 +1467,94 @@ class Work(Base):
         """
         return sum(item.points for item in self.selected_items)
 
-    def passback_grade(self, initial: bool = False) -> None:
-        """Initiates a passback of the grade to the LTI consumer via the
-        :class:`LTIProvider`.
-
+    @staticmethod
+    def passback_grades(
+        works: t.Iterable['Work'],
+        initial: bool = False,
+    ) -> t.Dict[int, Exception]:
+        """Pass back the grades of the given works to their LTI consumers.
+
+        The requests are done concurrently (see
+        :py:meth:`psef.lti.LTI.passback_grades`), and the newest grade history
+        of all works that were passed back is marked as passed back in a single
+        query.
+
+        :param works: The works of which the grade should be passed back, works
+            of assignments not connected to a LTI consumer are ignored.
         :param initial: Should we do a initial LTI grade passback with no
             result so that the real grade won't show as too late.
-        :returns: Nothing
+        :returns: A mapping between the id of every work of which the passback
+            failed and the exception it raised.
         """
-        if self.assignment.lti_outcome_service_url is not None:
-            lti_provider = self.assignment.course.lti_provider
+        passbacks = []
+        errors: t.Dict[int, Exception] = {}
+        for work in works:
+            assig = work.assignment
+            if assig.lti_outcome_service_url is None:
+                continue
+
+            try:
+                sourcedid = assig.assignment_results[work.user_id].sourcedid
+            except KeyError as exc:
+                errors[work.id] = exc
+                continue
+
+            lti_provider = assig.course.lti_provider
             if initial:
-                url = (
+                url: t.Optional[str] = (
                     '{}/'
                     'courses/{}/assignments/{}/submissions?inLTI=true'
                 ).format(
                     current_app.config['EXTERNAL_URL'],
-                    self.assignment.course_id,
-                    self.assignment_id,
+                    assig.course_id,
+                    assig.id,
                 )
             else:
                 url = None
 
-            psef.lti.LTI.passback_grade(
-                lti_provider.key,
-                lti_provider.secret,
-                False if initial else self.grade,
-                self.assignment.lti_outcome_service_url,
-                self.assignment.assignment_results[self.user_id].sourcedid,
-                url=url,
-            )
-            newest_grade_history_id = db.session.query(
-                t.cast(DbColumn[int], GradeHistory.id)
-            ).filter_by(work_id=self.id).order_by(
-                t.cast(DbColumn[datetime.datetime],
-                       GradeHistory.changed_at).desc(),
-            ).limit(1).with_for_update()
-
-            db.session.query(GradeHistory).filter(
-                GradeHistory.id == newest_grade_history_id.as_scalar(),
-            ).update(
-                {
-                    'passed_back': True
-                }, synchronize_session='fetch'
+            passbacks.append(
+                psef.lti.GradePassback(
+                    id=work.id,
+                    key=lti_provider.key,
+                    secret=lti_provider.secret,
+                    grade=False if initial else work.grade,
+                    service_url=assig.lti_outcome_service_url,
+                    sourcedid=sourcedid,
+                    url=url,
+                )
             )
 
+        if not passbacks:
+            return errors
+
+        errors.update(psef.lti.LTI.passback_grades(passbacks))
+        done = [p.id for p in passbacks if p.id not in errors]
+        if not done:
+            return errors
+
+        newest_history_ids: t.Dict[int, int] = {}
+        for work_id, history_id in db.session.query(
+            t.cast(DbColumn[int], GradeHistory.work_id),
+            t.cast(DbColumn[int], GradeHistory.id),
+        ).filter(
+            t.cast(DbColumn[int], GradeHistory.work_id).in_(done),
+        ).order_by(
+            t.cast(DbColumn[datetime.datetime],
+                   GradeHistory.changed_at).desc(),
+        ).with_for_update():
+            newest_history_ids.setdefault(work_id, history_id)
+
+        db.session.query(GradeHistory).filter(
+            t.cast(DbColumn[int],
+                   GradeHistory.id).in_(list(newest_history_ids.values())),
+        ).update(
+            {
+                'passed_back': True
+            }, synchronize_session='fetch'
+        )
+
+        return errors
+
     def select_rubric_items(
         self, items: t.List['RubricItem'], user: User, override: bool = False
     ) -> None:
@@ -1394,44 +1723,88 @@ class Work(Base):
 
         :param session: The db session
         :param tree: The file tree as described by
-            :py:func:`psef.files.rename_directory_structure`
+            :py:func:`psef.files.extract_to_blob_store`
         :returns: Nothing
         """
-        return self._add_file_tree(session, tree, None)
+        Work.add_file_trees(session, [(self, tree)])
 
-    def _add_file_tree(
-        self,
+    @staticmethod
+    def add_file_trees(
         session: 'orm.scoped_session',
-        tree: 'psef.files.ExtractFileTree',
-        top: t.Optional['File'],
+        trees: t.Sequence[t.Tuple['Work', 'psef.files.ExtractFileTree']],
     ) -> None:
-        """Add the given tree to the session with top as parent.
+        """Insert the files of the given trees for the given works.
+
+        The files are inserted in bulk without creating :class:`File` objects.
+        All files of a single level of all the trees are inserted with a
+        single statement. Directories are inserted one by one, as their ids
+        are needed as parent of the next level and their paths are not unique
+        (two uploaded archives can contain a directory with the same name).
+
+        .. warning::
+
+            The db session is flushed but not commited!
 
         :param session: The db session
-        :param tree: The file tree as described by
-                          :py:func:`psef.files.rename_directory_structure`
-        :param top: The parent file
+        :param trees: A list of works and the file tree that should be added
+            to them, as described by
+            :py:func:`psef.files.extract_to_blob_store`.
         :returns: Nothing
         """
-        for old_top, children in tree.items():
-            new_top = File(
-                work=self, is_directory=True, name=old_top, parent=top
-            )
-            session.add(new_top)
-            for child in children:
-                if isinstance(child, t.MutableMapping):
-                    self._add_file_tree(session, child, new_top)
-                    continue
-                name, filename = child
-                session.add(
-                    File(
-                        work=self,
-                        name=name,
-                        filename=filename,
-                        is_directory=False,
-                        parent=new_top
-                    )
-                )
+        # Make sure all works have an id.
+        session.flush()
+        table = t.cast(t.Any, File).__table__
+
+        # The items of a level are the work id, the id and the path of the
+        # parent directory and the entries that should be inserted in this
+        # parent.
+        level: t.List[t.Tuple[int, t.Optional[int], t.Optional[str],
+                              t.Sequence[t.Any]]]
+        level = [(work.id, None, None, [tree]) for work, tree in trees]
+
+        while level:
+            rows = []
+            next_level = []
+
+            for work_id, parent_id, parent_path, entries in level:
+                for entry in entries:
+                    if isinstance(entry, t.MutableMapping):
+                        items = [
+                            (name, None, children)
+                            for name, children in entry.items()
+                        ]
+                    else:
+                        name, filename = entry
+                        items = [(name, filename, None)]
+
+                    for name, filename, children in items:
+                        path = name if parent_path is None else (
+                            f'{parent_path}/{name}'
+                        )
+                        row = {
+                            'Work_id': work_id,
+                            'name': name,
+                            'path': path,
+                            'filename': filename,
+                            'is_directory': children is not None,
+                            'parent_id': parent_id,
+                        }
+                        if children is None:
+                            rows.append(row)
+                            continue
+
+                        dir_id = session.execute(
+                            table.insert(), row
+                        ).inserted_primary_key[0]
+                        if children:
+                            next_level.append(
+                                (work_id, dir_id, path, children)
+                            )
+
+            if rows:
+                session.execute(table.insert(), rows)
+
+            level = next_level
 
     def get_all_feedback(self) -> t.Tuple[t.Iterable[str], t.Iterable[str], ]:
         """Get all feedback for this work.
@@ -1468,6 +1841,71 @@ class Work(Base):
 
         return __get_user_feedback(), __get_linter_feedback()
 
+    @staticmethod
+    def get_all_feedback_of_works(
+        work_ids: t.Sequence[int]
+    ) -> t.Mapping[int, t.Tuple[t.List[str], t.List[str]]]:
+        """Get all feedback for all the given works at once.
+
+        This produces the same feedback as :py:meth:`Work.get_all_feedback`,
+        however the feedback of all the works is retrieved using only two
+        queries.
+
+        :param work_ids: The ids of the works to get the feedback for.
+        :returns: A mapping from each given work id to a tuple of two lists
+            of human readable representations of the given feedback. The
+            first list contains the feedback given by a person and the second
+            the feedback given by the linters.
+        """
+        res: t.Dict[int, t.Tuple[t.List[str], t.List[str]]] = {
+            work_id: ([], [])
+            for work_id in work_ids
+        }
+        if not res:
+            return res
+
+        comments = db.session.query(
+            File.work_id,
+            File.name,
+            Comment.line,
+            Comment.comment,
+        ).select_from(Comment).join(File, File.id == Comment.file_id).filter(
+            t.cast(DbColumn[int], File.work_id).in_(list(res)),
+        ).order_by(
+            t.cast(DbColumn[int], Comment.file_id).asc(),
+            t.cast(DbColumn[int], Comment.line).asc(),
+        )
+        for work_id, name, line, comment in comments:
+            res[work_id][0].append(f'{name}:{line}:0: {comment}')
+
+        linter_comments = db.session.query(
+            File.work_id,
+            File.name,
+            LinterComment.line,
+            AssignmentLinter.name,
+            LinterComment.linter_code,
+            LinterComment.comment,
+        ).select_from(LinterComment).join(
+            File,
+            File.id == LinterComment.file_id,
+        ).join(
+            LinterInstance,
+            LinterInstance.id == LinterComment.linter_id,
+        ).join(
+            AssignmentLinter,
+            AssignmentLinter.id == LinterInstance.tester_id,
+        ).filter(
+            t.cast(DbColumn[int], File.work_id).in_(list(res)),
+        ).order_by(
+            LinterComment.file_id.asc(),  # type: ignore
+            LinterComment.line.asc(),  # type: ignore
+        )
+        for work_id, name, line, linter, code, comment in linter_comments:
+            msg = f'{name}:{line}:0: ({linter} {code}) {comment}'
+            res[work_id][1].append(msg)
+
+        return res
+
     def remove_selected_rubric_item(self, row_id: int) -> None:
         """Deselect selected :class:`RubricItem` on row.
 
@@ -1502,26 +1940,10 @@ class Work(Base):
         """
         patharr, is_dir = psef.files.split_path(pathname)
 
-        parent: t.Optional[t.Any] = None
-        for idx, pathpart in enumerate(patharr[:-1]):
-            if parent is not None:
-                parent = parent.c.id
-
-            parent = db.session.query(t.cast(DbColumn[int], File.id)).filter(
-                File.name == pathpart,
-                File.parent_id == parent,
-                File.work_id == self.id,
-                File.is_directory,
-            ).subquery(f'parent_{idx}')
-
-        if parent is not None:
-            parent = parent.c.id
-
         return psef.helpers.filter_single_or_404(
             File,
             File.work_id == self.id,
-            File.name == patharr[-1],
-            File.parent_id == parent,
+            File.path == '/'.join(patharr),
             File.fileowner != exclude,
             File.is_directory == is_dir,
         )
@@ -1547,6 +1969,11 @@ class FileOwner(enum.IntEnum):
     both: int = 3
 
 
+# A row with some of the columns of a :class:`File`, as queried by
+# :py:meth:`File.query_rows`.
+FileRow = t.Any  # pylint: disable=invalid-name
+
+
 class File(Base):
     """
     This object describes a file or directory that stored is stored on the
@@ -1567,9 +1994,17 @@ class File(Base):
     )
     name: str = db.Column('name', db.Unicode, nullable=False)
 
-    # This is the filename for the original file on the disk
+    # This is the full path of this file within its work, so the names of all
+    # its parents and its own name joined by slashes. It is stored so paths
+    # can be resolved with a single query, see :py:meth:`Work.search_file`.
+    path: str = db.Column('path', db.Unicode, nullable=False)
+
+    # This is the name of the blob in the blob store (see
+    # :py:func:`psef.files.store_blob`) with the contents of this file. Blobs
+    # are shared between files with the same contents, so this column is
+    # indexed to count the references to a blob.
     filename: t.Optional[str]
-    filename = db.Column('filename', db.Unicode, nullable=True)
+    filename = db.Column('filename', db.Unicode, nullable=True, index=True)
     modification_date = db.Column(
         'modification_date', db.DateTime, default=datetime.datetime.utcnow
     )
@@ -1595,6 +2030,30 @@ class File(Base):
 
     work = db.relationship('Work', foreign_keys=work_id)  # type: 'Work'
 
+    __table_args__ = (db.Index('ix_File_Work_id_path', work_id, path), )
+
+    def __init__(self, **kwargs: t.Any) -> None:
+        super().__init__(**kwargs)
+        if self.path is None:
+            parent = self.parent
+            if parent is None and self.parent_id is not None:
+                parent = File.query.get(self.parent_id)
+                assert parent is not None
+            self.path = File.get_path(parent, self.name)
+
+    @staticmethod
+    def get_path(parent: t.Optional['File'], name: str) -> str:
+        """Get the path of a file with the given name in the given parent.
+
+        :param parent: The parent directory of the file, or ``None`` for the
+            top level directory of a submission.
+        :param name: The name of the file.
+        :returns: The path of the file.
+        """
+        if parent is None:
+            return name
+        return f'{parent.path}/{name}'
+
     @staticmethod
     def get_exclude_owner(owner: t.Optional[str], course_id: int) -> FileOwner:
         """Get the :class:`FileOwner` the current user does not want to see
@@ -1636,14 +2095,6 @@ class File(Base):
         assert not self.is_directory
         return os.path.join(current_app.config['UPLOAD_DIR'], self.filename)
 
-    def delete_from_disk(self) -> None:
-        """Delete the file from disk if it is not a directory.
-
-        :returns: Nothing.
-        """
-        if not self.is_directory:
-            os.remove(self.get_diskname())
-
     def list_contents(self, exclude: FileOwner) -> 'psef.files.FileTree':
         """List the basic file info and the info of its children.
 
@@ -1680,21 +2131,80 @@ class File(Base):
         """
         if not self.is_directory:
             return {"name": self.name, "id": self.id}
-        else:
-            children = [
-                child.list_contents(exclude)
-                for child in self.get_sorted_children(exclude)
-            ]
+
+        children = File.get_children_of_work(self.work_id, exclude)
+
+        def __list(row: 'FileRow') -> 'psef.files.FileTree':
+            if not row.is_directory:
+                return {"name": row.name, "id": row.id}
             return {
-                "name": self.name,
-                "id": self.id,
-                "entries": children,
+                "name": row.name,
+                "id": row.id,
+                "entries": [__list(child) for child in children[row.id]],
             }
 
-    def get_sorted_children(self, exclude: FileOwner) -> t.List['File']:
-        return sorted(
-            self.children.filter(File.fileowner != exclude),
-            key=lambda el: el.name.lower(),
+        return __list(self)
+
+    @staticmethod
+    def query_rows(*criteria: t.Any) -> '_MyQuery[FileRow]':
+        """Query the columns needed to build file trees of the files matching
+        the given criteria.
+
+        The rows of the returned query have the ``work_id``, ``id``,
+        ``parent_id``, ``name``, ``filename``, ``is_directory`` and
+        ``modification_date`` attributes, and are ordered by ``work_id``.
+
+        :param criteria: The criteria the files should match.
+        :returns: The query for the rows.
+        """
+        return db.session.query(
+            File.work_id,
+            File.id,
+            File.parent_id,
+            File.name,
+            File.filename,
+            File.is_directory,
+            File.modification_date,
+        ).filter(*criteria).order_by(File.work_id)
+
+    @staticmethod
+    def group_rows_by_parent(
+        rows: t.Iterable['FileRow']
+    ) -> t.DefaultDict[t.Optional[int], t.List['FileRow']]:
+        """Group the given file rows by their parent.
+
+        :param rows: The rows to group, for example queried by
+            :py:meth:`File.query_rows`.
+        :returns: A mapping from the id of a parent to its children sorted by
+            their lowercase name. Top level files are stored under the key
+            ``None``.
+        """
+        children: t.DefaultDict[t.Optional[int], t.List['FileRow']]
+        children = defaultdict(list)
+        for row in rows:
+            children[row.parent_id].append(row)
+        for siblings in children.values():
+            siblings.sort(key=lambda el: el.name.lower())
+        return children
+
+    @staticmethod
+    def get_children_of_work(
+        work_id: int, exclude: FileOwner
+    ) -> t.DefaultDict[t.Optional[int], t.List['FileRow']]:
+        """Load the entire file tree of a :class:`Work` using a single query.
+
+        :param work_id: The id of the work to load the files for.
+        :param exclude: The file owner to exclude from the tree. Files in an
+            excluded directory will never be reachable from the top of the
+            tree.
+        :returns: The files grouped by their parent, see
+            :py:meth:`File.group_rows_by_parent`.
+        """
+        return File.group_rows_by_parent(
+            File.query_rows(
+                File.work_id == work_id,
+                File.fileowner != exclude,
+            )
         )
 
     def rename_code(
@@ -1703,7 +2213,10 @@ class File(Base):
         new_parent: 'File',
         exclude_owner: FileOwner,
     ) -> None:
-        """Rename the this file to the given new name.
+        """Rename the this file to the given new name and move it to the given
+        new parent.
+
+        The path of this file and of all its descendants is updated.
 
         :param new_name: The new name to be given to the given file.
         :param new_parent: The new parent of this file.
@@ -1724,7 +2237,30 @@ class File(Base):
                 psef.errors.APICodes.INVALID_STATE, 400
             )
 
+        old_path = self.path
         self.name = new_name
+        self.parent = new_parent
+        self.path = File.get_path(new_parent, new_name)
+
+        if not self.is_directory:
+            return
+
+        db.session.flush()
+        children = File.group_rows_by_parent(
+            File.query_rows(File.work_id == self.work_id)
+        )
+        todo = [self.id]
+        descendants: t.List[int] = []
+        while todo:
+            for child in children[todo.pop()]:
+                descendants.append(child.id)
+                todo.append(child.id)
+
+        if descendants:
+            for child in File.query.filter(
+                t.cast(DbColumn[int], File.id).in_(descendants)
+            ):
+                child.path = self.path + child.path[len(old_path):]
 
     def __to_json__(self) -> t.Mapping[str, t.Union[str, bool, int]]:
         """Creates a JSON serializable representation of this object.
@@ -2173,8 +2709,8 @@ class Assignment(Base):
             t.List[t.Tuple[int]],
             self.get_from_latest_submissions(Work.id).all()
         )
-        for i in range(0, len(subs), 10):
-            psef.tasks.passback_grades([s[0] for s in subs[i:i + 10]])
+        if subs:
+            psef.tasks.passback_grades([s[0] for s in subs])
 
     def change_notifications(
         self,
@@ -2342,6 +2878,145 @@ class Assignment(Base):
                ).subquery('sub')
         return db.session.query(func.sum(sub.c.max_val)).scalar()
 
+    def get_works_json(
+        self,
+        user: User,
+        extended: bool = False,
+        page: t.Optional['psef.helpers.KeysetPagination'] = None,
+    ) -> t.Iterator[t.Dict[str, t.Any]]:
+        """Get the JSON serializable representation of all works of this
+        assignment the given user can see.
+
+        This produces the same objects as :py:meth:`Work.__to_json__` (or
+        :py:meth:`Work.__extended_to_json__` if ``extended`` is ``True``),
+        however the permissions of the user are only checked once and the
+        works are retrieved with a single query that only selects the needed
+        columns. The permissions are checked when this method is called, so
+        before any work is produced, while the query is retrieved in batches
+        when the works are produced.
+
+        :param user: The user for which the works should be serialized. If
+            this user cannot see the work of others only the works of this user
+            are returned.
+        :param extended: Also include the general feedback comment of the
+            works.
+        :param page: If given only the works of this page are produced, works
+            are paginated by their ``created_at`` and ``id``.
+        :returns: An iterator producing the serialized works, newest first.
+        """
+        course_id = self.course_id
+        can_see_others = user.has_permission('can_see_others_work', course_id)
+        can_see_assignee = user.has_permission('can_see_assignee', course_id)
+        grade_visible = self.is_done or user.has_permission(
+            'can_see_grade_before_open', course_id
+        )
+
+        author = orm.aliased(User)
+        assignee = orm.aliased(User)
+        rubric_work = orm.aliased(Work)
+        points = db.session.query(
+            work_rubric_item.c.work_id.label('work_id'),
+            func.sum(RubricItem.points).label('points'),
+        ).join(RubricItem,
+               RubricItem.id == work_rubric_item.c.rubricitem_id).join(
+                   rubric_work, rubric_work.id == work_rubric_item.c.work_id
+               ).filter(
+                   rubric_work.assignment_id == self.id,
+               )
+        if not can_see_others:
+            points = points.filter(rubric_work.user_id == user.id)
+        points = points.group_by(work_rubric_item.c.work_id).subquery('points')
+
+        columns = [
+            t.cast(DbColumn[int], Work.id).label('id'),
+            Work.user_id.label('user_id'),
+            Work.created_at.label('created_at'),
+            Work._grade.label('grade'),
+            points.c.points.label('points'),
+            author.id.label('author_id'),
+            author.name.label('author_name'),
+            author.email.label('author_email'),
+            author.username.label('author_username'),
+            assignee.id.label('assignee_id'),
+            assignee.name.label('assignee_name'),
+            assignee.email.label('assignee_email'),
+            assignee.username.label('assignee_username'),
+        ]
+        if extended:
+            columns.append(Work.comment.label('comment'))
+
+        query = db.session.query(*columns).outerjoin(
+            author, author.id == Work.user_id
+        ).outerjoin(assignee, assignee.id == Work.assigned_to).outerjoin(
+            points, points.c.work_id == Work.id
+        ).filter(
+            Work.assignment_id == self.id,
+        )
+
+        if not can_see_others:
+            query = query.filter(Work.user_id == user.id)
+
+        if page is None:
+            query = query.order_by(t.cast(t.Any, Work.created_at).desc())
+        else:
+            query = page.paginate(
+                query, [(Work.created_at, True), (Work.id, True)]
+            )
+
+        max_points: t.Optional[float] = None
+
+        def get_grade(row: t.Any) -> t.Optional[float]:
+            nonlocal max_points
+
+            if row.grade is not None:
+                return row.grade
+            elif row.points is None:
+                return None
+            if max_points is None:
+                max_points = self.max_rubric_points
+            return psef.helpers.between(0, row.points / max_points * 10, 10)
+
+        def __get_works() -> t.Iterator[t.Dict[str, t.Any]]:
+            for row in query.yield_per(
+                current_app.config['STREAM_BATCH_SIZE']
+            ):
+                author = None
+                if row.author_id is not None:
+                    author = {
+                        'id': row.author_id,
+                        'name': row.author_name,
+                        'email': row.author_email,
+                        'username': row.author_username,
+                    }
+
+                item = {
+                    'id': row.id,
+                    'user': author,
+                    'created_at': row.created_at.isoformat(),
+                    'assignee': None,
+                    'grade': None,
+                }
+
+                if can_see_assignee and row.assignee_id is not None:
+                    item['assignee'] = {
+                        'id': row.assignee_id,
+                        'name': row.assignee_name,
+                        'email': row.assignee_email,
+                        'username': row.assignee_username,
+                    }
+
+                can_see_grade = grade_visible and (
+                    can_see_others or row.user_id == user.id
+                )
+                if can_see_grade:
+                    item['grade'] = get_grade(row)
+                if extended:
+                    item['comment'] = row.comment if can_see_grade else None
+
+                yield item
+
+        return __get_works()
+
     @property
     def is_open(self) -> bool:
         """Is the current assignment open, which means the assignment is in the
@@ -2616,6 +3291,117 @@ class Assignment(Base):
 
         return missing, __recalculate
 
+    def add_blackboard_submissions(
+        self,
+        submissions: t.Sequence[t.Tuple['psef.blackboard.SubmissionInfo',
+                                        'psef.files.ExtractFileTree']],
+        grader: User,
+    ) -> t.List['Work']:
+        """Add the given submissions of a blackboard zip to this assignment.
+
+        Users that do not exist yet are created and enrolled as student in the
+        course of this assignment. The new works are divided among the
+        graders and their grades are set.
+
+        .. warning::
+
+            The db session is flushed but not commited!
+
+        .. note::
+
+            The grades of the created works are not passed back.
+
+        :param submissions: The submissions as returned by
+            :py:func:`psef.files.process_blackboard_zip`.
+        :param grader: The user that should be the author of the grades.
+        :returns: The newly created works.
+        """
+        missing, recalc_missing = self.get_divided_amount_missing()
+        sub_lookup = {}
+        for sub in self.get_all_latest_submissions():
+            sub_lookup[sub.user_id] = sub
+
+        student_course_role = CourseRole.query.filter_by(
+            name='Student', course_id=self.course_id
+        ).first()
+        global_role = Role.query.filter_by(name='Student').first()
+
+        subs = []
+        hists = []
+        trees = []
+
+        found_users = {
+            u.username: u
+            for u in User.query.filter(
+                t.cast(
+                    DbColumn[str],
+                    User.username,
+                ).in_([si.student_id for si, _ in submissions])
+            ).options(orm.joinedload(User.courses))
+        }
+
+        newly_assigned: t.Set[t.Optional[int]] = set()
+
+        for submission_info, submission_tree in submissions:
+            user = found_users.get(submission_info.student_id, None)
+
+            if user is None:
+                # TODO: Check if this role still exists
+                user = User(
+                    name=submission_info.student_name,
+                    username=submission_info.student_id,
+                    courses={self.course_id: student_course_role},
+                    email='',
+                    password=None,
+                    role=global_role,
+                )
+                found_users[user.username] = user
+                # We don't need to track the users to insert as we are already
+                # tracking the submissions of them and they are coupled.
+            else:
+                user.courses[self.course_id] = student_course_role
+
+            work = Work(
+                assignment=self,
+                user=user,
+                created_at=submission_info.created_at,
+            )
+            subs.append(work)
+
+            if user.id is not None and user.id in sub_lookup:
+                work.assigned_to = sub_lookup[user.id].assigned_to
+
+            if work.assigned_to is None:
+                if missing:
+                    work.assigned_to = max(
+                        missing.keys(), key=lambda k: missing[k]
+                    )
+                    missing = recalc_missing(work.assigned_to)
+                    sub_lookup[user.id] = work
+
+            hists.append(
+                work.set_grade(
+                    submission_info.grade,
+                    grader,
+                    add_to_session=False,
+                    never_passback=True,
+                )
+            )
+            trees.append((work, submission_tree))
+            if work.assigned_to is not None:
+                newly_assigned.add(work.assigned_to)
+
+        self.set_graders_to_not_done(
+            list(newly_assigned),
+            send_mail=True,
+            ignore_errors=True,
+        )
+
+        db.session.add_all(subs)
+        db.session.add_all(hists)
+        Work.add_file_trees(db.session, trees)
+        return subs
+
     def _weights_changed(self, user_weights: t.Sequence[t.Tuple[User, float]]
                          ) -> bool:
         """Check if the given users and their weights have changed since the
@@ -2875,3 +3661,372 @@ class RubricItem(Base):
             'header': self.header,
             'points': self.points,
         }
+
+
+@enum.unique
+class JobState(enum.IntEnum):
+    """Describes in what state a :class:`Job` is.
+
+    :param running: The job is waiting to be run or is currently running.
+    :param done: The job has finished without crashing.
+    :param crashed: The job has crashed in some way.
+    """
+    running: int = 1
+    done: int = 2
+    crashed: int = 3
+
+
+class Job(Base):
+    """This class describes a long running job that is executed by a celery
+    task on behalf of a :class:`User`.
+
+    Only the user that started a job can poll its state and progress.
+
+    :ivar kind: The kind of job, for example ``assignment_export``.
+    :ivar progress: A mapping describing the progress of the job, the keys
+        depend on the kind of job.
+    :ivar result: A mapping describing the result of the job, or ``None`` if
+        the job is not done.
+    :ivar error: The error message if the job crashed.
+    """
+    if t.TYPE_CHECKING:  # pragma: no cover
+        query = Base.query  # type: t.ClassVar[_MyQuery['Job']]
+    __tablename__ = 'Job'
+    # This has to be a String object as the id has to be a non guessable uuid.
+    id: str = db.Column(
+        'id', db.String(UUID_LENGTH), nullable=False, primary_key=True
+    )
+    kind: str = db.Column('kind', db.Unicode, nullable=False)
+    state: JobState = db.Column(
+        'state', db.Enum(JobState), default=JobState.running, nullable=False
+    )
+    created_at: datetime.datetime = db.Column(
+        'created_at', db.DateTime, default=datetime.datetime.utcnow
+    )
+    user_id: int = db.Column(
+        'User_id', db.Integer, db.ForeignKey('User.id', ondelete='CASCADE')
+    )
+    assignment_id: int = db.Column(
+        'Assignment_id',
+        db.Integer,
+        db.ForeignKey('Assignment.id', ondelete='CASCADE'),
+    )
+    progress: t.Mapping[str, int] = db.Column(
+        'progress', JSONType, nullable=False, default=dict
+    )
+    result: t.Optional[t.Mapping[str, str]] = db.Column(
+        'result', JSONType, nullable=True
+    )
+    error: t.Optional[str] = db.Column('error', db.Unicode, nullable=True)
+
+    user: User = db.relationship('User', foreign_keys=user_id)
+    assignment: Assignment = db.relationship(
+        'Assignment', foreign_keys=assignment_id
+    )
+
+    def __init__(self, kind: str, user: User, assignment: Assignment) -> None:
+        super().__init__(kind=kind, user=user, assignment=assignment)
+
+        # Find a unique id
+        new_id = str(uuid.uuid4())
+        while db.session.query(Job.query.filter(Job.id == new_id).exists()
+                               ).scalar():  # pragma: no cover
+            new_id = str(uuid.uuid4())
+
+        self.id = new_id
+        self.progress = {}
+
+    def __to_json__(self) -> t.Mapping[str, t.Any]:
+        """Creates a JSON serializable representation of this object.
+
+        This object will look like this:
+
+        .. code:: python
+
+            {
+                'id': str, # The id of this job.
+                'kind': str, # The kind of this job.
+                'state': str, # The name of the state of this job.
+                'created_at': str, # ISO UTC date.
+                'progress': t.Mapping[str, int], # The progress of this job.
+                'result': t.Mapping[str, str], # The result of this job, or
+                                               # `None` if it is not done.
+                'error': str, # The error message if this job crashed.
+            }
+
+        :returns: A object as described above.
+        """
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state.name,
+            'created_at': self.created_at.isoformat(),
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class PassbackQueueItem(Base):
+    """This class describes a LTI grade passback of a :class:`Work` that still
+    has to be done.
+
+    There is at most one item for every work, as the newest grade of the work
+    is read when the passback is done. Failed passbacks are retried with an
+    exponential backoff, and are moved to the :class:`FailedPassback` table
+    after ``LTI_PASSBACK_MAX_ATTEMPTS`` attempts.
+
+    :ivar work_id: The id of the work of which the grade should be passed
+        back.
+    :ivar initial: Is this the initial passback of a new work, without a
+        grade, see :py:meth:`Work.passback_grades`.
+    :ivar attempts: The amount of started attempts of this passback.
+    :ivar next_attempt_at: The passback is not attempted before this moment.
+    :ivar error: The error of the last failed attempt.
+    """
+    if t.TYPE_CHECKING:  # pragma: no cover
+        query = Base.query  # type: t.ClassVar[_MyQuery['PassbackQueueItem']]
+    __tablename__ = 'PassbackQueueItem'
+    work_id: int = db.Column(
+        'Work_id',
+        db.Integer,
+        db.ForeignKey('Work.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    initial: bool = db.Column(
+        'initial',
+        db.Boolean,
+        server_default=false(),
+        default=False,
+        nullable=False,
+    )
+    attempts: int = db.Column(
+        'attempts', db.Integer, default=0, nullable=False
+    )
+    next_attempt_at: datetime.datetime = db.Column(
+        'next_attempt_at',
+        db.DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        index=True,
+    )
+    error: t.Optional[str] = db.Column('error', db.Unicode, nullable=True)
+
+    work: Work = db.relationship('Work', foreign_keys=work_id)
+
+    @staticmethod
+    def enqueue(work_ids: t.Iterable[int], initial: bool = False) -> None:
+        """Add passbacks of the given works to the queue.
+
+        Passbacks of these works that are already in the queue are retried as
+        soon as possible, and failed passbacks of these works are removed.
+
+        :param work_ids: The ids of the works to add to the queue.
+        :param initial: Should the initial passback of these works be done.
+            Passbacks already in the queue are only changed to an initial
+            passback if they were one already.
+        :returns: Nothing
+        """
+        to_add = set(work_ids)
+        if not to_add:
+            return
+
+        queued = set(
+            work_id for work_id, in db.session.query(
+                t.cast(DbColumn[int], PassbackQueueItem.work_id),
+            ).filter(
+                t.cast(DbColumn[int], PassbackQueueItem.work_id).in_(to_add),
+            )
+        )
+        now = datetime.datetime.utcnow()
+
+        if queued:
+            values: t.Dict[str, t.Any] = {
+                'attempts': 0,
+                'next_attempt_at': now,
+            }
+            if not initial:
+                values['initial'] = False
+            db.session.query(PassbackQueueItem).filter(
+                t.cast(DbColumn[int], PassbackQueueItem.work_id).in_(queued),
+            ).update(
+                values, synchronize_session=False
+            )
+        db.session.bulk_insert_mappings(
+            PassbackQueueItem,
+            [
+                {
+                    'work_id': work_id,
+                    'initial': initial,
+                    'attempts': 0,
+                    'next_attempt_at': now,
+                } for work_id in to_add - queued
+            ]
+        )
+        db.session.query(FailedPassback).filter(
+            t.cast(DbColumn[int], FailedPassback.work_id).in_(to_add),
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def process(limit: int, due_at: datetime.datetime) -> int:
+        """Do the passbacks in the queue that are due.
+
+        Passbacks to LTI providers that are blocked because of too many
+        failures (see :py:meth:`LTIProvider.register_passbacks`) are skipped.
+
+        The due passbacks are claimed first, by counting their attempt and
+        moving their next attempt to after their backoff. This is committed
+        before the passbacks are done, so the queue is not locked while
+        waiting for the LTI consumers and the passbacks of a crashed worker
+        are retried after their backoff.
+
+        .. note::
+
+            This method commits the current session.
+
+        :param limit: The maximum amount of passbacks to do.
+        :param due_at: Only passbacks that should be attempted before this
+            moment are done.
+        :returns: The amount of passbacks that were attempted.
+        """
+        now = datetime.datetime.utcnow()
+        blocked_until = t.cast(
+            DbColumn[datetime.datetime], LTIProvider.passback_blocked_until
+        )
+        next_attempt_at = t.cast(
+            DbColumn[datetime.datetime], PassbackQueueItem.next_attempt_at
+        )
+        items = PassbackQueueItem.query.join(
+            Work, Work.id == PassbackQueueItem.work_id
+        ).join(Assignment, Assignment.id == Work.assignment_id).join(
+            Course, Course.id == Assignment.course_id
+        ).outerjoin(LTIProvider,
+                    LTIProvider.id == Course.lti_provider_id).filter(
+                        next_attempt_at <= due_at,
+                        or_(blocked_until.is_(None), blocked_until <= now),
+                    ).order_by(next_attempt_at).limit(limit).with_for_update(
+                        of=PassbackQueueItem.__table__, skip_locked=True
+                    ).all()
+        if not items:
+            return 0
+
+        max_attempts = current_app.config['LTI_PASSBACK_MAX_ATTEMPTS']
+        backoff = max(current_app.config['LTI_PASSBACK_BACKOFF'], 1)
+
+        # A mapping from work id to if the passback is initial and the moment
+        # of its next attempt.
+        claimed: t.Dict[int, t.Tuple[bool, datetime.datetime]] = {}
+        for item in items:
+            item.attempts += 1
+            item.next_attempt_at = now + datetime.timedelta(
+                seconds=backoff * 2 ** (item.attempts - 1)
+            )
+            claimed[item.work_id] = (item.initial, item.next_attempt_at)
+        db.session.commit()
+
+        works = Work.query.filter(
+            t.cast(DbColumn[int], Work.id).in_(list(claimed)),
+        ).all()
+        errors: t.Dict[int, Exception] = {}
+        for initial in [True, False]:
+            errors.update(
+                Work.passback_grades(
+                    [work for work in works if claimed[work.id][0] == initial],
+                    initial=initial,
+                )
+            )
+
+        results: t.Dict[LTIProvider, t.List[int]] = defaultdict(lambda: [0, 0])
+        for work in works:
+            provider = work.assignment.course.lti_provider
+            if provider is not None:
+                results[provider][1 if work.id in errors else 0] += 1
+
+        done = []
+        for item in PassbackQueueItem.query.filter(
+            t.cast(DbColumn[int],
+                   PassbackQueueItem.work_id).in_(list(claimed)),
+        ).with_for_update():
+            if item.next_attempt_at != claimed[item.work_id][1]:
+                # The passback was queued again while it was attempted, so
+                # it should be done again.
+                continue
+            if item.work_id not in errors:
+                done.append(item.work_id)
+                continue
+
+            exc = errors[item.work_id]
+            item.error = '{}: {}'.format(type(exc).__name__, exc)
+
+            if item.attempts >= max_attempts:
+                db.session.merge(
+                    FailedPassback(
+                        work_id=item.work_id,
+                        attempts=item.attempts,
+                        error=item.error,
+                        failed_at=now,
+                    )
+                )
+                db.session.delete(item)
+
+        if done:
+            db.session.query(PassbackQueueItem).filter(
+                t.cast(DbColumn[int], PassbackQueueItem.work_id).in_(done),
+            ).delete(synchronize_session='fetch')
+
+        for provider, (succeeded, failed) in results.items():
+            provider.register_passbacks(succeeded, failed)
+
+        return len(claimed)
+
+
+class FailedPassback(Base):
+    """This class describes a LTI grade passback of a :class:`Work` that
+    failed too often to be retried automatically.
+
+    :ivar work_id: The id of the work of which the grade was not passed back.
+    :ivar attempts: The amount of attempts that were done.
+    :ivar error: The error of the last attempt.
+    :ivar failed_at: The moment the last attempt failed.
+    """
+    if t.TYPE_CHECKING:  # pragma: no cover
+        query = Base.query  # type: t.ClassVar[_MyQuery['FailedPassback']]
+    __tablename__ = 'FailedPassback'
+    work_id: int = db.Column(
+        'Work_id',
+        db.Integer,
+        db.ForeignKey('Work.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    attempts: int = db.Column('attempts', db.Integer, nullable=False)
+    error: t.Optional[str] = db.Column('error', db.Unicode, nullable=True)
+    failed_at: datetime.datetime = db.Column(
+        'failed_at', db.DateTime, default=datetime.datetime.utcnow
+    )
+
+    work: Work = db.relationship('Work', foreign_keys=work_id)
+
+    def __to_json__(self) -> t.Mapping[str, t.Any]:
+        """Creates a JSON serializable representation of this object.
+
+        This object will look like this:
+
+        .. code:: python
+
+            {
+                'work_id': int, # The id of the work.
+                'assignment_id': int, # The id of the assignment of the work.
+                'attempts': int, # The amount of attempts that were done.
+                'error': str, # The error of the last attempt.
+                'failed_at': str, # ISO UTC date.
+            }
+
+        :returns: A object as described above.
+        """
+        return {
+            'work_id': self.work_id,
+            'assignment_id': self.work.assignment_id,
+            'attempts': self.attempts,
+            'error': self.error,
+            'failed_at': self.failed_at.isoformat(),
+        }
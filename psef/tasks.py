@@ -6,11 +6,15 @@ the mapping of the variables at the bottom of this file.
 
 :license: AGPLv3, see LICENSE for details.
 """
+import os
 import typing as t
+import datetime
+import contextlib
 from operator import itemgetter
 
 from celery import Celery as _Celery
 from celery.utils.log import get_task_logger
+from werkzeug.datastructures import FileStorage
 
 import psef as p
 
@@ -98,6 +102,39 @@ def init_app(app: t.Any) -> None:
     celery.conf.update(app.config['CELERY_CONFIG'])
     # This is a weird class that is like a dict but not really.
     celery.conf.update({'task_ignore_result': True})
+    celery.conf.update(
+        {
+            'beat_schedule':
+                {
+                    'process-passback-queue':
+                        {
+                            'task':
+                                _process_passback_queue_1.name,
+                            'schedule':
+                                app.config['LTI_PASSBACK_QUEUE_INTERVAL'],
+                        },
+                    'prune-mirror-uploads':
+                        {
+                            'task':
+                                _prune_mirror_uploads_1.name,
+                            'schedule':
+                                app.config['MIRROR_UPLOAD_PRUNE_INTERVAL'],
+                        },
+                    'prune-zip-cache':
+                        {
+                            'task': _prune_zip_cache_1.name,
+                            'schedule': app.config['ZIP_CACHE_PRUNE_INTERVAL'],
+                        },
+                    'prune-unreferenced-blobs':
+                        {
+                            'task':
+                                _prune_unreferenced_blobs_1.name,
+                            'schedule':
+                                app.config['UNREFERENCED_BLOB_PRUNE_INTERVAL'],
+                        },
+                },
+        }
+    )
     celery.init_app(app)
 
 
@@ -105,7 +142,7 @@ def init_app(app: t.Any) -> None:
 def _lint_instances_1(
     linter_name: str,
     cfg: str,
-    linter_instance_ids: t.Sequence[int],
+    linter_instance_ids: t.Sequence[str],
 ) -> None:
     p.linters.LinterRunner(
         p.linters.get_linter_by_name(linter_name),
@@ -113,15 +150,105 @@ def _lint_instances_1(
     ).run(linter_instance_ids)
 
 
+@celery.task
+def _lint_instance_files_1(
+    linter_name: str,
+    cfg: str,
+    linter_instance_id: str,
+    file_ids: t.Sequence[int],
+) -> None:
+    p.linters.LinterRunner(
+        p.linters.get_linter_by_name(linter_name),
+        cfg,
+    ).run([linter_instance_id], file_ids)
+
+
+def _do_passbacks() -> None:
+    start = datetime.datetime.utcnow()
+    limit = p.app.config['LTI_PASSBACK_BATCH_SIZE']
+
+    while True:
+        attempted = p.models.PassbackQueueItem.process(limit, start)
+        p.models.db.session.commit()
+        if attempted < limit:
+            break
+
+
 @celery.task
 def _passback_grades_1(submission_ids: t.Sequence[int]) -> None:
     if not submission_ids:  # pragma: no cover
         return
 
-    for sub in p.models.Work.query.filter(p.models.Work.id.in_(  # type: ignore
-        submission_ids,
-    )):
-        sub.passback_grade()
+    p.models.PassbackQueueItem.enqueue(submission_ids)
+    p.models.db.session.commit()
+    _do_passbacks()
+
+
+@celery.task
+def _process_passback_queue_1() -> None:
+    _do_passbacks()
+
+
+@celery.task
+def _prune_mirror_uploads_1() -> None:
+    max_age = datetime.timedelta(seconds=p.app.config['MIRROR_UPLOAD_MAX_AGE'])
+    # The input of a job that still has to run is stored under the id of the
+    # job, and the result of an export is kept until it is downloaded. Jobs
+    # older than the maximum age are not considered, so the files of jobs
+    # that will never finish or exports that are never downloaded still
+    # expire.
+    created_at = t.cast(
+        p.models.DbColumn[datetime.datetime], p.models.Job.created_at
+    )
+    recent_jobs = p.models.db.session.query(
+        p.models.Job.id,
+        p.models.Job.result,
+    ).filter(created_at >= datetime.datetime.utcnow() - max_age)
+    keep = set(
+        job_id for job_id, _ in recent_jobs.filter(
+            p.models.Job.state == p.models.JobState.running,
+        )
+    )
+    keep.update(
+        result['name'] for _, result in recent_jobs.filter(
+            p.models.Job.kind == 'assignment_export',
+            p.models.Job.state == p.models.JobState.done,
+        ) if result
+    )
+
+    directory = p.app.config['MIRROR_UPLOAD_DIR']
+    reclaimed = p.files.prune_directory(
+        directory,
+        max_age,
+        p.app.config['MIRROR_UPLOAD_MAX_SIZE'],
+        keep,
+    )
+    logger.info(
+        'Pruned %s, reclaimed %d bytes',
+        directory,
+        reclaimed,
+        extra={'reclaimed_bytes': reclaimed},
+    )
+
+
+@celery.task
+def _prune_zip_cache_1() -> None:
+    reclaimed = p.files.prune_zip_cache()
+    logger.info(
+        'Pruned zip cache, reclaimed %d bytes',
+        reclaimed,
+        extra={'reclaimed_bytes': reclaimed},
+    )
+
+
+@celery.task
+def _prune_unreferenced_blobs_1() -> None:
+    reclaimed = p.files.prune_unreferenced_blobs()
+    logger.info(
+        'Pruned unreferenced blobs, reclaimed %d bytes',
+        reclaimed,
+        extra={'reclaimed_bytes': reclaimed},
+    )
 
 
 @celery.task
@@ -179,6 +306,126 @@ def _send_grader_status_mail_1(
         p.mail.send_grader_status_changed_mail(assig, user)
 
 
+def _run_job(
+    job_id: str,
+    func: t.Callable[['p.models.Job'], t.Optional[t.Mapping[str, str]]],
+) -> None:
+    job = p.models.Job.query.get(job_id)
+    if job is None:  # pragma: no cover
+        return
+
+    try:
+        result = func(job)
+    # We really want to catch all exceptions here, as the job should never
+    # stay in the running state.
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception('Job %s crashed', job_id)
+        p.models.db.session.rollback()
+        job = p.models.Job.query.get(job_id)
+        job.state = p.models.JobState.crashed
+        job.error = e.message if isinstance(
+            e, p.errors.APIException
+        ) else 'Something unexpected went wrong.'
+    else:
+        job.state = p.models.JobState.done
+        job.result = result
+
+    p.models.db.session.commit()
+
+
+@celery.task
+def _export_submissions_1(job_id: str, exclude_owner: int) -> None:
+    def __export(job: p.models.Job) -> t.Mapping[str, str]:
+        def __report_progress(done: int, total: int) -> None:
+            job.progress = {'done': done, 'total': total}
+            p.models.db.session.commit()
+
+        name = p.files.export_submissions(
+            job.assignment,
+            p.models.FileOwner(exclude_owner),
+            __report_progress,
+        )
+        return {
+            'name': name,
+            'output_name': f'{job.assignment.name}-submissions.zip',
+        }
+
+    _run_job(job_id, __export)
+
+
+@celery.task
+def _import_blackboard_zip_1(job_id: str, name: str, filename: str) -> None:
+    def __count(tree: 'p.files.ExtractFileTree') -> t.Tuple[int, int]:
+        files, dirs = 0, 0
+        for entries in tree.values():
+            dirs += 1
+            for entry in entries:
+                if isinstance(entry, t.Mapping):
+                    sub_files, sub_dirs = __count(entry)
+                    files += sub_files
+                    dirs += sub_dirs
+                else:
+                    files += 1
+        return files, dirs
+
+    def __import(job: p.models.Job) -> None:
+        progress = {'parsed': 0, 'total': 0, 'files': 0, 'rows': 0}
+
+        def __report_progress(
+            done: int, total: int, tree: 'p.files.ExtractFileTree'
+        ) -> None:
+            progress['parsed'] = done
+            progress['total'] = total
+            progress['files'] += __count(tree)[0]
+            job.progress = dict(progress)
+            p.models.db.session.commit()
+
+        with open(path, 'rb') as f:
+            try:
+                # Celery workers are daemonic processes, which cannot start
+                # a pool of processes.
+                submissions = p.files.process_blackboard_zip(
+                    FileStorage(stream=f, filename=filename),
+                    __report_progress,
+                    workers=1,
+                )
+            except Exception:  # pylint: disable=broad-except
+                # TODO: Narrow this exception down.
+                logger.warning(
+                    'Importing blackboard zip failed', exc_info=True
+                )
+                submissions = []
+
+        if not submissions:
+            raise p.errors.APIException(
+                "The blackboard zip could not be imported or it was empty.",
+                'The blackboard zip could not'
+                ' be parsed or it did not contain any valid submissions.',
+                p.errors.APICodes.INVALID_PARAM, 400
+            )
+
+        works = job.assignment.add_blackboard_submissions(
+            submissions, job.user
+        )
+        # Every submission is stored as a work, a grade history and a row for
+        # every file and directory.
+        progress['rows'] = sum(
+            2 + sum(__count(tree)) for _, tree in submissions
+        )
+        job.progress = dict(progress)
+        p.models.db.session.commit()
+
+        if job.assignment.should_passback:
+            passback_grades([work.id for work in works])
+
+    path = os.path.join(p.app.config['MIRROR_UPLOAD_DIR'], name)
+    try:
+        _run_job(job_id, __import)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
 @celery.task
 def _add_1(first: int, second: int) -> int:  # pragma: no cover
     """This function is used for testing if celery works. What it actually does
@@ -188,8 +435,15 @@ def _add_1(first: int, second: int) -> int:  # pragma: no cover
 
 
 passback_grades = _passback_grades_1.delay  # pylint: disable=invalid-name
+process_passback_queue = _process_passback_queue_1.delay  # pylint: disable=invalid-name
+prune_mirror_uploads = _prune_mirror_uploads_1.delay  # pylint: disable=invalid-name
+prune_zip_cache = _prune_zip_cache_1.delay  # pylint: disable=invalid-name
+prune_unreferenced_blobs = _prune_unreferenced_blobs_1.delay  # pylint: disable=invalid-name
 lint_instances = _lint_instances_1.delay  # pylint: disable=invalid-name
+lint_instance_files = _lint_instance_files_1.delay  # pylint: disable=invalid-name
 add = _add_1.delay  # pylint: disable=invalid-name
 send_reminder_mails = _send_reminder_mails_1.apply_async  # pylint: disable=invalid-name
 send_done_mail = _send_done_mail_1.delay  # pylint: disable=invalid-name
 send_grader_status_mail = _send_grader_status_mail_1.delay  # pylint: disable=invalid-name
+export_submissions = _export_submissions_1.delay  # pylint: disable=invalid-name
+import_blackboard_zip = _import_blackboard_zip_1.delay  # pylint: disable=invalid-name
@@ -5,9 +5,12 @@ the APIs in this module are mostly used to manipulate
 
 :license: AGPLv3, see LICENSE for details.
 """
+import os
 import typing as t
 import numbers
 import datetime
+import itertools
+import contextlib
 from collections import defaultdict
 
 import sqlalchemy.sql as sql
@@ -27,9 +30,8 @@ from psef.errors import APICodes, APIWarnings, APIException, make_warning
 from psef.ignore import IgnoreFilterManager
 from psef.models import db
 from psef.helpers import (
-    JSONType, JSONResponse, EmptyResponse, ExtendedJSONResponse, jsonify,
-    ensure_json_dict, extended_jsonify, ensure_keys_in_dict,
-    make_empty_response
+    JSONType, JSONResponse, EmptyResponse, jsonify, ensure_json_dict,
+    ensure_keys_in_dict, make_empty_response
 )
 
 from . import api
@@ -47,13 +49,10 @@ def get_all_assignments() -> JSONResponse[t.Sequence[models.Assignment]]:
 
     :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
     """
-    perm_can_see: models.Permission = models.Permission.query.filter_by(
-        name='can_see_assignments'
-    ).first()
     courses = []
 
     for course_role in current_user.courses.values():
-        if course_role.has_permission(perm_can_see):
+        if course_role.has_permission('can_see_assignments'):
             courses.append(course_role.course_id)
 
     res = []
@@ -134,30 +133,49 @@ def get_assignments_feedback(
 
     auth.ensure_enrolled(assignment.course_id)
 
-    latest_subs = assignment.get_all_latest_submissions()
+    latest_subs = assignment.get_all_latest_submissions().options(
+        undefer(models.Work.comment)
+    )
     try:
         auth.ensure_permission('can_see_others_work', assignment.course_id)
     except auth.PermissionException:
         latest_subs = latest_subs.filter_by(user_id=current_user.id)
 
-    res = {}
-    for sub in latest_subs:
-        try:
-            # This call should be cached in auth.py
-            auth.ensure_can_see_grade(sub)
-
-            user_feedback, linter_feedback = sub.get_all_feedback()
-            item = {
-                'general': sub.comment or '',
-                'user': list(user_feedback),
-                'linter': list(linter_feedback),
-            }
-        except auth.PermissionException:
-            item = {'user': [], 'linter': [], 'general': ''}
+    # All permissions are checked before the response is returned, as its
+    # status is already sent when the submissions are retrieved. As the
+    # submissions are filtered above this check is equivalent to calling
+    # `auth.ensure_can_see_grade` for each submission.
+    can_see_grade = assignment.is_done or current_user.has_permission(
+        'can_see_grade_before_open', assignment.course_id
+    )
+    batch_size = app.config['STREAM_BATCH_SIZE']
+
+    def __get_feedback() -> t.Iterator[t.Tuple[str, t.Mapping[str, t.Any]]]:
+        subs = iter(latest_subs.yield_per(batch_size))
+        while True:
+            batch = list(itertools.islice(subs, batch_size))
+            if not batch:
+                break
+
+            if can_see_grade:
+                feedback = models.Work.get_all_feedback_of_works(
+                    [sub.id for sub in batch]
+                )
 
-        res[str(sub.id)] = item
+            for sub in batch:
+                if can_see_grade:
+                    user_feedback, linter_feedback = feedback[sub.id]
+                    item = {
+                        'general': sub.comment or '',
+                        'user': user_feedback,
+                        'linter': linter_feedback,
+                    }
+                else:
+                    item = {'user': [], 'linter': [], 'general': ''}
 
-    return jsonify(res)
+                yield str(sub.id), item
+
+    return helpers.stream_jsonify_mapping(__get_feedback())
 
 
 def set_reminder(
@@ -719,7 +737,10 @@ def upload_work(assignment_id: int) -> JSONResponse[models.Work]:
     db.session.flush()
 
     if assig.is_lti:
-        work.passback_grade(initial=True)
+        # The LTI consumer is not contacted in this request, so problems with
+        # the consumer do not prevent uploading a submission.
+        models.PassbackQueueItem.enqueue([work.id], initial=True)
+        helpers.callback_after_this_request(psef.tasks.process_passback_queue)
     db.session.commit()
 
     work.run_linter()
@@ -825,6 +846,10 @@ def get_all_graders(
 
     .. :quickref: Assignment; Get all graders for an assignment.
 
+    :qparam int limit: Paginate the graders by passing the maximum amount of
+        graders in a page, see :class:`.helpers.KeysetPagination`.
+    :qparam str cursor: The cursor of the page to retrieve.
+
     :param int assignment_id: The id of the assignment
     :returns: A response containing the JSON serialized graders.
 
@@ -839,11 +864,31 @@ def get_all_graders(
     :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
     :raises PermissionException: If the user is not allowed to view graders of
                                  this assignment. (INCORRECT_PERMISSION)
+    :raises APIException: If the given limit or cursor is not valid.
+                          (INVALID_PARAM)
     """
     assignment = helpers.get_or_404(models.Assignment, assignment_id)
     auth.ensure_permission('can_see_assignee', assignment.course_id)
 
-    result = assignment.get_all_graders(sort=True)
+    page = helpers.KeysetPagination.from_request()
+    result: t.Iterable[t.Sequence[t.Any]]
+    if page is None:
+        result = assignment.get_all_graders(sort=True)
+    else:
+        graders = assignment.get_all_graders(sort=False).subquery('graders')
+        lower_name = sql.func.lower(graders.c.name)
+        result = page.get_page(
+            page.paginate(
+                db.session.query(
+                    graders.c.name,
+                    graders.c.id,
+                    graders.c.done,
+                    lower_name,
+                ),
+                [(lower_name, False), (graders.c.id, False)],
+            ),
+            lambda row: (row[3], row[1]),
+        )
 
     divided: t.MutableMapping[int, float] = defaultdict(int)
     for assigned_grader in models.AssignmentAssignedGrader.query.filter_by(
@@ -851,16 +896,17 @@ def get_all_graders(
     ):
         divided[assigned_grader.user_id] = assigned_grader.weight
 
-    return jsonify(
-        [
-            {
-                'id': res[1],
-                'name': res[0],
-                'weight': float(divided[res[1]]),
-                'done': res[2],
-            } for res in result
-        ]
-    )
+    graders_json = [
+        {
+            'id': res[1],
+            'name': res[0],
+            'weight': float(divided[res[1]]),
+            'done': res[2],
+        } for res in result
+    ]
+    if page is None:
+        return jsonify(graders_json)
+    return page.jsonify(graders_json)
 
 
 @api.route(
@@ -990,13 +1036,11 @@ def set_grader_to_done(assignment_id: int, grader_id: int) -> EmptyResponse:
     return make_empty_response()
 
 
-WorkList = t.Sequence[models.Work]  # pylint: disable=invalid-name
+WorkList = t.Sequence[t.Mapping[str, t.Any]]  # pylint: disable=invalid-name
 
 
 @api.route('/assignments/<int:assignment_id>/submissions/', methods=['GET'])
-def get_all_works_for_assignment(
-    assignment_id: int
-) -> t.Union[JSONResponse[WorkList], ExtendedJSONResponse[WorkList]]:
+def get_all_works_for_assignment(assignment_id: int) -> JSONResponse[WorkList]:
     """Return all :class:`.models.Work` objects for the given
     :class:`.models.Assignment`.
 
@@ -1005,6 +1049,9 @@ def get_all_works_for_assignment(
     :qparam boolean extended: Whether to get extended or normal
         :class:`.models.Work` objects. The default value is ``false``, you can
         enable extended by passing ``true``, ``1`` or an empty string.
+    :qparam int limit: Paginate the submissions by passing the maximum amount
+        of submissions in a page, see :class:`.helpers.KeysetPagination`.
+    :qparam str cursor: The cursor of the page to retrieve.
 
     :param int assignment_id: The id of the assignment
     :returns: A response containing the JSON serialized submissions.
@@ -1012,6 +1059,8 @@ def get_all_works_for_assignment(
     :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
     :raises PermissionException: If the assignment is hidden and the user is
                                  not allowed to view it. (INCORRECT_PERMISSION)
+    :raises APIException: If the given limit or cursor is not valid.
+                          (INVALID_PARAM)
     """
     assignment = helpers.get_or_404(models.Assignment, assignment_id)
 
@@ -1022,32 +1071,73 @@ def get_all_works_for_assignment(
             'can_see_hidden_assignments', assignment.course_id
         )
 
-    obj = models.Work.query.filter_by(
-        assignment_id=assignment_id,
-    ).options(joinedload(
-        models.Work.selected_items,
-    )).order_by(t.cast(t.Any, models.Work.created_at).desc())
+    extended = request.args.get('extended', 'false').lower()
+    page = helpers.KeysetPagination.from_request()
+
+    works = assignment.get_works_json(
+        current_user,
+        extended=extended in {'true', '1', ''},
+        page=page,
+    )
 
-    if not current_user.has_permission(
-        'can_see_others_work', course_id=assignment.course_id
-    ):
-        obj = obj.filter_by(user_id=current_user.id)
+    if page is None:
+        return helpers.stream_jsonify(works)
+    return page.jsonify(
+        page.get_page(works, lambda work: (work['created_at'], work['id']))
+    )
 
-    extended = request.args.get('extended', 'false').lower()
 
-    if extended in {'true', '1', ''}:
-        obj = obj.options(undefer(models.Work.comment))
-        return extended_jsonify(
-            obj.all(),
-            use_extended=lambda obj: isinstance(obj, models.Work),
-        )
-    else:
-        return jsonify(obj.all())
+@api.route(
+    '/assignments/<int:assignment_id>/submissions/export', methods=['POST']
+)
+@auth.login_required
+def start_submissions_export(assignment_id: int) -> JSONResponse[models.Job]:
+    """Start exporting the latest submissions of the given
+    :class:`.models.Assignment` as a single zip archive.
+
+    .. :quickref: Assignment; Export all latest submissions as zip archive.
+
+    The export is done in the background, the state of the returned
+    :class:`.models.Job` can be retrieved with
+    :http:get:`/api/v1/jobs/(job_id)`. When the job is done its ``result``
+    contains a ``name`` which can be given to ``GET - /api/v1/files/<name>``
+    and an ``output_name``.
+
+    :query str owner: The type of files to export, if set to `teacher` the
+        teacher revision of the submissions is exported, otherwise the student
+        revision is exported.
+
+    :param int assignment_id: The id of the assignment
+    :returns: A response containing the JSON serialized job.
+
+    :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
+    :raises PermissionException: If the user cannot see the work of others or
+                                 the requested teacher files.
+                                 (INCORRECT_PERMISSION)
+    """
+    assignment = helpers.get_or_404(models.Assignment, assignment_id)
+
+    auth.ensure_permission('can_see_others_work', assignment.course_id)
+    exclude_owner = models.File.get_exclude_owner(
+        request.args.get('owner'),
+        assignment.course_id,
+    )
+    if exclude_owner == models.FileOwner.student:
+        auth.ensure_permission('can_edit_others_work', assignment.course_id)
+
+    job = models.Job('assignment_export', current_user, assignment)
+    db.session.add(job)
+    db.session.commit()
+
+    psef.tasks.export_submissions(job.id, exclude_owner.value)
+
+    return jsonify(job, status_code=201)
 
 
 @api.route("/assignments/<int:assignment_id>/submissions/", methods=['POST'])
 @helpers.feature_required('BLACKBOARD_ZIP_UPLOAD')
-def post_submissions(assignment_id: int) -> EmptyResponse:
+def post_submissions(assignment_id: int
+                     ) -> t.Union[EmptyResponse, JSONResponse[models.Job]]:
     """Add submissions to the  given:class:`.models.Assignment` from a
     blackboard zip file as :class:`.models.Work` objects.
 
@@ -1057,8 +1147,19 @@ def post_submissions(assignment_id: int) -> EmptyResponse:
     with 'file'. Multiple blackboard zips are not supported and result in one
     zip being chosen at (psuedo) random.
 
+    If the zip is imported in the background the progress of the returned
+    job can be retrieved using :http:get:`/api/v1/jobs/(job_id)`. Its
+    ``progress`` contains the amount of ``parsed`` students, the ``total``
+    amount of students, the amount of ``files`` stored and the amount of
+    database ``rows`` inserted.
+
+    :query str background: If ``true`` the zip is stored and imported by a
+        background job, otherwise it is imported directly.
+
     :param int assignment_id: The id of the assignment
-    :returns: An empty response with return code 204
+    :returns: An empty response with return code 204, or the serialized
+        :class:`.models.Job` with return code 202 if the zip is imported in
+        the background.
 
     :raises APIException: If no assignment with given id exists.
         (OBJECT_ID_NOT_FOUND)
@@ -1074,6 +1175,29 @@ def post_submissions(assignment_id: int) -> EmptyResponse:
     auth.ensure_permission('can_upload_bb_zip', assignment.course_id)
     files = get_submission_files_from_request(check_size=False)
 
+    if request.args.get('background', 'false') == 'true':
+        job = models.Job('blackboard_import', current_user, assignment)
+        # The zip is stored under the id of the job, so it is not pruned
+        # while the job is still running. The job is only stored when the
+        # zip is, so it never waits for a file that does not exist.
+        path = os.path.join(app.config['MIRROR_UPLOAD_DIR'], job.id)
+        files[0].save(path)
+        db.session.add(job)
+        db.session.commit()
+
+        try:
+            psef.tasks.import_blackboard_zip(
+                job.id, job.id, files[0].filename
+            )
+        except Exception:  # pylint: disable=broad-except
+            job.state = models.JobState.crashed
+            job.error = 'Something unexpected went wrong.'
+            db.session.commit()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            raise
+        return jsonify(job, status_code=202)
+
     try:
         submissions = psef.files.process_blackboard_zip(files[0])
     except Exception:  # pylint: disable=broad-except
@@ -1082,99 +1206,20 @@ def post_submissions(assignment_id: int) -> EmptyResponse:
 
     if not submissions:
         raise APIException(
-            "The blackboard zip could not imported or it was empty.",
+            "The blackboard zip could not be imported or it was empty.",
             'The blackboard zip could not'
             ' be parsed or it did not contain any valid submissions.',
             APICodes.INVALID_PARAM, 400
         )
 
-    missing, recalc_missing = assignment.get_divided_amount_missing()
-    sub_lookup = {}
-    for sub in assignment.get_all_latest_submissions():
-        sub_lookup[sub.user_id] = sub
-
-    student_course_role = models.CourseRole.query.filter_by(
-        name='Student', course_id=assignment.course_id
-    ).first()
-    global_role = models.Role.query.filter_by(name='Student').first()
-
-    subs = []
-    hists = []
-
-    found_users = {
-        u.username: u
-        for u in models.User.query.filter(
-            t.cast(
-                models.DbColumn[str],
-                models.User.username,
-            ).in_([si.student_id for si, _ in submissions])
-        ).options(joinedload(models.User.courses))
-    }
-
-    newly_assigned: t.Set[t.Optional[int]] = set()
-
-    for submission_info, submission_tree in submissions:
-        user = found_users.get(submission_info.student_id, None)
-
-        if user is None:
-            # TODO: Check if this role still exists
-            user = models.User(
-                name=submission_info.student_name,
-                username=submission_info.student_id,
-                courses={assignment.course_id: student_course_role},
-                email='',
-                password=None,
-                role=global_role,
-            )
-            found_users[user.username] = user
-            # We don't need to track the users to insert as we are already
-            # tracking the submissions of them and they are coupled.
-        else:
-            user.courses[assignment.course_id] = student_course_role
-
-        work = models.Work(
-            assignment=assignment,
-            user=user,
-            created_at=submission_info.created_at,
-        )
-        subs.append(work)
-
-        if user.id is not None and user.id in sub_lookup:
-            work.assigned_to = sub_lookup[user.id].assigned_to
-
-        if work.assigned_to is None:
-            if missing:
-                work.assigned_to = max(
-                    missing.keys(), key=lambda k: missing[k]
-                )
-                missing = recalc_missing(work.assigned_to)
-                sub_lookup[user.id] = work
+    works = assignment.add_blackboard_submissions(submissions, current_user)
+    db.session.commit()
 
-        hists.append(
-            work.set_grade(
-                submission_info.grade, current_user, add_to_session=False
-            )
+    if assignment.should_passback:
+        work_ids = [work.id for work in works]
+        helpers.callback_after_this_request(
+            lambda: psef.tasks.passback_grades(work_ids)
         )
-        work.add_file_tree(db.session, submission_tree)
-        if work.assigned_to is not None:
-            newly_assigned.add(work.assigned_to)
-
-    assignment.set_graders_to_not_done(
-        list(newly_assigned),
-        send_mail=True,
-        ignore_errors=True,
-    )
-
-    db.session.bulk_save_objects(subs)
-    db.session.flush()
-
-    # TODO: This loop should be eliminated.
-    for hist in hists:
-        hist.work_id = hist.work.id
-        hist.user_id = hist.user.id
-
-    db.session.bulk_save_objects(hists)
-    db.session.commit()
 
     return make_empty_response()
 
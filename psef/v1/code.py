@@ -5,12 +5,11 @@ APIs are used to manipulate student submitted code and the related feedback.
 :license: AGPLv3, see LICENSE for details.
 """
 
-import shutil
 import typing as t
 
 import werkzeug
 import sqlalchemy.sql as sql
-from flask import request, make_response
+from flask import request
 from sqlalchemy.orm import make_transient
 
 import psef.auth as auth
@@ -132,10 +131,15 @@ def get_code(file_id: int) -> t.Union[werkzeug.wrappers.Response, JSONResponse[
       returned.
     - If ``type == 'file-url'`` or ``type == 'pdf'`` (deprecated) an object
       with a single key, `name`, with as value the return values of
-      :py:func:`.get_file_url`.
+      :py:func:`.get_file_url`. This name can be used to download the file
+      with :http:get:`/api/v1/files/<file_name>`.
     - If ``type == 'feedback'`` or ``type == 'linter-feedback'`` see
       :py:func:`.code.get_feedback`
-    - Otherwise the content of the file is returned as plain text.
+    - Otherwise the content of the file is returned as plain text. This
+      response has a strong etag, so if the ``If-None-Match`` header contains
+      this etag a ``304 Not Modified`` response is returned without reading
+      the file. Range requests are supported, see
+      :py:func:`psef.files.send_blob`.
 
     :param int file_id: The id of the file
     :returns: A response containing a plain text file unless specified
@@ -162,24 +166,22 @@ def get_code(file_id: int) -> t.Union[werkzeug.wrappers.Response, JSONResponse[
     elif get_type == 'linter-feedback':
         return jsonify(get_feedback(file, linter=True))
     else:
-        contents = psef.files.get_file_contents(file)
-        res: 'werkzeug.wrappers.Response' = make_response(contents)
-        res.headers['Content-Type'] = 'application/octet-stream'
-        return res
+        psef.files.ensure_can_send_file(file)
+        return psef.files.send_blob(t.cast(str, file.filename))
 
 
 def get_file_url(file: models.File) -> str:
-    """Copies the given file to the mirror uploads folder and returns its name.
+    """Get a name that can be used to download the given file without logging
+    in.
 
-    To get this file, see the :func:`psef.v1.files.get_file` function.
+    To get this file, see the :func:`psef.v1.files.get_file` function. The
+    name is a short lived signed token, see
+    :py:func:`psef.files.get_file_url_token`.
 
     :param file: The file object
-    :returns: The name of the newly created file (the copy).
+    :returns: The name that can be used to download the file.
     """
-    path, name = psef.files.random_file_path('MIRROR_UPLOAD_DIR')
-    shutil.copyfile(file.get_diskname(), path)
-
-    return name
+    return psef.files.get_file_url_token(file)
 
 
 def get_feedback(file: models.File, linter: bool = False) -> _FeedbackMapping:
@@ -291,8 +293,8 @@ def delete_code(file_id: int) -> EmptyResponse:
                 APICodes.INVALID_STATE,
                 400,
             )
-        code.delete_from_disk()
         db.session.delete(code)
+        psef.files.delete_unreferenced_blobs([code.filename])
     elif code.fileowner == models.FileOwner.both:
         code.fileowner = other
 
@@ -311,8 +313,8 @@ def split_code(
     The old object in the database will be given a ``fileowner`` of
     ``old_owner`` and the newly created object will be given ``new_owner``. If
     ``code`` is a directory this directory is splitted (see
-    :py:func:`redistribute_directory`), if it is a file the original content of
-    the file is only copied if ``copy`` is ``True``.
+    :py:func:`redistribute_directory`), if it is a file the new file shares the
+    blob of the original file.
 
     :param code: The file to split.
     :param new_owner: The new ``fileowner`` of the new file.
@@ -321,7 +323,6 @@ def split_code(
     """
     code.fileowner = old_owner
     old_id = code.id
-    old_diskname = None if code.is_directory else code.get_diskname()
     db.session.flush()
     code = db.session.query(models.File).get(code.id)
 
@@ -332,10 +333,7 @@ def split_code(
     db.session.flush()
 
     code.fileowner = new_owner
-    if not code.is_directory:
-        _, code.filename = psef.files.random_file_path()
-        shutil.copyfile(old_diskname, code.get_diskname())
-    else:
+    if code.is_directory:
         redistribute_directory(code, models.File.query.get(old_id))
 
     return code
@@ -400,6 +398,9 @@ def update_code(file_id: int) -> JSONResponse[models.File]:
       the new content of the file. This operation is used if no or no valid
       operation was given.
 
+    If the content of the file changed, the linters that already ran on the
+    submission are run again for this file.
+
     .. note::
 
       The id of the returned code object can change, but does not have to.
@@ -436,11 +437,12 @@ def update_code(file_id: int) -> JSONResponse[models.File]:
     ) -> None:
         if request.args.get('operation', None) == 'rename':
             code.rename_code(new_name, new_parent, other)
-            db.session.flush()
-            code.parent = new_parent
         else:
-            with open(code.get_diskname(), 'wb') as f:
-                f.write(request.get_data())
+            # Blobs can be shared between files, so never write to the old
+            # blob but store the new contents as a new blob.
+            old_filename = code.filename
+            code.filename = psef.files.store_blob(request.stream)
+            psef.files.delete_unreferenced_blobs([old_filename])
 
     if code.work.assignment.is_open and current_user.id == code.work.user_id:
         current, other = models.FileOwner.both, models.FileOwner.teacher
@@ -473,4 +475,7 @@ def update_code(file_id: int) -> JSONResponse[models.File]:
 
     db.session.commit()
 
+    if request.args.get('operation', None) != 'rename':
+        code.work.relint_files([code.id])
+
     return jsonify(code)
@@ -336,6 +336,11 @@ def get_all_course_users(course_id: int
 
     .. :quickref: Course; Get all users for a single course.
 
+    :qparam int limit: Paginate the users by passing the maximum amount of
+        users in a page, see :class:`.helpers.KeysetPagination`. A paginated
+        list is sorted case insensitively by name.
+    :qparam str cursor: The cursor of the page to retrieve.
+
     :param int course_id: The id of the course
     :returns: A response containing the JSON serialized users and course roles
 
@@ -349,26 +354,40 @@ def get_all_course_users(course_id: int
     :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
     :raises PermissionException: If the user can not manage the course with the
                                  given id. (INCORRECT_PERMISSION)
+    :raises APIException: If the given limit or cursor is not valid.
+                          (INVALID_PARAM)
     """
     auth.ensure_permission('can_edit_course_users', course_id)
 
-    users: t.Sequence[sqlalchemy.util.KeyedTuple]
-    users = db.session.query(models.User, models.CourseRole).join(
+    page = helpers.KeysetPagination.from_request()
+    lower_name = sqlalchemy.func.lower(models.User.name)
+
+    query = db.session.query(models.User, models.CourseRole).join(
         models.user_course,
         models.user_course.c.user_id == models.User.id,
     ).join(
         models.CourseRole,
         models.CourseRole.id == models.user_course.c.course_id
-    ).filter(models.CourseRole.course_id == course_id).all()
+    ).filter(models.CourseRole.course_id == course_id)
+
+    users: t.Sequence[sqlalchemy.util.KeyedTuple]
+    if page is None:
+        users = query.all()
+    else:
+        users = page.get_page(
+            page.paginate(
+                query.add_columns(lower_name),
+                [(lower_name, False), (models.User.id, False)],
+            ),
+            lambda row: (row[2], row[0].id),
+        )
 
     user_course: t.List[_UserCourse]
-    user_course = [
-        {
-            'User': user,
-            'CourseRole': crole
-        } for user, crole in users
-    ]
-    return jsonify(sorted(user_course, key=lambda item: item['User'].name))
+    user_course = [{'User': row[0], 'CourseRole': row[1]} for row in users]
+
+    if page is None:
+        return jsonify(sorted(user_course, key=lambda item: item['User'].name))
+    return page.jsonify(user_course)
 
 
 @api.route('/courses/<int:course_id>/assignments/', methods=['GET'])
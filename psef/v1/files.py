@@ -29,7 +29,8 @@ def post_file() -> JSONResponse[str]:
     .. :quickref: File; Safe a file temporarily on the server.
 
     .. note::
-        The posted data will be removed after 60 seconds.
+        The posted data will be removed after it is retrieved, or after
+        ``MIRROR_UPLOAD_MAX_AGE`` seconds if it is never retrieved.
 
     :returns: A response with the JSON serialized name of the file as content
               and return code 201.
@@ -66,7 +67,10 @@ def get_file(
     .. :quickref: File; Get an uploaded file directory.
 
     .. note::
-        Only files uploaded using :http:post:`/api/v1/files/` may be retrieved.
+        Only files uploaded using :http:post:`/api/v1/files/` may be retrieved,
+        these files are deleted after they are retrieved. Files can also be
+        retrieved using a token from :py:func:`psef.v1.code.get_file_url`,
+        these files are not deleted and range requests are supported.
 
     :param str file_name: The filename of the file to get.
     :returns: The requested file.
@@ -74,6 +78,17 @@ def get_file(
     :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
     """
     name = request.args.get('name', name)
+    mimetype = request.args.get('mime', None)
+    as_attachment = request.args.get('not_as_attachment', False)
+
+    blob = psef.files.load_file_url_token(file_name)
+    if blob is not None:
+        return psef.files.send_blob(
+            blob,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            attachment_filename=name,
+        )
 
     directory = app.config['MIRROR_UPLOAD_DIR']
     error = False
@@ -85,8 +100,6 @@ def get_file(
             os.unlink(filename)
 
     try:
-        mimetype = request.args.get('mime', None)
-        as_attachment = request.args.get('not_as_attachment', False)
         return send_from_directory(
             directory,
             file_name,
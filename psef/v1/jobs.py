@@ -0,0 +1,43 @@
+"""
+This module defines all API routes with the main directory "jobs". These APIs
+are used to retrieve the state of long running jobs.
+
+:license: AGPLv3, see LICENSE for details.
+"""
+
+import psef.auth as auth
+import psef.models as models
+import psef.helpers as helpers
+from psef import current_user
+from psef.errors import APICodes
+from psef.helpers import JSONResponse, jsonify
+
+from . import api
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@auth.login_required
+def get_job(job_id: str) -> JSONResponse[models.Job]:
+    """Get the state of the :class:`.models.Job` with the given id.
+
+    .. :quickref: Job; Get the state and progress of a job.
+
+    :param str job_id: The id of the job.
+    :returns: A response containing the JSON serialized job.
+
+    :raises APIException: If the job with the given id does not exist.
+                          (OBJECT_ID_NOT_FOUND)
+    :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
+    :raises PermissionException: If the job was not started by the current
+                                 user. (INCORRECT_PERMISSION)
+    """
+    job = helpers.get_or_404(models.Job, job_id)
+
+    if job.user_id != current_user.id:
+        raise auth.PermissionException(
+            'You cannot view this job',
+            f'The job "{job_id}" was not started by you',
+            APICodes.INCORRECT_PERMISSION, 403
+        )
+
+    return jsonify(job)
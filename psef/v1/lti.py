@@ -14,6 +14,8 @@ import traceback
 import jwt
 import flask
 
+import psef
+import psef.auth as auth
 import psef.errors as errors
 import psef.models as models
 import psef.helpers as helpers
@@ -107,3 +109,74 @@ def second_phase_lti_launch(
         result['updated_email'] = updated_email
 
     return helpers.jsonify(result)
+
+
+@api.route('/lti/passbacks/failed/', methods=['GET'])
+@helpers.feature_required('LTI')
+@auth.permission_required('can_manage_lti_passbacks')
+def get_failed_passbacks(
+) -> helpers.JSONResponse[t.Sequence[models.FailedPassback]]:
+    """Get all LTI grade passbacks that failed too often to be retried
+    automatically.
+
+    .. :quickref: LTI; Get all failed grade passbacks.
+
+    :returns: A list of failed passbacks as described in
+        :py:meth:`.models.FailedPassback.__to_json__`, the most recent failure
+        first.
+
+    :raises PermissionException: If the current user does not have the
+        ``can_manage_lti_passbacks`` permission. (INCORRECT_PERMISSION)
+    """
+    return helpers.jsonify(
+        models.FailedPassback.query.order_by(
+            models.FailedPassback.failed_at.desc(),  # type: ignore
+        ).all()
+    )
+
+
+@api.route('/lti/passbacks/failed/', methods=['POST'])
+@helpers.feature_required('LTI')
+@auth.permission_required('can_manage_lti_passbacks')
+def retry_failed_passbacks() -> helpers.EmptyResponse:
+    """Retry LTI grade passbacks that failed too often to be retried
+    automatically.
+
+    .. :quickref: LTI; Retry failed grade passbacks.
+
+    :<json list work_ids: The ids of the works of which the failed passbacks
+        should be retried. All failed passbacks are retried if this is not
+        given. (OPTIONAL)
+
+    :returns: An empty response with return code 204.
+
+    :raises APIException: If ``work_ids`` is not a list of integers.
+        (MISSING_REQUIRED_PARAM, INVALID_PARAM)
+    :raises PermissionException: If the current user does not have the
+        ``can_manage_lti_passbacks`` permission. (INCORRECT_PERMISSION)
+    """
+    content = helpers.ensure_json_dict(flask.request.get_json())
+    failed = db.session.query(
+        models.FailedPassback.work_id,  # type: ignore
+    )
+
+    if 'work_ids' in content:
+        helpers.ensure_keys_in_dict(content, [('work_ids', list)])
+        work_ids = t.cast(list, content['work_ids'])
+        if not all(isinstance(work_id, int) for work_id in work_ids):
+            raise errors.APIException(
+                'All work ids should be integers',
+                f'The given work ids "{work_ids}" are not all integers',
+                errors.APICodes.INVALID_PARAM,
+                400,
+            )
+        failed = failed.filter(
+            models.FailedPassback.work_id.in_(work_ids),  # type: ignore
+        )
+
+    models.PassbackQueueItem.enqueue(work_id for work_id, in failed)
+    db.session.commit()
+
+    helpers.callback_after_this_request(psef.tasks.process_passback_queue)
+
+    return helpers.make_empty_response()
@@ -6,14 +6,14 @@ functions are defined to get related objects and information.
 :license: AGPLv3, see LICENSE for details.
 """
 
-import os
 import typing as t
+import hashlib
 import numbers
-import zipfile
-import tempfile
 from collections import defaultdict
 
-from flask import request
+import werkzeug
+from flask import Response, request, stream_with_context
+from werkzeug.urls import url_quote
 from mypy_extensions import TypedDict
 
 import psef.auth as auth
@@ -48,14 +48,16 @@ Feedback = TypedDict(  # pylint: disable=invalid-name
 @auth.login_required
 def get_submission(
     submission_id: int
-) -> ExtendedJSONResponse[t.Union[models.Work, t.Mapping[str, str]]]:
+) -> t.Union[werkzeug.wrappers.Response,
+             ExtendedJSONResponse[t.Union[models.Work, t.Mapping[str, str]]]]:
     """Get the given submission (:class:`.models.Work`).
 
     .. :quickref: Submission; Get a single submission.
 
     This API has some options based on the 'type' argument in the request
 
-    - If ``type == 'zip'`` see :py:func:`.get_zip`
+    - If ``type == 'zip'`` see :py:func:`.get_zip`, or
+      :py:func:`.stream_zip` if ``stream == 'true'``.
     - If ``type == 'feedback'`` see :py:func:`.submissions.get_feedback`
 
     :param int submission_id: The id of the submission
@@ -66,6 +68,8 @@ def get_submission(
     :query str owner: The type of files to list, if set to `teacher` only
         teacher files will be listed, otherwise only student files will be
         listed.
+    :query str stream: If ``true`` and ``type == 'zip'`` the zip archive is
+        streamed directly as the response.
 
     :raises APIException: If the submission with given id does not exist.
                           (OBJECT_ID_NOT_FOUND)
@@ -87,6 +91,8 @@ def get_submission(
             request.args.get('owner'),
             work.assignment.course_id,
         )
+        if request.args.get('stream') == 'true':
+            return stream_zip(work, exclude_owner)
         return extended_jsonify(get_zip(work, exclude_owner))
     elif request.args.get('type') == 'feedback':
         auth.ensure_can_see_grade(work)
@@ -128,6 +134,23 @@ def get_feedback(work: models.Work) -> t.Mapping[str, str]:
     return {'name': name, 'output_name': filename}
 
 
+def _get_zip_members(work: models.Work, exclude_owner: FileOwner
+                     ) -> t.Sequence[psef.files.ZipMember]:
+    auth.ensure_can_view_files(work, exclude_owner == FileOwner.student)
+
+    code = helpers.filter_single_or_404(
+        models.File,
+        models.File.work_id == work.id,
+        t.cast(DbColumn[int], models.File.parent_id).is_(None),
+    )
+
+    return psef.files.get_zip_members(code, exclude_owner)
+
+
+def _get_zip_name(work: models.Work) -> str:
+    return f'{work.assignment.name}-{work.user.name}-archive.zip'
+
+
 def get_zip(work: models.Work,
             exclude_owner: FileOwner) -> t.Mapping[str, str]:
     """Return a :class:`.models.Work` as a zip file.
@@ -145,42 +168,50 @@ def get_zip(work: models.Work,
                                  user and the user can not view files in the
                                  attached course. (INCORRECT_PERMISSION)
     """
-    auth.ensure_can_view_files(work, exclude_owner == FileOwner.student)
-
-    code = helpers.filter_single_or_404(
-        models.File,
-        models.File.work_id == work.id,
-        t.cast(DbColumn[int], models.File.parent_id).is_(None),
-    )
+    members = _get_zip_members(work, exclude_owner)
 
     path, name = psef.files.random_file_path('MIRROR_UPLOAD_DIR')
 
-    with open(
-        path,
-        'w+b',
-    ) as f, tempfile.TemporaryDirectory(
-        suffix='dir',
-    ) as tmpdir, zipfile.ZipFile(
-        f,
-        'w',
-        compression=zipfile.ZIP_DEFLATED,
-    ) as zipf:
-        # Restore the files to tmpdir
-        psef.files.restore_directory_structure(code, tmpdir, exclude_owner)
-
-        zipf.write(tmpdir, code.name)
-
-        for root, _dirs, files in os.walk(tmpdir):
-            for file in files:
-                path = os.path.join(root, file)
-                zipf.write(path, path[len(tmpdir):])
+    with open(path, 'wb') as f:
+        for chunk in psef.files.stream_zip(members):
+            f.write(chunk)
 
     return {
         'name': name,
-        'output_name': f'{work.assignment.name}-{work.user.name}-archive.zip'
+        'output_name': _get_zip_name(work),
     }
 
 
+def stream_zip(
+    work: models.Work, exclude_owner: FileOwner
+) -> werkzeug.wrappers.Response:
+    """Stream a :class:`.models.Work` as a zip file.
+
+    The archive is created while it is sent, so the response is sent with
+    chunked transfer encoding.
+
+    :param work: The submission which should be returns as zip file.
+    :param exclude_owner: The owner to exclude from the files in the zip, see
+        :py:func:`.get_zip`.
+    :returns: A response with the zip archive as content.
+
+    :raises PermissionException: If there is no logged in user. (NOT_LOGGED_IN)
+    :raises PermissionException: If submission does not belong to the current
+                                 user and the user can not view files in the
+                                 attached course. (INCORRECT_PERMISSION)
+    """
+    members = _get_zip_members(work, exclude_owner)
+
+    res = Response(
+        stream_with_context(psef.files.stream_zip(members)),
+        mimetype='application/zip',
+    )
+    res.headers['Content-Disposition'] = (
+        f"attachment; filename*=UTF-8''{url_quote(_get_zip_name(work))}"
+    )
+    return res
+
+
 @api.route('/submissions/<int:submission_id>', methods=['DELETE'])
 def delete_submission(submission_id: int) -> EmptyResponse:
     """Delete a submission and all its files.
@@ -200,15 +231,13 @@ def delete_submission(submission_id: int) -> EmptyResponse:
         'can_delete_submission', submission.assignment.course_id
     )
 
-    for sub_file in db.session.query(models.File).filter_by(
-        work_id=submission_id, is_directory=False
-    ).all():
-        try:
-            sub_file.delete_from_disk()
-        except FileNotFoundError:  # pragma: no cover
-            pass
+    filenames = [
+        filename for filename, in db.session.query(models.File.filename)
+        .filter_by(work_id=submission_id, is_directory=False)
+    ]
 
     db.session.delete(submission)
+    psef.files.delete_unreferenced_blobs(filenames)
     db.session.commit()
 
     return make_empty_response()
@@ -544,14 +573,13 @@ def get_grade_history(submission_id: int
 
     auth.ensure_permission('can_see_grade_history', work.assignment.course_id)
 
-    hist: t.MutableSequence[models.GradeHistory]
     hist = db.session.query(
         models.GradeHistory
     ).filter_by(work_id=work.id).order_by(
         models.GradeHistory.changed_at.desc(),  # type: ignore
-    ).all()
+    ).yield_per(app.config['STREAM_BATCH_SIZE'])
 
-    return jsonify(hist)
+    return helpers.stream_jsonify(hist)
 
 
 @api.route("/submissions/<int:submission_id>/files/", methods=['POST'])
@@ -560,6 +588,9 @@ def create_new_file(submission_id: int) -> JSONResponse[t.Mapping[str, t.Any]]:
 
     .. :quickref: Submission; Create a new file or directory for a submission.
 
+    If a regular file is created the linters that already ran on the
+    submission are run on the new file.
+
     :param str path: The path of the new file to create. If the path ends in
         a forward slash a new directory is created and the body of the request
         is ignored, otherwise a regular file is created.
@@ -605,23 +636,23 @@ def create_new_file(submission_id: int) -> JSONResponse[t.Mapping[str, t.Any]]:
         models.File,
         models.File.work_id == submission_id,
         models.File.fileowner != exclude_owner,
-        models.File.name == patharr[0],
+        models.File.path == patharr[0],
         t.cast(DbColumn[int], models.File.parent_id).is_(None),
     )
 
-    code = None
-    end_idx = 0
-    for idx, part in enumerate(patharr[1:]):
-        code = models.File.query.filter(
+    paths = ['/'.join(patharr[:idx + 1]) for idx in range(len(patharr))]
+    existing = {
+        f.path: f
+        for f in models.File.query.filter(
+            models.File.work_id == submission_id,
             models.File.fileowner != exclude_owner,
-            models.File.name == part,
-            models.File.parent == parent,
-        ).first()
-        end_idx = idx + 1
-        if code is None:
-            break
-        parent = code
-    else:
+            t.cast(DbColumn[str], models.File.path).in_(paths[1:]),
+        )
+    }
+
+    end_idx = 1
+    while end_idx < len(patharr) and paths[end_idx] in existing:
+        parent = existing[paths[end_idx]]
         end_idx += 1
 
     def _is_last(idx: int) -> bool:
@@ -638,9 +669,7 @@ def create_new_file(submission_id: int) -> JSONResponse[t.Mapping[str, t.Any]]:
     for idx, part in enumerate(patharr[end_idx:]):
         if _is_last(idx) and not create_dir:
             is_dir = False
-            d_filename, filename = psef.files.random_file_path()
-            with open(d_filename, 'w') as f:
-                f.write(request.get_data(as_text=True))
+            filename = psef.files.store_blob(request.stream)
         else:
             is_dir, filename = True, None
         code = models.File(
@@ -655,6 +684,9 @@ def create_new_file(submission_id: int) -> JSONResponse[t.Mapping[str, t.Any]]:
         parent = code
     db.session.commit()
 
+    if not create_dir:
+        work.relint_files([code.id])
+
     return jsonify(psef.files.get_stat_information(code))
 
 
@@ -676,6 +708,8 @@ def get_dir_contents(submission_id: int
         content and return code 200. For the exact structure see
         :py:meth:`.File.list_contents`. If path is given the return value will
         be stat datastructure, see :py:func:`.files.get_stat_information`.
+        The directory structure has a strong etag, if the ``If-None-Match``
+        header contains this etag a ``304 Not Modified`` response is returned.
 
     :query int file_id: The file id of the directory to get. If this is not
         given the parent directory for the specified submission is used.
@@ -733,4 +767,6 @@ def get_dir_contents(submission_id: int
             APICodes.OBJECT_WRONG_TYPE, 400
         )
 
-    return jsonify(file.list_contents(exclude_owner))
+    res = jsonify(file.list_contents(exclude_owner))
+    etag = hashlib.sha256(res.get_data()).hexdigest()
+    return helpers.make_conditional(res, etag)
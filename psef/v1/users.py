@@ -12,7 +12,7 @@ import flask_jwt_extended as flask_jwt
 from flask import request, current_app
 from validate_email import validate_email
 from flask_limiter.util import get_remote_address
-from sqlalchemy.sql.expression import or_
+from sqlalchemy.sql.expression import or_, func
 
 import psef.auth as auth
 import psef.models as models
@@ -37,12 +37,18 @@ def search_users() -> JSONResponse[t.Sequence[models.User]]:
 
     :param str q: The string to search for, all SQL wildcard are escaped and
         spaces are replaced by wildcards.
+    :qparam int limit: Paginate the users by passing the maximum amount of
+        users in a page, see :class:`.helpers.KeysetPagination`. A paginated
+        list is sorted case insensitively by name.
+    :qparam str cursor: The cursor of the page to retrieve.
 
     :returns: A list of :py:class:`.models.User` objects that match the given
         query string.
 
     :raises APIException: If the query string less than 3 characters
         long. (INVALID_PARAM)
+    :raises APIException: If the given limit or cursor is not valid.
+        (INVALID_PARAM)
     :raises PermissionException: If the currently logged in user does not have
         the permission ``can_search_users``. (INCORRECT_PERMISSION)
     :raises RateLimitExceeded: If you hit this end point more than once per
@@ -65,7 +71,20 @@ def search_users() -> JSONResponse[t.Sequence[models.User]]:
             )
         ) for col in [models.User.name, models.User.username]
     ]
-    return jsonify(models.User.query.filter(or_(*likes)).all())
+
+    page = helpers.KeysetPagination.from_request()
+    if page is None:
+        return jsonify(models.User.query.filter(or_(*likes)).all())
+
+    lower_name = func.lower(models.User.name)
+    rows = page.get_page(
+        page.paginate(
+            db.session.query(models.User, lower_name).filter(or_(*likes)),
+            [(lower_name, False), (models.User.id, False)],
+        ),
+        lambda row: (row[1], row[0].id),
+    )
+    return page.jsonify([user for user, _ in rows])
 
 
 @api.route('/user', methods=['POST'])
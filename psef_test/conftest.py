@@ -7,6 +7,7 @@ import datetime
 import contextlib
 
 import pytest
+import sqlalchemy
 import flask_migrate
 import flask_jwt_extended as flask_jwt
 from flask import _app_ctx_stack as ctx_stack
@@ -20,6 +21,9 @@ import psef.models as m
 TESTDB = 'test_project.db'
 TESTDB_PATH = "/tmp/psef/psef-{}-{}".format(TESTDB, random.random())
 TEST_DATABASE_URI = 'sqlite:///' + TESTDB_PATH
+# Blobs are shared between files with the same content, so every test session
+# (and so every database) needs its own upload directory.
+TEST_UPLOAD_DIR = "/tmp/psef/uploads/{}".format(random.random())
 
 
 def pytest_addoption(parser):
@@ -37,7 +41,7 @@ def app(request):
     settings_override = {
         'TESTING': True,
         'DEBUG': True,
-        'UPLOAD_DIR': f'/tmp/psef/uploads',
+        'UPLOAD_DIR': TEST_UPLOAD_DIR,
         'RATELIMIT_STRATEGY': 'moving-window',
         'RATELIMIT_HEADERS_ENABLED': True,
         'CELERY_CONFIG':
@@ -65,6 +69,7 @@ def app(request):
         'CELERY_TASK_EAGER_PROPAGATES': True,
     }
 
+    os.makedirs(TEST_UPLOAD_DIR, exist_ok=True)
     app = psef.create_app(settings_override, skip_celery=True)
 
     psef.tasks.celery.conf.update(
@@ -305,6 +310,28 @@ def session(app, db):
     db.session.begin(subtransactions=True)
 
 
+@pytest.fixture
+def count_queries(db):
+    @contextlib.contextmanager
+    def _count():
+        statements = []
+
+        def __before_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(
+            db.engine, 'before_cursor_execute', __before_execute
+        )
+        try:
+            yield statements
+        finally:
+            sqlalchemy.event.remove(
+                db.engine, 'before_cursor_execute', __before_execute
+            )
+
+    yield _count
+
+
 @pytest.fixture
 def monkeypatch_celery(app, monkeypatch):
     psef.tasks.celery.conf.task_always_eager = True
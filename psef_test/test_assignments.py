@@ -5,11 +5,15 @@ import copy
 import json
 import uuid
 import random
+import zipfile
 import datetime
+import multiprocessing
 from functools import reduce
 from collections import defaultdict
 
+import flask
 import pytest
+from werkzeug.local import LocalProxy
 
 import psef
 import psef.models as m
@@ -1552,6 +1556,104 @@ def test_get_all_submissions(
         )
 
 
+@pytest.mark.parametrize('with_works', [True])
+@pytest.mark.parametrize('assignment', ['new', 'old'], indirect=True)
+@pytest.mark.parametrize('extended', [True, False])
+def test_get_works_json(
+    assignment, teacher_user, student_user, monkeypatch, session, extended
+):
+    row = m.RubricRow(assignment=assignment, header='row')
+    items = [
+        m.RubricItem(rubricrow=row, header=str(p), points=p)
+        for p in [0, 2, 4]
+    ]
+    session.add(row)
+    session.add_all(items)
+
+    works = sorted(
+        m.Work.query.filter_by(assignment_id=assignment.id),
+        key=lambda w: w.id
+    )
+    works[0]._grade = 6.5
+    works[1].selected_items = items[1:]
+    works[2].selected_items = [items[0]]
+    works[3].assigned_to = teacher_user.id
+    works[3].comment = 'Feedback'
+    session.commit()
+
+    orig_has_permission = m.User.has_permission
+    streaming = False
+
+    def has_permission(self, *args, **kwargs):
+        # The permissions should be checked before any work is produced.
+        assert not streaming
+        return orig_has_permission(self, *args, **kwargs)
+
+    for user in [teacher_user, student_user]:
+        user = m.User.query.get(user.id)
+        monkeypatch.setattr(psef, 'current_user', LocalProxy(lambda: user))
+
+        expected = [
+            json.loads(
+                flask.json.dumps(
+                    w.__extended_to_json__() if extended else w.__to_json__()
+                )
+            ) for w in m.Work.query.filter_by(assignment_id=assignment.id)
+        ]
+        monkeypatch.setattr(m.User, 'has_permission', has_permission)
+        works_json = assignment.get_works_json(user, extended=extended)
+        streaming = True
+        got = json.loads(flask.json.dumps(list(works_json)))
+        streaming = False
+        monkeypatch.setattr(m.User, 'has_permission', orig_has_permission)
+        if not user.has_permission(
+            'can_see_others_work', assignment.course_id
+        ):
+            expected = [e for e in expected if e['user']['id'] == user.id]
+
+        assert sorted(
+            got, key=lambda w: w['id']
+        ) == sorted(
+            expected, key=lambda w: w['id']
+        )
+        assert [w['created_at'] for w in got] == sorted(
+            (w['created_at'] for w in got), reverse=True
+        )
+
+
+@pytest.mark.parametrize('with_works', [True])
+def test_get_all_submissions_paginated(
+    assignment, teacher_user, logged_in, test_client
+):
+    base = f'/api/v1/assignments/{assignment.id}'
+    with logged_in(teacher_user):
+        for url, extra in [
+            (f'{base}/submissions/', {
+                'extended': 'true'
+            }),
+            (f'{base}/submissions/', {}),
+            (f'{base}/graders/', {}),
+        ]:
+            expected = [
+                i['id'] for i in test_client.req('get', url, 200, query=extra)
+            ]
+            got = []
+            query = {'limit': 3, **extra}
+            while True:
+                res, rv = test_client.req(
+                    'get', url, 200, query=query, include_response=True
+                )
+                assert len(res) <= 3
+                got.extend(i['id'] for i in res)
+                cursor = rv.headers.get('X-Next-Cursor')
+                if cursor is None:
+                    break
+                query = {'limit': 3, 'cursor': cursor, **extra}
+
+            assert sorted(got) == sorted(expected)
+            assert len(got) == len(set(got))
+
+
 # yapf: disable
 @pytest.mark.parametrize(
     'named_user', ['Robin',
@@ -1670,10 +1772,16 @@ def test_get_all_submissions(
     ]
 )
 # yapf: enable
+@pytest.mark.parametrize('import_workers', [1, 2])
 def test_upload_blackboard_zip(
     test_client, logged_in, named_user, assignment, filename, result,
-    error_template, request, teacher_user, session, stubmailer
+    error_template, request, teacher_user, session, stubmailer, app,
+    monkeypatch, import_workers
 ):
+    monkeypatch.setitem(
+        app.config, 'BLACKBOARD_IMPORT_WORKERS', import_workers
+    )
+    result = copy.deepcopy(result)
     course_id = assignment.course_id
 
     def get_student_users():
@@ -1776,6 +1884,48 @@ def test_upload_blackboard_zip(
     ).all(), 'Nobody should be done'
 
 
+def test_upload_blackboard_zip_background(
+    test_client, logged_in, teacher_user, assignment, error_template,
+    monkeypatch_celery, app, monkeypatch
+):
+    # Celery workers are daemonic processes, so starting a pool of processes
+    # in the import job would fail.
+    monkeypatch.setitem(app.config, 'BLACKBOARD_IMPORT_WORKERS', 2)
+    monkeypatch.setitem(
+        multiprocessing.current_process()._config, 'daemon', True
+    )
+    url = f'/api/v1/assignments/{assignment.id}/submissions/'
+    data_dir = f'{os.path.dirname(__file__)}/../test_data/test_blackboard'
+
+    with logged_in(teacher_user):
+        job = test_client.req(
+            'post',
+            f'{url}?background=true',
+            202,
+            real_data={'file': (f'{data_dir}/correct.tar.gz', 'bb.tar.gz')},
+            result={
+                'id': str,
+                'kind': 'blackboard_import',
+                'state': 'done',
+                'created_at': str,
+                'progress': {
+                    'parsed': 3,
+                    'total': 3,
+                    'files': 6,
+                    'rows': 15,
+                },
+                'result': None,
+                'error': None,
+            }
+        )
+        test_client.req('get', f'/api/v1/jobs/{job["id"]}', 200, result=job)
+
+        res = test_client.req('get', url, 200)
+        assert {'Student1', 'Student2', 'New User'}.issubset(
+            set(item['user']['name'] for item in res)
+        )
+
+
 @pytest.mark.parametrize('with_works', [False], indirect=True)
 def test_assigning_after_uploading(
     test_client, logged_in, assignment, error_template, teacher_user
@@ -3202,3 +3352,68 @@ def test_notification_permission(
             },
             result=error_template,
         )
+
+
+@pytest.mark.parametrize(
+    'filename', ['../test_submissions/multiple_dir_archive.zip'],
+    indirect=True
+)
+@pytest.mark.parametrize('batch_size', [2, 100])
+def test_export_submissions(
+    test_client, logged_in, assignment_real_works, teacher_user, student_user,
+    error_template, monkeypatch_celery, session, app, monkeypatch, batch_size
+):
+    monkeypatch.setitem(app.config, 'STREAM_BATCH_SIZE', batch_size)
+    assignment, _ = assignment_real_works
+    url = f'/api/v1/assignments/{assignment.id}/submissions/export'
+
+    with logged_in(student_user):
+        test_client.req('post', url, 403, result=error_template)
+
+    with logged_in(teacher_user):
+        job = test_client.req(
+            'post',
+            url,
+            201,
+            result={
+                'id': str,
+                'kind': 'assignment_export',
+                'state': 'done',
+                'created_at': str,
+                'progress': {
+                    'done': 3,
+                    'total': 3
+                },
+                'result':
+                    {
+                        'name': str,
+                        'output_name': f'{assignment.name}-submissions.zip',
+                    },
+                'error': None,
+            }
+        )
+        test_client.req('get', f'/api/v1/jobs/{job["id"]}', 200, result=job)
+
+        res = test_client.get(f'/api/v1/files/{job["result"]["name"]}')
+        assert res.status_code == 200
+        zfile = zipfile.ZipFile(io.BytesIO(res.get_data()))
+        assert zfile.testzip() is None
+        files = set(f.filename for f in zfile.infolist())
+
+    expected = set()
+    for username in ['student1', 'student2', 'œlµo']:
+        expected.add(f'{username}/multiple_dir_archive/')
+        for path in [
+            'dir/single_file_work', 'dir/single_file_work_copy',
+            'dir2/single_file_work', 'dir2/single_file_work_copy'
+        ]:
+            expected.add(f'{username}/multiple_dir_archive/{path}')
+    assert files == expected
+
+    with logged_in(student_user):
+        test_client.req(
+            'get', f'/api/v1/jobs/{job["id"]}', 403, result=error_template
+        )
+        test_client.req(
+            'get', f'/api/v1/jobs/{uuid.uuid4()}', 404, result=error_template
+        )
@@ -104,7 +104,7 @@ def test_get_code_metadata(
 )
 def test_get_code_plaintext(
     named_user, assignment_real_works, test_client, request, error_template,
-    ta_user, logged_in, content
+    ta_user, logged_in, content, app, monkeypatch
 ):
     assignment, work = assignment_real_works
     work_id = work['id']
@@ -139,7 +139,8 @@ def test_get_code_plaintext(
                 result=error_template,
             )
         else:
-            res = test_client.get(f'/api/v1/code/{res["entries"][0]["id"]}')
+            url = f'/api/v1/code/{res["entries"][0]["id"]}'
+            res = test_client.get(url)
             assert res.status_code == 200
             if content:
                 assert res.get_data(as_text=True) == content
@@ -148,6 +149,32 @@ def test_get_code_plaintext(
                     res.get_data(as_text=True)
                 res.get_data()
 
+            etag = res.headers['ETag']
+            res = test_client.get(url, headers={'If-None-Match': etag})
+            assert res.status_code == 304
+            assert res.get_data() == b''
+            assert res.headers['ETag'] == etag
+
+            res = test_client.get(url, headers={'If-None-Match': '"other"'})
+            assert res.status_code == 200
+            full = res.get_data()
+            assert full
+            assert res.headers['Accept-Ranges'] == 'bytes'
+
+            res = test_client.get(url, headers={'Range': 'bytes=1-2'})
+            assert res.status_code == 206
+            assert res.get_data() == full[1:3]
+            assert res.headers['Content-Range'] == f'bytes 1-2/{len(full)}'
+
+            monkeypatch.setitem(
+                app.config, 'X_ACCEL_REDIRECT_LOCATION', '/internal/'
+            )
+            res = test_client.get(url)
+            assert res.status_code == 200
+            assert res.get_data() == b''
+            blob = etag.strip('"')
+            assert res.headers['X-Accel-Redirect'] == f'/internal/{blob}'
+
 
 @pytest.mark.parametrize(
     'filename', ['../test_submissions/single_dir_archive.zip']
@@ -228,7 +255,7 @@ def test_get_code_plaintext_revisions(
 @pytest.mark.parametrize('query_type', ['pdf', 'file-url'])
 def test_get_file_url(
     named_user, assignment_real_works, test_client, request, error_template,
-    ta_user, logged_in, mimetype, query_type
+    ta_user, logged_in, mimetype, query_type, app, monkeypatch
 ):
     assignment, work = assignment_real_works
     work_id = work['id']
@@ -269,12 +296,26 @@ def test_get_file_url(
                 query={'type': query_type},
                 result={'name': str},
             )
+            name = res['name']
             res = test_client.get(
-                f'/api/v1/files/{res["name"]}',
-                query_string={'mime': mimetype}
+                f'/api/v1/files/{name}', query_string={'mime': mimetype}
             )
             assert res.status_code == 200
             assert res.headers['Content-Type'] == mimetype
+            content = res.get_data()
+
+            # The name can be used multiple times until it expires.
+            res = test_client.get(f'/api/v1/files/{name}')
+            assert res.status_code == 200
+            assert res.get_data() == content
+
+            monkeypatch.setitem(app.config, 'FILE_URL_TOKEN_MAX_AGE', -1)
+            test_client.req(
+                'get',
+                f'/api/v1/files/{name}',
+                404,
+                result=error_template,
+            )
 
 
 @pytest.mark.parametrize(
@@ -598,6 +639,8 @@ def test_update_code(
             data = str(uuid.uuid4())
         with logged_in(ta_user):
             old = get_code_data(code_id)
+            old_etag = test_client.get(f'/api/v1/code/{code_id}'
+                                       ).headers['ETag']
 
         res = test_client.req(
             'patch',
@@ -612,6 +655,11 @@ def test_update_code(
             return
 
         assert get_code_data(res['id']) == data
+        # A client with the old version of the file should get the new one.
+        r = test_client.get(
+            f'/api/v1/code/{res["id"]}', headers={'If-None-Match': old_etag}
+        )
+        assert r.status_code == 200
         return res['id']
 
     with logged_in(ta_user):
@@ -927,3 +975,25 @@ def test_rename_code(
         del ff
 
         assert len(files['entries'][0]['entries']) == 2
+
+    for f in m.File.query.filter_by(work_id=work_id):
+        if f.parent is None:
+            assert f.path == f.name
+        else:
+            assert f.path == f'{f.parent.path}/{f.name}'
+
+
+@pytest.mark.parametrize(
+    'filename', ['../test_submissions/multiple_dir_archive.zip'],
+    indirect=True
+)
+def test_file_path_from_parent_id(assignment_real_works, session):
+    _, work = assignment_real_works
+    parent = m.File.query.filter_by(
+        work_id=work['id'], is_directory=True, parent=None
+    ).one()
+
+    by_parent = m.File(name='a', is_directory=True, parent=parent)
+    by_parent_id = m.File(name='b', is_directory=True, parent_id=parent.id)
+    assert by_parent.path == f'{parent.path}/a'
+    assert by_parent_id.path == f'{parent.path}/b'
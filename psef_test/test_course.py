@@ -254,6 +254,54 @@ def test_get_course_users(
                 assert got['User']['name'] == expected
 
 
+def test_get_course_users_paginated(
+    teacher_user, logged_in, test_client, session, error_template
+):
+    course = session.query(m.Course).filter_by(name='Programmeertalen').one()
+    url = f'/api/v1/courses/{course.id}/users/'
+
+    with logged_in(teacher_user):
+        all_users = test_client.req('get', url, 200)
+        expected = sorted(
+            (u['User']['name'].lower(), u['User']['id']) for u in all_users
+        )
+
+        got = []
+        query = {'limit': 2}
+        while True:
+            res, rv = test_client.req(
+                'get', url, 200, query=query, include_response=True
+            )
+            assert 0 < len(res) <= 2
+            got.extend(
+                (u['User']['name'].lower(), u['User']['id']) for u in res
+            )
+            cursor = rv.headers.get('X-Next-Cursor')
+            if cursor is None:
+                break
+            query = {'limit': 2, 'cursor': cursor}
+
+        assert got == expected
+
+        for query in [
+            {
+                'limit': 0
+            },
+            {
+                'limit': 'a'
+            },
+            {
+                'cursor': 'not a cursor'
+            },
+            {
+                'cursor': 'WzFd'
+            },  # A cursor with too few values.
+        ]:
+            test_client.req(
+                'get', url, 400, query=query, result=error_template
+            )
+
+
 @pytest.mark.parametrize('course_n', ['Programmeertalen'])
 @pytest.mark.parametrize(
     'named_user', [
@@ -426,10 +426,13 @@ def test_get_all_feedback(
     ],
     indirect=True
 )
+@pytest.mark.parametrize('batch_size', [1, 100])
 def test_get_assignment_all_feedback(
     named_user, request, logged_in, test_client, assignment_real_works,
-    session, error_template, ta_user, monkeypatch_celery, teacher_user
+    session, error_template, ta_user, monkeypatch_celery, teacher_user, app,
+    monkeypatch, batch_size, count_queries
 ):
+    monkeypatch.setitem(app.config, 'STREAM_BATCH_SIZE', batch_size)
     assignment, work = assignment_real_works
     assig_id = assignment.id
     perm_err = request.node.get_marker('perm_error')
@@ -529,7 +532,7 @@ def test_get_assignment_all_feedback(
     assig.state = m._AssignmentStateEnum.done
     session.commit()
 
-    with logged_in(named_user):
+    with logged_in(named_user), count_queries() as statements:
         res = test_client.req(
             'get',
             f'/api/v1/assignments/{assig_id}/feedbacks/',
@@ -539,3 +542,13 @@ def test_get_assignment_all_feedback(
 
         if not perm_err:
             match_res(res)
+            # The general feedback of all submissions should be loaded by
+            # the query retrieving the submissions.
+            assert sum('Work_comment' in s for s in statements) == 1
+
+    works = m.Work.query.filter_by(assignment_id=assig_id).all()
+    feedback = m.Work.get_all_feedback_of_works([w.id for w in works])
+    assert len(feedback) == 3
+    for w in works:
+        user_feedback, linter_feedback = w.get_all_feedback()
+        assert feedback[w.id] == (list(user_feedback), list(linter_feedback))
@@ -1,5 +1,12 @@
+import os
+import time
+import datetime
+
 import pytest
 
+import psef.tasks
+import psef.models as m
+
 perm_error = pytest.mark.perm_error
 data_error = pytest.mark.data_error
 
@@ -53,3 +60,52 @@ def test_get_code_metadata(
 
                 res = test_client.get(f'/api/v1/files/{fname}')
                 assert res.status_code == 404
+
+
+def test_prune_mirror_uploads(app, monkeypatch, tmpdir):
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_DIR', str(tmpdir))
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_MAX_AGE', 60)
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_MAX_SIZE', 25)
+
+    now = time.time()
+    for name, age in [
+        ('expired', 120), ('old', 30), ('new', 10), ('newest', 0)
+    ]:
+        tmpdir.join(name).write('a' * 10)
+        os.utime(str(tmpdir.join(name)), (now - age, now - age))
+
+    psef.tasks._prune_mirror_uploads_1()
+    assert sorted(os.listdir(str(tmpdir))) == ['new', 'newest']
+
+    psef.tasks._prune_mirror_uploads_1()
+    assert sorted(os.listdir(str(tmpdir))) == ['new', 'newest']
+
+
+def test_prune_mirror_uploads_keeps_job_files(
+    app, session, monkeypatch, tmpdir, assignment, teacher_user
+):
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_DIR', str(tmpdir))
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_MAX_AGE', 60)
+    monkeypatch.setitem(app.config, 'MIRROR_UPLOAD_MAX_SIZE', 0)
+
+    running = m.Job('blackboard_import', teacher_user, assignment)
+    export = m.Job('assignment_export', teacher_user, assignment)
+    export.state = m.JobState.done
+    export.result = {'name': 'export', 'output_name': 'export.zip'}
+    # An export that was never downloaded should still expire.
+    old_export = m.Job('assignment_export', teacher_user, assignment)
+    old_export.state = m.JobState.done
+    old_export.result = {'name': 'old_export', 'output_name': 'export.zip'}
+    old_export.created_at = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=120
+    )
+    session.add_all([running, export, old_export])
+    session.commit()
+
+    now = time.time()
+    for name in [running.id, 'export', 'old_export', 'other']:
+        tmpdir.join(name).write('a' * 10)
+        os.utime(str(tmpdir.join(name)), (now - 120, now - 120))
+
+    psef.tasks._prune_mirror_uploads_1()
+    assert sorted(os.listdir(str(tmpdir))) == sorted([running.id, 'export'])
@@ -0,0 +1,107 @@
+import pytest
+
+from psef.ignore import InvalidFile, IgnoreFilterManager
+
+PATTERNS = [
+    '*.pyc',
+    '!keep.pyc',
+    '/build/',
+    'docs/**/*.md',
+    '**/node_modules',
+    'a/b/',
+    '!a/b/c',
+    '__pycache__/',
+    '!important.o',
+    '*.o',
+    'x?z',
+    '[ab]*.txt',
+    '[!c]x',
+    'deep/**',
+    '\\!bang',
+    '# A comment',
+    '',
+    'sub/*.py ',
+]
+
+PATHS = [
+    'keep.pyc',
+    'dir/keep.pyc',
+    'dir/other.pyc',
+    'build/',
+    'build/out.o',
+    'src/build/',
+    'docs/a/b/readme.md',
+    'docs/readme.md',
+    'lib/node_modules',
+    'lib/node_modules/',
+    'lib/node_modules/pkg/index.js',
+    'a/b/',
+    'a/b/c',
+    'a/b/d',
+    'x/__pycache__/',
+    'important.o',
+    'dir/important.o',
+    'main.o',
+    'xyz',
+    'xz',
+    'a.txt',
+    'dir/b.txt',
+    'c.txt',
+    'dx',
+    'cx',
+    'deep/',
+    'deep/a/b/c',
+    '!bang',
+    'bang',
+    'sub/main.py',
+    'sub/dir/main.py',
+    'main.py',
+    'dir/',
+]
+
+
+def reference_is_ignored(manager, path):
+    matches = list(manager.find_matching(path))
+    if matches:
+        return matches[-1].is_exclude, matches[-1].original_line
+    return None, None
+
+
+@pytest.mark.parametrize(
+    'patterns', [
+        PATTERNS,
+        PATTERNS[::-1],
+        PATTERNS[::2],
+        [],
+        '\n'.join(PATTERNS),
+        None,
+    ]
+)
+def test_is_ignored_matches_reference(patterns):
+    manager = IgnoreFilterManager(patterns)
+
+    for path in PATHS:
+        assert manager.is_ignored(path) == reference_is_ignored(
+            manager, path
+        ), path
+        # The second call uses the cached matches of the directories
+        assert manager.is_ignored(path) == reference_is_ignored(
+            manager, path
+        ), path
+
+    with pytest.raises(InvalidFile):
+        manager.is_ignored('/abs/path')
+
+
+def test_is_ignored_last_match():
+    manager = IgnoreFilterManager('*.o\n!important.o\n')
+    assert manager.is_ignored('a.o') == (True, '*.o')
+    assert manager.is_ignored('important.o') == (False, '!important.o')
+
+    manager = IgnoreFilterManager('!important.o\n*.o\n')
+    assert manager.is_ignored('important.o') == (True, '*.o')
+
+    manager = IgnoreFilterManager('/dir/\n!*.py')
+    assert manager.is_ignored('dir/a.py') == (True, '/dir/')
+    assert manager.is_ignored('a.py') == (False, '!*.py')
+    assert manager.is_ignored('a.c') == (None, None)
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import psef.json
+import psef.models as m
+import psef.helpers as h
+
+
+def get_reference_encoder(use_extended):
+    class ReferenceEncoder(json.JSONEncoder):
+        def default(self, obj):
+            if hasattr(obj, '__extended_to_json__') and use_extended(obj):
+                return obj.__extended_to_json__()
+            return obj.__to_json__()
+
+    return ReferenceEncoder
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+@pytest.mark.parametrize('extended', [True, False])
+def test_encoder_output_unchanged(app, session, pretty, extended, monkeypatch):
+    monkeypatch.setitem(app.config, 'JSONIFY_PRETTYPRINT_REGULAR', pretty)
+    monkeypatch.setattr(app, 'debug', False)
+    use_extended = lambda obj: extended and isinstance(obj, m.User)
+
+    payload = {
+        'users':
+            m.User.query.all(),
+        'roles':
+            m.Role.query.all(),
+        'files':
+            [
+                {
+                    'file': f,
+                    'nested': [f, (f.id, None, 1.5)]
+                } for f in m.File.query.all()
+            ],
+        'unicode':
+            'Œlµo',
+        'constants': {
+            5: [True, False, None]
+        },
+    }
+
+    expected = json.dumps(
+        payload,
+        cls=get_reference_encoder(use_extended),
+        sort_keys=True,
+        indent=2 if pretty else None,
+        separators=(', ', ': ') if pretty else (',', ':'),
+    ) + '\n'
+
+    if extended:
+        res = h.extended_jsonify(payload, use_extended=use_extended)
+    else:
+        res = h.jsonify(payload)
+    assert res.get_data(as_text=True) == expected
+    assert res.mimetype == 'application/json'
+    assert app.json_encoder is psef.json.CustomJSONEncoder
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+@pytest.mark.parametrize(
+    'items', [
+        [],
+        [1],
+        [{
+            'a': [1, {
+                'b': []
+            }]
+        }, 'Œlµo\n', None, {}],
+    ]
+)
+def test_iterencode(app, session, pretty, items, monkeypatch):
+    monkeypatch.setitem(app.config, 'JSONIFY_PRETTYPRINT_REGULAR', pretty)
+    monkeypatch.setattr(app, 'debug', False)
+    users = m.User.query.order_by(m.User.id).all()
+    items = items + users
+
+    assert ''.join(psef.json.iterencode_list(iter(items))
+                   ) == psef.json.dumps(items)
+
+    mapping = {str(i): item for i, item in enumerate(items)}
+    assert ''.join(psef.json.iterencode_mapping(sorted(mapping.items()))
+                   ) == psef.json.dumps(mapping)
+
+    for empty in [[], {}]:
+        assert ''.join(psef.json.iterencode_list(empty)) == '[]\n'
+        assert ''.join(psef.json.iterencode_mapping(empty)) == '{}\n'
@@ -98,8 +98,10 @@ ALL_LINTERS = sorted(['Flake8', 'MixedWhitespace', 'Pylint'])
 def test_linters(
     teacher_user, named_user, test_client, logged_in, use_teacher,
     assignment_real_works, linter_cfgs_exp, request, error_template, session,
-    monkeypatch_celery
+    monkeypatch_celery, app, monkeypatch
 ):
+    # Make sure the linters of multiple works run concurrently.
+    monkeypatch.setitem(app.config, 'LINTER_WORKERS', 2)
     assignment, single_work = assignment_real_works
     assig_id = assignment.id
     del assignment
@@ -261,6 +263,104 @@ def test_linters(
             )
 
 
+@pytest.mark.parametrize(
+    'filename,linter', [
+        ('test_flake8.tar.gz', 'Flake8'),
+        ('test_pylint.tar.gz', 'Pylint'),
+    ]
+)
+def test_linter_cache(
+    teacher_user, test_client, logged_in, assignment_real_works, linter, app,
+    monkeypatch, monkeypatch_celery, tmpdir
+):
+    assignment, _ = assignment_real_works
+    monkeypatch.setitem(app.config, 'LINTER_CACHE_DIR', str(tmpdir))
+
+    def run_linter():
+        res = test_client.req(
+            'post',
+            f'/api/v1/assignments/{assignment.id}/linter',
+            200,
+            data={
+                'name': linter,
+                'cfg': ''
+            },
+        )
+        test_client.req(
+            'get',
+            f'/api/v1/linters/{res["id"]}',
+            200,
+            result={
+                'name': linter,
+                'done': 3,
+                'working': 0,
+                'id': res['id'],
+                'crashed': 0,
+            }
+        )
+        comments = sorted(
+            (c.file_id, c.line, c.linter_code, c.comment)
+            for c in m.LinterComment.query.join(m.LinterInstance)
+            .filter(m.LinterInstance.tester_id == res['id'])
+        )
+        test_client.req('delete', f'/api/v1/linters/{res["id"]}', 204)
+        return comments
+
+    with logged_in(teacher_user):
+        comments = run_linter()
+        assert comments
+        assert tmpdir.listdir()
+
+        def fail(*args, **kwargs):
+            assert False, 'The linter should not run again'
+
+        monkeypatch.setattr(l.subprocess, 'run', fail)
+        assert run_linter() == comments
+
+
+def test_linter_cache_file_local(app, monkeypatch, tmpdir):
+    cache_dir = tmpdir.mkdir('cache')
+    monkeypatch.setitem(app.config, 'LINTER_CACHE_DIR', str(cache_dir))
+    code_dir = tmpdir.mkdir('code')
+    root = code_dir.mkdir('root')
+    for name in ['foo.py', 'notes.txt']:
+        root.join(name).write('import os\n')
+
+    runner = l.LinterRunner(l.Flake8, '')
+    res = runner._get_comments(
+        str(code_dir), 'root', {
+            'root/foo.py': 'blob',
+            'root/notes.txt': 'blob'
+        }, False
+    )
+    assert list(res) == ['root/foo.py']
+    # Files that are not linted are not cached.
+    assert len(cache_dir.listdir()) == 1
+
+    # The same blob with a different path is not served from the cache.
+    root.join('bar.py').write('import os\n')
+    res = runner._get_comments(
+        str(code_dir), 'root', {'root/bar.py': 'blob'}, True
+    )
+    assert list(res) == ['root/bar.py']
+    assert len(cache_dir.listdir()) == 2
+
+    def fail(*args, **kwargs):
+        assert False, 'The linter should not run again'
+
+    monkeypatch.setattr(l.subprocess, 'run', fail)
+    assert runner._get_comments(
+        str(code_dir), 'root', {
+            'root/bar.py': 'blob',
+            'root/notes.txt': 'blob'
+        }, False
+    ) == res
+
+    runner = l.LinterRunner(l.Flake8, '[flake8]\nfilename = *.txt')
+    assert runner.linter.lints_file('root/notes.txt')
+    assert not runner.linter.lints_file('root/foo.py')
+
+
 @pytest.mark.parametrize('with_works', [True], indirect=True)
 def test_whitespace_linter(
     teacher_user, test_client, assignment, logged_in, monkeypatch
@@ -370,6 +470,90 @@ def test_lint_later_submission(
         assert not exps
 
 
+def test_relint_changed_files(
+    test_client, logged_in, assignment, session, teacher_user, student_user,
+    monkeypatch_celery
+):
+    assig_id = assignment.id
+    filename = 'test_flake8.tar.gz'
+
+    with logged_in(teacher_user):
+        test_client.req(
+            'post',
+            f'/api/v1/assignments/{assig_id}/linter',
+            200,
+            data={
+                'name': 'Flake8',
+                'cfg': ''
+            },
+        )
+
+    with logged_in(student_user):
+        work = test_client.req(
+            'post',
+            f'/api/v1/assignments/{assig_id}/submission',
+            201,
+            real_data={
+                'file':
+                    (
+                        f'{os.path.dirname(__file__)}/../'
+                        f'test_data/test_linter/{filename}', filename
+                    )
+            }
+        )
+
+    def get_comments(file_id):
+        return sorted(
+            (c.id, c.line, c.linter_code)
+            for c in m.LinterComment.query.filter_by(file_id=file_id)
+        )
+
+    code_id = session.query(m.File.id).filter(
+        m.File.work_id == work['id'],
+        m.File.name == 'test.py',
+    ).first()[0]
+    old_comments = get_comments(code_id)
+    assert [c[2] for c in old_comments] == ['W191', 'E211', 'E201', 'E202']
+
+    with logged_in(student_user):
+        new_file = test_client.req(
+            'post',
+            f'/api/v1/submissions/{work["id"]}/files/',
+            200,
+            query={'path': 'test_flake8/new.py'},
+            real_data='import os\n',
+        )
+        assert [c[2] for c in get_comments(new_file['id'])] == ['F401']
+        assert get_comments(code_id) == old_comments
+
+        test_client.req(
+            'patch',
+            f'/api/v1/code/{new_file["id"]}',
+            200,
+            real_data='a=1\n',
+        )
+        assert [c[2] for c in get_comments(new_file['id'])] == ['E225']
+        assert get_comments(code_id) == old_comments
+
+        # Flake8 would not lint this file when linting the entire work.
+        txt_file = test_client.req(
+            'post',
+            f'/api/v1/submissions/{work["id"]}/files/',
+            200,
+            query={'path': 'test_flake8/data.txt'},
+            real_data='import os\n',
+        )
+        assert get_comments(txt_file['id']) == []
+        test_client.req(
+            'patch',
+            f'/api/v1/code/{txt_file["id"]}',
+            200,
+            real_data='a=1\n',
+        )
+        assert get_comments(txt_file['id']) == []
+        assert get_comments(code_id) == old_comments
+
+
 @pytest.mark.parametrize('with_works', [True], indirect=True)
 def test_already_running_linter(
     teacher_user, test_client, assignment, logged_in, error_template,
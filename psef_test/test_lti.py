@@ -1,6 +1,9 @@
 import os
+import time
 import urllib
 import datetime
+import threading
+import collections
 
 import jwt
 import pytz
@@ -9,6 +12,7 @@ import dateutil.parser
 
 import psef.lti as lti
 import psef.auth as auth
+import psef.tasks as tasks
 import psef.models as m
 
 perm_error = pytest.mark.perm_error
@@ -259,6 +263,7 @@ def test_lti_grade_passback(
             self.args = args
             self.kwargs = kwargs
             self.dirty = session.dirty
+            return lti.OutcomeResponse(code_major='success')
 
     patch_delete = Patch()
     patch_replace = Patch()
@@ -646,3 +651,272 @@ def test_invalid_jwt(
             headers={'Jwt': 'INVALID_JWT'},
             result=error_template
         )
+
+
+def test_lti_passback_grades_concurrently(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_CONNECTIONS', 2)
+    lock = threading.Lock()
+    active = collections.Counter()
+    max_active = collections.Counter()
+    clients = collections.defaultdict(set)
+    done = []
+
+    def post_outcome_request(self, client=None):
+        key = self.consumer_key
+        with lock:
+            active[key] += 1
+            max_active[key] = max(max_active[key], active[key])
+            clients[key].add(id(client))
+        time.sleep(0.01)
+        with lock:
+            active[key] -= 1
+            done.append((key, self.lis_result_sourcedid, self.score))
+        if self.lis_result_sourcedid == 'broken':
+            raise ValueError
+        return lti.OutcomeResponse(code_major='success')
+
+    monkeypatch.setattr(
+        lti.OutcomeRequest, 'post_outcome_request', post_outcome_request
+    )
+
+    passbacks = [
+        lti.GradePassback(
+            id=i,
+            key=f'key{i % 2}',
+            secret='secret',
+            grade=i,
+            service_url='url',
+            sourcedid='broken' if i == 3 else f'source{i}',
+            url=None,
+        ) for i in range(10)
+    ]
+    errors = lti.LTI.passback_grades(passbacks)
+
+    assert list(errors) == [3]
+    assert isinstance(errors[3], ValueError)
+    assert sorted(done) == sorted(
+        (p.key, p.sourcedid, str(p.grade / 10)) for p in passbacks
+    )
+    assert max_active == {'key0': 2, 'key1': 2}
+    assert all(len(c) == 2 for c in clients.values())
+
+
+def test_outcome_client_headers():
+    client = lti._OutcomeClient(lti.oauth2.Consumer(key='a', secret='b'))
+    headers = client._normalize_headers(
+        {
+            'Authorization': 'OAuth',
+            'Content-Type': 'application/xml',
+        }
+    )
+    assert headers == {
+        'Authorization': 'OAuth',
+        'content-type': 'application/xml',
+    }
+
+
+@pytest.mark.parametrize('with_works', [True], indirect=True)
+def test_lti_passback_queue(
+    app, assignment, session, monkeypatch, monkeypatch_celery, test_client,
+    logged_in, admin_user, student_user, error_template
+):
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_MAX_ATTEMPTS', 2)
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_BACKOFF', 60)
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_FAILURE_THRESHOLD', 100)
+
+    provider = m.LTIProvider(key='my_lti')
+    assignment.course.lti_provider = provider
+    assignment.lti_outcome_service_url = 'OUTCOME_URL'
+    works = m.Work.query.filter_by(assignment=assignment).all()
+    for work in works:
+        work._grade = 5.0
+    for user_id in set(w.user_id for w in works):
+        assignment.assignment_results[user_id] = m.AssignmentResult(
+            sourcedid=str(user_id), user_id=user_id
+        )
+    session.commit()
+
+    broken_work = works[0]
+    failing = {str(broken_work.user_id)}
+    calls = []
+
+    def post_replace_result(self, score, result_data=None, client=None):
+        calls.append(self.lis_result_sourcedid)
+        if self.lis_result_sourcedid in failing:
+            return lti.OutcomeResponse(
+                code_major='failure', description='Broken'
+            )
+        return lti.OutcomeResponse(code_major='success')
+
+    monkeypatch.setattr(
+        lti.OutcomeRequest, 'post_replace_result', post_replace_result
+    )
+
+    def make_due():
+        m.PassbackQueueItem.query.update(
+            {
+                'next_attempt_at': datetime.datetime.utcnow()
+            }
+        )
+        session.commit()
+
+    work_ids = [w.id for w in works]
+    tasks.passback_grades(work_ids + work_ids)
+    assert sorted(calls) == sorted(str(w.user_id) for w in works)
+
+    queued = m.PassbackQueueItem.query.all()
+    assert [q.work_id for q in queued] == [
+        w.id for w in works if w.user_id == broken_work.user_id
+    ]
+    for item in queued:
+        assert item.attempts == 1
+        assert 'Broken' in item.error
+        assert item.next_attempt_at > datetime.datetime.utcnow()
+
+    # Passbacks are not retried before their backoff is over
+    calls.clear()
+    tasks.process_passback_queue()
+    assert not calls
+
+    make_due()
+    tasks.process_passback_queue()
+    assert calls
+    assert not m.PassbackQueueItem.query.all()
+    failed_ids = sorted(f.work_id for f in m.FailedPassback.query)
+    assert failed_ids == sorted(q.work_id for q in queued)
+
+    with logged_in(student_user):
+        test_client.req(
+            'get', '/api/v1/lti/passbacks/failed/', 403, result=error_template
+        )
+
+    with logged_in(admin_user):
+        test_client.req(
+            'get',
+            '/api/v1/lti/passbacks/failed/',
+            200,
+            result=[
+                {
+                    'work_id': work_id,
+                    'assignment_id': assignment.id,
+                    'attempts': 2,
+                    'error': str,
+                    'failed_at': str,
+                } for work_id in failed_ids
+            ],
+        )
+        test_client.req(
+            'post',
+            '/api/v1/lti/passbacks/failed/',
+            400,
+            data={'work_ids': ['not an id']},
+            result=error_template,
+        )
+
+        failing.clear()
+        calls.clear()
+        test_client.req(
+            'post',
+            '/api/v1/lti/passbacks/failed/',
+            204,
+            data={'work_ids': failed_ids},
+        )
+        assert calls == [str(broken_work.user_id)] * len(failed_ids)
+        assert not m.FailedPassback.query.all()
+        assert not m.PassbackQueueItem.query.all()
+
+    # After too many failures no passbacks are done to the provider
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_MAX_ATTEMPTS', 5)
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_FAILURE_THRESHOLD', 2)
+    failing.update(calls)
+    calls.clear()
+    tasks.passback_grades([broken_work.id])
+    assert len(calls) == 1
+    assert provider.passback_blocked_until is None
+
+    make_due()
+    tasks.process_passback_queue()
+    assert len(calls) == 2
+    assert provider.passback_blocked_until > datetime.datetime.utcnow()
+
+    make_due()
+    tasks.process_passback_queue()
+    assert len(calls) == 2
+    assert m.PassbackQueueItem.query.get(broken_work.id).attempts == 2
+
+
+def test_lti_initial_passback_queue(
+    app, assignment, session, monkeypatch, monkeypatch_celery, test_client,
+    logged_in, student_user
+):
+    monkeypatch.setitem(app.config, 'LTI_PASSBACK_FAILURE_THRESHOLD', 100)
+
+    provider = m.LTIProvider(key='my_lti')
+    assignment.course.lti_provider = provider
+    assignment.lti_outcome_service_url = 'OUTCOME_URL'
+    assignment.assignment_results[student_user.id] = m.AssignmentResult(
+        sourcedid='SOURCEDID', user_id=student_user.id
+    )
+    session.commit()
+
+    failing = True
+    calls = []
+
+    def post_replace_result(self, score, result_data=None, client=None):
+        calls.append((score, result_data))
+        if failing:
+            return lti.OutcomeResponse(
+                code_major='failure', description='Broken'
+            )
+        return lti.OutcomeResponse(code_major='success')
+
+    monkeypatch.setattr(
+        lti.OutcomeRequest, 'post_replace_result', post_replace_result
+    )
+
+    # A failing LTI consumer does not prevent uploading a submission.
+    with logged_in(student_user):
+        work = test_client.req(
+            'post',
+            f'/api/v1/assignments/{assignment.id}/submission',
+            201,
+            real_data={
+                'file':
+                    (
+                        f'{os.path.dirname(__file__)}/../test_data/'
+                        'test_submissions/single_file_work', 'test.py'
+                    )
+            },
+        )
+    assert len(calls) == 1
+    assert calls[0][0] is None
+    assert 'url' in calls[0][1]
+
+    item = m.PassbackQueueItem.query.get(work['id'])
+    assert item.initial
+    assert item.attempts == 1
+    assert 'Broken' in item.error
+
+    failing = False
+    calls.clear()
+    item.next_attempt_at = datetime.datetime.utcnow()
+    session.commit()
+    tasks.process_passback_queue()
+    assert len(calls) == 1
+    assert calls[0][0] is None
+    assert 'url' in calls[0][1]
+    assert m.PassbackQueueItem.query.get(work['id']) is None
+
+    # A passback that is queued again while it is done is not removed from
+    # the queue.
+    def passback_grades(works, initial=False):
+        m.PassbackQueueItem.enqueue([work.id for work in works])
+        return {}
+
+    m.PassbackQueueItem.enqueue([work['id']])
+    session.commit()
+    monkeypatch.setattr(m.Work, 'passback_grades', passback_grades)
+    tasks.process_passback_queue()
+    item = m.PassbackQueueItem.query.get(work['id'])
+    assert item.attempts == 0
+    assert not item.initial
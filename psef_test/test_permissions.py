@@ -2,6 +2,7 @@ import os
 import sys
 import json
 
+import flask
 import pytest
 
 import psef.auth as a
@@ -135,6 +136,78 @@ def test_role_permissions(
     assert err.value.api_code == APICodes.NOT_LOGGED_IN
 
 
+def test_permission_request_cache(ta_user, bs_course, app, session):
+    user = m.User.query.get(ta_user.id)
+    perm = m.Permission.query.filter_by(name='can_grade_work').one()
+    role = user.courses[bs_course.id]
+    other_role = m.CourseRole.query.filter(
+        m.CourseRole.course_id == bs_course.id,
+        m.CourseRole.id != role.id,
+        m.CourseRole.name == 'Student',
+    ).one()
+    assert role.has_permission(perm)
+    assert not other_role.has_permission(perm)
+
+    with app.test_request_context('/'):
+        assert user.has_permission(perm, bs_course.id)
+        assert flask.g.permission_bits[
+            (user.id, bs_course.id)
+        ] == (role.id, role.get_permission_bits())
+
+        role.set_permission(perm, False)
+        assert not flask.g.permission_bits
+        assert not user.has_permission('can_grade_work', bs_course.id)
+
+        role.set_permission(perm, True)
+        assert user.has_permission('can_grade_work', bs_course.id)
+
+        # A changed role should never use the cached bits of the old role.
+        user.courses[bs_course.id] = other_role
+        assert not user.has_permission('can_grade_work', bs_course.id)
+
+        with pytest.raises(KeyError):
+            user.has_permission('not_a_permission', bs_course.id)
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert flask.g.permission_bits == {}
+
+
+def test_permission_links(bs_course, app, session):
+    def links_of(role):
+        res = 0
+        for name in role._permissions:
+            res |= m.Permission.get_entry(name).mask
+        return res
+
+    order = app.config['_PERMISSION_ORDER']
+    for name, entry in m.Permission.get_table().entries.items():
+        assert entry.mask == 1 << order.index(name)
+
+    for role in m.Role.query.all() + m.CourseRole.query.all():
+        assert role._permission_links == links_of(role)
+
+    role = m.CourseRole.query.filter_by(
+        course_id=bs_course.id, name='Student'
+    ).one()
+    role_id = role.id
+    perm = m.Permission.query.filter_by(name='can_grade_work').one()
+    assert not role.has_permission(perm)
+
+    role.set_permission(perm, True)
+    assert role._permission_links == links_of(role)
+    session.commit()
+    session.expire_all()
+
+    role = m.CourseRole.query.get(role_id)
+    assert role.has_permission('can_grade_work')
+    assert role._permission_links == links_of(role)
+
+    role.set_permission(perm, False)
+    assert not role.has_permission('can_grade_work')
+    assert role._permission_links == links_of(role)
+
+
 def test_all_permissions(
     ta_user, bs_course, pse_course, prolog_course, admin_user, student_user,
     logged_in, test_client
@@ -1,11 +1,15 @@
 import io
 import os
+import uuid
+import tarfile
 import zipfile
 import datetime
 
 import pytest
 from pytest import approx
 
+import psef.files
+import psef.tasks
 import psef.models as m
 
 http_error = pytest.mark.http_error
@@ -796,13 +800,21 @@ def test_get_dir_contents(
             }
         )
         if not error:
-            test_client.req(
+            _, rv = test_client.req(
                 'get',
                 f'/api/v1/submissions/{work_id}/files/',
                 200,
                 query={'file_id': res["id"]},
                 result=res,
+                include_response=True,
+            )
+            etag = rv.headers['ETag']
+            rv = test_client.get(
+                f'/api/v1/submissions/{work_id}/files/',
+                headers={'If-None-Match': etag},
             )
+            assert rv.status_code == 304
+            assert rv.get_data() == b''
 
             test_client.req(
                 'get',
@@ -896,6 +908,56 @@ def test_get_zip_file(
                 assert res.status_code == 404
 
 
+@pytest.mark.parametrize(
+    'filename', ['../test_submissions/multiple_dir_archive.zip'],
+    indirect=True
+)
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_stream_zip_file(
+    test_client, logged_in, assignment_real_works, teacher_user, app,
+    monkeypatch, tmpdir, use_cache
+):
+    assignment, work = assignment_real_works
+    monkeypatch.setitem(
+        app.config, 'ZIP_CACHE_DIR',
+        str(tmpdir) if use_cache else ''
+    )
+
+    with logged_in(teacher_user):
+        for _ in range(2):
+            res = test_client.get(
+                f'/api/v1/submissions/{work["id"]}',
+                query_string={
+                    'type': 'zip',
+                    'owner': 'teacher',
+                    'stream': 'true',
+                },
+            )
+
+            assert res.status_code == 200
+            assert res.headers['Content-Type'] == 'application/zip'
+            assert res.headers['Content-Disposition'].startswith('attachment')
+            zfile = zipfile.ZipFile(io.BytesIO(res.get_data()))
+            assert zfile.testzip() is None
+            assert set(f.filename for f in zfile.infolist()) == set(
+                [
+                    'multiple_dir_archive/',
+                    'multiple_dir_archive/dir/single_file_work',
+                    'multiple_dir_archive/dir/single_file_work_copy',
+                    'multiple_dir_archive/dir2/single_file_work',
+                    'multiple_dir_archive/dir2/single_file_work_copy',
+                ]
+            )
+            assert len(tmpdir.listdir()) == (1 if use_cache else 0)
+
+    psef.tasks._prune_zip_cache_1()
+    assert len(tmpdir.listdir()) == (1 if use_cache else 0)
+
+    monkeypatch.setitem(app.config, 'ZIP_CACHE_MAX_SIZE', 0)
+    psef.tasks._prune_zip_cache_1()
+    assert not tmpdir.listdir()
+
+
 @pytest.mark.parametrize(
     'filename', ['../test_submissions/multiple_dir_archive.zip'],
     indirect=True
@@ -1536,8 +1598,9 @@ def test_change_grader(
 )
 def test_delete_submission(
     named_user, request, test_client, logged_in, error_template, teacher_user,
-    assignment_real_works, session
+    assignment_real_works, session, app, monkeypatch
 ):
+    monkeypatch.setitem(app.config, 'UNREFERENCED_BLOB_MIN_AGE', 0)
     assignment, work = assignment_real_works
     work_id = work['id']
 
@@ -1549,9 +1612,9 @@ def test_delete_submission(
 
     files = [f.id for f in m.File.query.filter_by(work_id=work_id).all()]
     assert files
-    diskname = m.File.query.filter_by(
-        work_id=work_id, is_directory=False
-    ).first().get_diskname()
+    code = m.File.query.filter_by(work_id=work_id, is_directory=False).first()
+    diskname = code.get_diskname()
+    blob = code.filename
 
     assert os.path.isfile(diskname)
 
@@ -1581,12 +1644,143 @@ def test_delete_submission(
             assert m.File.query.get(f)
         assert m.Work.query.get(work_id)
     else:
-        assert not os.path.isfile(diskname)
+        # The blob is shared with the other submissions of the same archive.
+        still_used = m.File.query.filter_by(filename=blob).count() > 0
+        assert os.path.isfile(diskname) == still_used
         assert m.Work.query.get(work_id) is None
         for f in files:
             assert m.File.query.get(f) is None
 
 
+def test_shared_blobs(
+    test_client, logged_in, assignment, teacher_user, session, app, monkeypatch
+):
+    monkeypatch.setitem(app.config, 'UNREFERENCED_BLOB_MIN_AGE', 0)
+    content = f'Unique content {uuid.uuid4()}'.encode()
+    work_ids = []
+    for name in ['Student1', 'Student2']:
+        with logged_in(m.User.query.filter_by(name=name).one()):
+            work_ids.append(
+                test_client.req(
+                    'post',
+                    f'/api/v1/assignments/{assignment.id}/submission',
+                    201,
+                    real_data={'file': (io.BytesIO(content), 'test.py')},
+                )['id']
+            )
+
+    codes = [
+        m.File.query.filter_by(work_id=work_id, is_directory=False).one()
+        for work_id in work_ids
+    ]
+    assert codes[0].filename == codes[1].filename
+    diskname = codes[0].get_diskname()
+    with open(diskname, 'rb') as f:
+        assert f.read() == content
+
+    # Storing existing contents again should not rewrite the blob.
+    inode = os.stat(diskname).st_ino
+    os.utime(diskname, (0, 0))
+    assert psef.files.store_blob(io.BytesIO(content)) == codes[0].filename
+    assert os.stat(diskname).st_ino == inode
+    assert os.stat(diskname).st_mtime > 0
+
+    with logged_in(teacher_user):
+        test_client.req('delete', f'/api/v1/submissions/{work_ids[0]}', 204)
+        assert os.path.isfile(diskname)
+        test_client.req('delete', f'/api/v1/submissions/{work_ids[1]}', 204)
+        assert not os.path.isfile(diskname)
+
+
+def test_upload_archives_with_same_directory(
+    test_client, logged_in, assignment, session
+):
+    def make_zip(filename):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as zfile:
+            zfile.writestr(f'src/{filename}', f'# {filename}')
+        data.seek(0)
+        return data
+
+    with logged_in(m.User.query.filter_by(name='Student1').one()):
+        work_id = test_client.req(
+            'post',
+            f'/api/v1/assignments/{assignment.id}/submission',
+            201,
+            real_data={
+                'file1': (make_zip('a.py'), 'a.zip'),
+                'file2': (make_zip('b.py'), 'b.zip'),
+            },
+        )['id']
+
+    files = m.File.query.filter_by(work_id=work_id, is_directory=False).all()
+    assert sorted(f.name for f in files) == ['a.py', 'b.py']
+    # Both files should be in their own directory.
+    assert files[0].parent_id != files[1].parent_id
+    for f in files:
+        assert f.parent.name == 'src'
+        assert f.path == f'{f.parent.path}/{f.name}'
+
+
+def test_prune_unreferenced_blobs(
+    test_client, logged_in, assignment, teacher_user, session, app, monkeypatch
+):
+    disknames = []
+    for name in ['Student1', 'Student2']:
+        with logged_in(m.User.query.filter_by(name=name).one()):
+            work_id = test_client.req(
+                'post',
+                f'/api/v1/assignments/{assignment.id}/submission',
+                201,
+                real_data={
+                    'file': (
+                        io.BytesIO(f'{uuid.uuid4()}'.encode()), 'test.py'
+                    )
+                },
+            )['id']
+        disknames.append(
+            m.File.query.filter_by(work_id=work_id, is_directory=False)
+            .one().get_diskname()
+        )
+
+    with logged_in(teacher_user):
+        test_client.req('delete', f'/api/v1/submissions/{work_id}', 204)
+
+    # The blob was just stored, so it is not removed yet.
+    assert os.path.isfile(disknames[1])
+    psef.tasks._prune_unreferenced_blobs_1()
+    assert os.path.isfile(disknames[1])
+
+    monkeypatch.setitem(app.config, 'UNREFERENCED_BLOB_MIN_AGE', 0)
+    psef.tasks._prune_unreferenced_blobs_1()
+    assert os.path.isfile(disknames[0])
+    assert not os.path.isfile(disknames[1])
+
+
+def test_blobs_not_deleted_on_rollback(
+    test_client, logged_in, assignment, session, app, monkeypatch
+):
+    monkeypatch.setitem(app.config, 'UNREFERENCED_BLOB_MIN_AGE', 0)
+    with logged_in(m.User.query.filter_by(name='Student1').one()):
+        work_id = test_client.req(
+            'post',
+            f'/api/v1/assignments/{assignment.id}/submission',
+            201,
+            real_data={
+                'file': (io.BytesIO(f'{uuid.uuid4()}'.encode()), 'test.py')
+            },
+        )['id']
+    code = m.File.query.filter_by(work_id=work_id, is_directory=False).one()
+    diskname = code.get_diskname()
+
+    session.delete(code)
+    psef.files.delete_unreferenced_blobs([code.filename])
+    assert os.path.isfile(diskname)
+    session.rollback()
+    session.commit()
+    assert os.path.isfile(diskname)
+
+
 @pytest.mark.parametrize('filename', ['test_flake8.tar.gz'], indirect=True)
 @pytest.mark.parametrize(
     'named_user', [
@@ -1806,3 +2000,125 @@ def test_uploading_invalid_file(
             },
             result=error_template,
         )
+
+
+@pytest.mark.parametrize('ext', ['tar.gz', 'zip'])
+def test_uploading_too_large_archive(
+    logged_in, student_user, assignment, test_client, error_template, ext, app,
+    monkeypatch, tmpdir
+):
+    def upload(path, name, status, code=None):
+        with logged_in(student_user):
+            res = test_client.req(
+                'post',
+                f'/api/v1/assignments/{assignment.id}/submission',
+                status,
+                real_data={'file': (path, name)},
+                result=error_template if code else dict,
+            )
+        if code:
+            assert res['code'] == code
+
+    arch = (
+        f'{os.path.dirname(__file__)}/../test_data/'
+        f'test_submissions/multiple_dir_archive.{ext}'
+    )
+
+    monkeypatch.setitem(app.config, 'MAX_ARCHIVE_ENTRIES', 2)
+    upload(arch, f'arch.{ext}', 400, 'TOO_MANY_FILES_IN_ARCHIVE')
+    monkeypatch.setitem(app.config, 'MAX_ARCHIVE_ENTRIES', 10000)
+
+    monkeypatch.setitem(app.config, 'MAX_ARCHIVE_SIZE', 2)
+    upload(arch, f'arch.{ext}', 400, 'ARCHIVE_TOO_LARGE')
+    monkeypatch.setitem(app.config, 'MAX_ARCHIVE_SIZE', 2 ** 30)
+
+    upload(arch, f'arch.{ext}', 201)
+
+    # A file of only zeros can be compressed very well.
+    bomb = str(tmpdir.join(f'bomb.{ext}'))
+    zeros = tmpdir.join('zeros')
+    zeros.write(b'\0' * 4 * 2 ** 20, mode='wb')
+    if ext == 'zip':
+        with zipfile.ZipFile(bomb, 'w', zipfile.ZIP_DEFLATED) as f:
+            f.write(str(zeros), 'zeros')
+    else:
+        with tarfile.open(bomb, 'w:gz') as f:
+            f.add(str(zeros), 'zeros')
+
+    upload(bomb, f'bomb.{ext}', 400, 'ARCHIVE_COMPRESSION_TOO_HIGH')
+    monkeypatch.setitem(app.config, 'MAX_ARCHIVE_COMPRESSION_RATIO', 10 ** 6)
+    upload(bomb, f'bomb.{ext}', 201)
+
+
+def test_uploading_archive_member_edge_cases(
+    logged_in, student_user, teacher_user, assignment, test_client,
+    error_template, tmpdir
+):
+    def make_tar(name, members):
+        path = str(tmpdir.join(name))
+        with tarfile.open(path, 'w:gz') as tar:
+            for member_name, content in members:
+                info = tarfile.TarInfo(member_name)
+                if content is None:
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                else:
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+        return path
+
+    def upload(path, status, query=''):
+        with logged_in(student_user):
+            return test_client.req(
+                'post',
+                f'/api/v1/assignments/{assignment.id}/submission{query}',
+                status,
+                real_data={'file': (path, 'archive.tar.gz')},
+                result=error_template if status >= 400 else dict,
+            )
+
+    with logged_in(teacher_user):
+        test_client.req(
+            'patch',
+            f'/api/v1/assignments/{assignment.id}',
+            204,
+            data={'ignore': '*.pyc\n'}
+        )
+
+    arch = make_tar(
+        'valid.tar.gz', [
+            ('top/', None),
+            ('top/a.py', b'old'),
+            ('top/./empty/', None),
+            ('top/dir/../b.py', b'b'),
+            ('top/c.pyc', b'c'),
+            ('top/a.py', b'new'),
+        ]
+    )
+    work = upload(arch, 201, '?ignored_files=delete')
+
+    with logged_in(student_user):
+        tree = test_client.req(
+            'get',
+            f'/api/v1/submissions/{work["id"]}/files/',
+            200,
+            result={
+                'entries': list,
+                'id': int,
+                'name': 'top',
+            }
+        )
+        entries = {e['name']: e for e in tree['entries']}
+        assert sorted(entries) == ['a.py', 'b.py', 'empty']
+        assert entries['empty']['entries'] == []
+
+        res = test_client.get(f'/api/v1/code/{entries["a.py"]["id"]}')
+        assert res.get_data() == b'new'
+        res = test_client.get(f'/api/v1/code/{entries["b.py"]["id"]}')
+        assert res.get_data() == b'b'
+
+    arch = make_tar('conflict.tar.gz', [('x', b'x'), ('x/y', b'y')])
+    assert upload(arch, 400)['code'] == 'INVALID_FILE_IN_ARCHIVE'
+
+    arch = make_tar('unsafe.tar.gz', [('a/../../y', b'y')])
+    assert upload(arch, 400)['code'] == 'INVALID_FILE_IN_ARCHIVE'